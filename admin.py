@@ -1,4 +1,7 @@
+import io
+import json
 import logging
+from datetime import datetime
 from telegram import Update
 from telegram.ext import ContextTypes, MessageHandler, filters
 from keyboards import Keyboards
@@ -8,9 +11,10 @@ from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 logger = logging.getLogger(__name__)
 
 class AdminPanel:
-    def __init__(self, database):
+    def __init__(self, database, keyboards=None):
         self.db = database
-        self.keyboards = Keyboards()
+        # Share the bot's keyboards so their cache is built once
+        self.keyboards = keyboards or Keyboards()
         # List of admin user IDs - add your admin IDs here
         # Add the user ID for @PO0AH013
         self.admin_ids = [5283015101]  # Your actual admin user ID
@@ -46,6 +50,14 @@ class AdminPanel:
             await self.show_country_reset_menu(query)
         elif action == "give_items":
             await self.show_give_items_menu(query)
+        elif action == "query_stats":
+            await self.show_query_stats(query)
+        elif action == "query_stats_reset":
+            if self.db.query_stats is not None:
+                self.db.query_stats.reset()
+            await self.show_query_stats(query)
+        elif action == "query_stats_dump":
+            await self.dump_query_stats(query)
         elif action.startswith("player_"):
             player_id = int(action.replace("player_", ""))
             await self.show_player_actions(query, player_id)
@@ -72,12 +84,21 @@ class AdminPanel:
 
     async def show_game_stats(self, query):
         """Show game statistics"""
-        players = self.db.get_all_players()
+        states = self.db.load_player_state()
+        players = [state['player'] for state in states.values()]
         total_players = len(players)
 
         total_money = sum(player['money'] for player in players)
         total_population = sum(player['population'] for player in players)
         total_soldiers = sum(player['soldiers'] for player in players)
+        total_buildings = sum(
+            count for state in states.values()
+            for building, count in state['buildings'].items() if building != 'user_id'
+        )
+        total_weapons = sum(
+            count for state in states.values()
+            for weapon, count in state['weapons'].items() if weapon != 'user_id'
+        )
 
         # Get most powerful country
         max_money_player = max(players, key=lambda x: x['money']) if players else None
@@ -89,6 +110,8 @@ class AdminPanel:
 💰 کل پول: ${total_money:,}
 🌍 کل جمعیت: {total_population:,}
 ⚔️ کل سربازان: {total_soldiers:,}
+🏗 کل ساختمان‌ها: {total_buildings:,}
+🔫 کل تسلیحات: {total_weapons:,}
 
 🏆 ثروتمندترین کشور: {max_money_player['country_name'] if max_money_player else 'ندارد'}
 👑 پرجمعیت‌ترین کشور: {max_pop_player['country_name'] if max_pop_player else 'ندارد'}
@@ -227,6 +250,68 @@ class AdminPanel:
 
         await query.edit_message_text(logs_text, reply_markup=keyboard)
 
+    async def show_query_stats(self, query):
+        """Show the slowest database methods and statements and the slow-query log"""
+        stats = self.db.query_stats
+        if stats is None:
+            await query.edit_message_text(
+                "🐢 ثبت آمار کوئری‌ها غیرفعال است (DB_QUERY_STATS=0)",
+                reply_markup=self.keyboards.back_to_main_keyboard()
+            )
+            return
+
+        snapshot = stats.snapshot(limit=5)
+        checkouts = snapshot['checkouts']
+        cache = self.db.cache.stats()
+
+        stats_text = f"""🐢 آمار کوئری‌ها از {snapshot['since']}
+
+🔌 دریافت اتصال: {checkouts['count']:,} بار، p50 {checkouts['p50_ms']}ms، p99 {checkouts['p99_ms']}ms
+🗄 کش وضعیت: {cache['hit_rate']:.0%} از {cache['hits'] + cache['misses']:,} خواندن
+
+⏱ پرهزینه‌ترین متدها (کل زمان):
+"""
+        for method in snapshot['methods']:
+            stats_text += (f"• {method['method']}: {method['count']:,} بار، {method['total_ms']:,.0f}ms، "
+                           f"p50 {method['p50_ms']} / p99 {method['p99_ms']}ms، {method['rows']:,} ردیف\n")
+
+        stats_text += "\n📜 پرهزینه‌ترین دستورات:\n"
+        for statement in snapshot['statements']:
+            stats_text += (f"• {statement['sql'][:90]}\n"
+                           f"  {statement['count']:,} بار، {statement['total_ms']:,.0f}ms، p99 {statement['p99_ms']}ms\n")
+
+        slow_queries = snapshot['slow_queries'][-5:]
+        stats_text += f"\n🐌 کوئری‌های کندتر از {snapshot['slow_ms']:g}ms: {len(snapshot['slow_queries'])}\n"
+        for slow in reversed(slow_queries):
+            stats_text += f"• {slow['at']} {slow['ms']:,.0f}ms {slow['method']}: {slow['sql'][:70]}\n"
+
+        keyboard = InlineKeyboardMarkup([
+            [
+                InlineKeyboardButton("🔄 بروزرسانی", callback_data="admin_query_stats"),
+                InlineKeyboardButton("💾 فایل کامل", callback_data="admin_query_stats_dump")
+            ],
+            [
+                InlineKeyboardButton("🧹 شروع دوباره", callback_data="admin_query_stats_reset"),
+                InlineKeyboardButton("🔙 بازگشت", callback_data="admin_panel")
+            ]
+        ])
+
+        # Telegram messages are limited to 4096 characters
+        await query.edit_message_text(stats_text[:4096], reply_markup=keyboard)
+
+    async def dump_query_stats(self, query):
+        """Send every method, statement and slow query as a JSON file"""
+        if self.db.query_stats is None:
+            await self.show_query_stats(query)
+            return
+
+        report = dict(self.db.query_stats.snapshot(), state_cache=self.db.cache.stats())
+        document = io.BytesIO(json.dumps(report, ensure_ascii=False, indent=2).encode('utf-8'))
+        await query.message.reply_document(
+            document=document,
+            filename=f"query_stats_{datetime.now():%Y%m%d_%H%M%S}.json"
+        )
+
     async def show_reset_confirmation(self, query):
         """Show reset confirmation"""
         warning_text = """⚠️ هشدار: ریست کامل بازی
@@ -362,7 +447,8 @@ class AdminPanel:
             return {'success': False, 'message': 'بازیکن یافت نشد'}
 
         # Add weapons
-        self.db.add_weapon(user_id, weapon_type, amount)
+        if not self.db.add_weapon(user_id, weapon_type, amount):
+            return {'success': False, 'message': f"نوع سلاح نامعتبر: {weapon_type}"}
 
         weapon_config = Config.WEAPONS.get(weapon_type, {})
         weapon_name = weapon_config.get('name', weapon_type)
@@ -13,55 +13,8 @@ class AllianceSystem:
         self.setup_alliance_tables()
 
     def setup_alliance_tables(self):
-        """Setup alliance tables in database"""
-        with self.db.get_connection() as conn:
-            if self.db.use_mysql:
-                cursor = conn.cursor(dictionary=True)
-                id_type = "INT"
-                auto_increment = "AUTO_INCREMENT"
-                timestamp_type = "TIMESTAMP DEFAULT CURRENT_TIMESTAMP"
-            else:
-                cursor = conn.cursor()
-                id_type = "INTEGER"
-                auto_increment = "AUTOINCREMENT"
-                timestamp_type = "TEXT DEFAULT CURRENT_TIMESTAMP"
-
-            # Alliances table
-            cursor.execute(f'''
-                CREATE TABLE IF NOT EXISTS alliances (
-                    id {id_type} PRIMARY KEY {auto_increment},
-                    name TEXT NOT NULL,
-                    leader_id INTEGER NOT NULL,
-                    description TEXT,
-                    created_at {timestamp_type}
-                )
-            ''')
-
-            # Alliance members table
-            cursor.execute(f'''
-                CREATE TABLE IF NOT EXISTS alliance_members (
-                    id {id_type} PRIMARY KEY {auto_increment},
-                    alliance_id INTEGER NOT NULL,
-                    user_id INTEGER NOT NULL,
-                    role TEXT DEFAULT 'member',
-                    joined_at {timestamp_type}
-                )
-            ''')
-
-            # Alliance invitations table
-            cursor.execute(f'''
-                CREATE TABLE IF NOT EXISTS alliance_invitations (
-                    id {id_type} PRIMARY KEY {auto_increment},
-                    alliance_id INTEGER NOT NULL,
-                    inviter_id INTEGER NOT NULL,
-                    invitee_id INTEGER NOT NULL,
-                    status TEXT DEFAULT 'pending',
-                    created_at {timestamp_type}
-                )
-            ''')
-
-            conn.commit()
-            cursor.close()
+        """Make sure the alliance tables exist (they are created by the schema migrations)"""
+        self.db.initialize()
 
     def create_alliance(self, leader_id, alliance_name, description=""):
         """Create new alliance"""
@@ -69,54 +22,28 @@ class AllianceSystem:
         if self.get_player_alliance(leader_id):
             return {'success': False, 'message': 'شما قبلاً عضو یک اتحاد هستید!'}
 
-        with self.db.get_connection() as conn:
-            if self.db.use_mysql:
-                cursor = conn.cursor(dictionary=True)
-            else:
-                cursor = conn.cursor()
-
+        with self.db.transaction() as conn:
             # Check if alliance name already exists
-            if self.db.use_mysql:
-                cursor.execute('SELECT id FROM alliances WHERE name = %s', (alliance_name,))
-            else:
-                cursor.execute('SELECT id FROM alliances WHERE name = ?', (alliance_name,))
-
-            if cursor.fetchone():
+            if self.db.fetch_one('SELECT id FROM alliances WHERE name = ?', (alliance_name,), conn=conn):
                 return {'success': False, 'message': 'نام اتحاد قبلاً وجود دارد!'}
 
             # Create alliance
-            if self.db.use_mysql:
-                cursor.execute('''
-                    INSERT INTO alliances (name, leader_id, description, created_at)
-                    VALUES (%s, %s, %s, NOW())
-                ''', (alliance_name, leader_id, description))
-            else:
-                cursor.execute('''
-                    INSERT INTO alliances (name, leader_id, description, created_at)
-                    VALUES (?, ?, ?, datetime('now'))
-                ''', (alliance_name, leader_id, description))
-
-            alliance_id = cursor.lastrowid
+            alliance_id = self.db.insert('''
+                INSERT INTO alliances (name, leader_id, description, created_at)
+                VALUES (?, ?, ?, NOW())
+            ''', (alliance_name, leader_id, description), conn=conn)
 
             # Add leader as member
-            if self.db.use_mysql:
-                cursor.execute('''
-                    INSERT INTO alliance_members (alliance_id, user_id, role, joined_at)
-                    VALUES (%s, %s, 'leader', NOW())
-                ''', (alliance_id, leader_id))
-            else:
-                cursor.execute('''
-                    INSERT INTO alliance_members (alliance_id, user_id, role, joined_at)
-                    VALUES (?, ?, 'leader', datetime('now'))
-                ''', (alliance_id, leader_id))
+            self.db.execute('''
+                INSERT INTO alliance_members (alliance_id, user_id, role, joined_at)
+                VALUES (?, ?, 'leader', NOW())
+            ''', (alliance_id, leader_id), conn=conn)
 
-            conn.commit()
-
-            return {
-                'success': True,
-                'message': f'اتحاد "{alliance_name}" با موفقیت تشکیل شد!',
-                'alliance_id': alliance_id
-            }
+        return {
+            'success': True,
+            'message': f'اتحاد "{alliance_name}" با موفقیت تشکیل شد!',
+            'alliance_id': alliance_id
+        }
 
     def invite_to_alliance(self, inviter_id, invitee_id):
         """Invite player to alliance"""
@@ -138,22 +65,10 @@ class AllianceSystem:
         if existing:
             return {'success': False, 'message': 'دعوت‌نامه قبلاً ارسال شده!'}
 
-        with self.db.get_connection() as conn:
-            if self.db.use_mysql:
-                cursor = conn.cursor(dictionary=True)
-            else:
-                cursor = conn.cursor()
-            if self.db.use_mysql:
-                cursor.execute('''
-                    INSERT INTO alliance_invitations (alliance_id, inviter_id, invitee_id)
-                    VALUES (%s, %s, %s)
-                ''', (inviter_alliance['alliance_id'], inviter_id, invitee_id))
-            else:
-                cursor.execute('''
-                    INSERT INTO alliance_invitations (alliance_id, inviter_id, invitee_id)
-                    VALUES (?, ?, ?)
-                ''', (inviter_alliance['alliance_id'], inviter_id, invitee_id))
-            conn.commit()
+        self.db.execute('''
+            INSERT INTO alliance_invitations (alliance_id, inviter_id, invitee_id)
+            VALUES (?, ?, ?)
+        ''', (inviter_alliance['alliance_id'], inviter_id, invitee_id))
 
         return {
             'success': True,
@@ -171,194 +86,85 @@ class AllianceSystem:
         if invitation['status'] != 'pending':
             return {'success': False, 'message': 'این دعوت‌نامه قبلاً پاسخ داده شده!'}
 
-        with self.db.get_connection() as conn:
-            if self.db.use_mysql:
-                cursor = conn.cursor(dictionary=True)
-            else:
-                cursor = conn.cursor()
-
-            if response == 'accept':
+        if response == 'accept':
+            with self.db.transaction() as conn:
                 # Add to alliance
-                if self.db.use_mysql:
-                    cursor.execute('''
-                        INSERT INTO alliance_members (alliance_id, user_id, joined_at)
-                        VALUES (%s, %s, NOW())
-                    ''', (invitation['alliance_id'], player_id))
-                else:
-                    cursor.execute('''
-                        INSERT INTO alliance_members (alliance_id, user_id, joined_at)
-                        VALUES (?, ?, datetime('now'))
-                    ''', (invitation['alliance_id'], player_id))
+                self.db.execute('''
+                    INSERT INTO alliance_members (alliance_id, user_id, joined_at)
+                    VALUES (?, ?, NOW())
+                ''', (invitation['alliance_id'], player_id), conn=conn)
 
                 # Update invitation status
-                if self.db.use_mysql:
-                    cursor.execute('''
-                        UPDATE alliance_invitations 
-                        SET status = 'accepted' 
-                        WHERE id = %s
-                    ''', (invitation_id,))
-                else:
-                    cursor.execute('''
-                        UPDATE alliance_invitations 
-                        SET status = 'accepted' 
-                        WHERE id = ?
-                    ''', (invitation_id,))
-
-                conn.commit()
-
-                return {
-                    'success': True,
-                    'message': f'شما با موفقیت به اتحاد "{invitation["alliance_name"]}" پیوستید!'
-                }
-            else:
-                # Reject invitation
-                if self.db.use_mysql:
-                    cursor.execute('''
-                        UPDATE alliance_invitations 
-                        SET status = 'rejected' 
-                        WHERE id = %s
-                    ''', (invitation_id,))
-                else:
-                    cursor.execute('''
-                        UPDATE alliance_invitations 
-                        SET status = 'rejected' 
-                        WHERE id = ?
-                    ''', (invitation_id,))
-
-                conn.commit()
-
-                return {
-                    'success': True,
-                    'message': 'دعوت‌نامه رد شد.'
-                }
+                self.db.execute('''
+                    UPDATE alliance_invitations 
+                    SET status = 'accepted' 
+                    WHERE id = ?
+                ''', (invitation_id,), conn=conn)
+
+            return {
+                'success': True,
+                'message': f'شما با موفقیت به اتحاد "{invitation["alliance_name"]}" پیوستید!'
+            }
+        else:
+            # Reject invitation
+            self.db.execute('''
+                UPDATE alliance_invitations 
+                SET status = 'rejected' 
+                WHERE id = ?
+            ''', (invitation_id,))
+
+            return {
+                'success': True,
+                'message': 'دعوت‌نامه رد شد.'
+            }
 
     def get_player_alliance(self, player_id):
         """Get player's current alliance"""
-        with self.db.get_connection() as conn:
-            if self.db.use_mysql:
-                cursor = conn.cursor(dictionary=True)
-            else:
-                cursor = conn.cursor()
-            if self.db.use_mysql:
-                cursor.execute('''
-                    SELECT a.id as alliance_id, a.name as alliance_name, 
-                           am.role, a.leader_id, a.description
-                    FROM alliances a
-                    JOIN alliance_members am ON a.id = am.alliance_id
-                    WHERE am.user_id = %s
-                ''', (player_id,))
-            else:
-                cursor.execute('''
-                    SELECT a.id as alliance_id, a.name as alliance_name, 
-                           am.role, a.leader_id, a.description
-                    FROM alliances a
-                    JOIN alliance_members am ON a.id = am.alliance_id
-                    WHERE am.user_id = ?
-                ''', (player_id,))
-
-            result = cursor.fetchone()
-            return dict(result) if result else None
+        return self.db.fetch_one('''
+            SELECT a.id as alliance_id, a.name as alliance_name, 
+                   am.role, a.leader_id, a.description
+            FROM alliances a
+            JOIN alliance_members am ON a.id = am.alliance_id
+            WHERE am.user_id = ?
+        ''', (player_id,))
 
     def get_alliance_members(self, alliance_id):
         """Get alliance members"""
-        with self.db.get_connection() as conn:
-            if self.db.use_mysql:
-                cursor = conn.cursor(dictionary=True)
-            else:
-                cursor = conn.cursor()
-            if self.db.use_mysql:
-                cursor.execute('''
-                    SELECT p.user_id, p.country_name, p.username, am.role, am.joined_at
-                    FROM alliance_members am
-                    JOIN players p ON am.user_id = p.user_id
-                    WHERE am.alliance_id = %s
-                    ORDER BY am.role DESC, am.joined_at
-                ''', (alliance_id,))
-            else:
-                cursor.execute('''
-                    SELECT p.user_id, p.country_name, p.username, am.role, am.joined_at
-                    FROM alliance_members am
-                    JOIN players p ON am.user_id = p.user_id
-                    WHERE am.alliance_id = ?
-                    ORDER BY am.role DESC, am.joined_at
-                ''', (alliance_id,))
-
-            return [dict(row) for row in cursor.fetchall()]
+        return self.db.fetch_all('''
+            SELECT p.user_id, p.country_name, p.username, am.role, am.joined_at
+            FROM alliance_members am
+            JOIN players p ON am.user_id = p.user_id
+            WHERE am.alliance_id = ?
+            ORDER BY am.role DESC, am.joined_at
+        ''', (alliance_id,))
 
     def get_pending_invitations(self, player_id):
         """Get pending invitations for player"""
-        with self.db.get_connection() as conn:
-            if self.db.use_mysql:
-                cursor = conn.cursor(dictionary=True)
-            else:
-                cursor = conn.cursor()
-            if self.db.use_mysql:
-                cursor.execute('''
-                    SELECT ai.id, a.name as alliance_name, p.country_name as inviter_country,
-                           ai.created_at
-                    FROM alliance_invitations ai
-                    JOIN alliances a ON ai.alliance_id = a.id
-                    JOIN players p ON ai.inviter_id = p.user_id
-                    WHERE ai.invitee_id = %s AND ai.status = 'pending'
-                    ORDER BY ai.created_at DESC
-                ''', (player_id,))
-            else:
-                cursor.execute('''
-                    SELECT ai.id, a.name as alliance_name, p.country_name as inviter_country,
-                           ai.created_at
-                    FROM alliance_invitations ai
-                    JOIN alliances a ON ai.alliance_id = a.id
-                    JOIN players p ON ai.inviter_id = p.user_id
-                    WHERE ai.invitee_id = ? AND ai.status = 'pending'
-                    ORDER BY ai.created_at DESC
-                ''', (player_id,))
-
-            return [dict(row) for row in cursor.fetchall()]
+        return self.db.fetch_all('''
+            SELECT ai.id, a.name as alliance_name, p.country_name as inviter_country,
+                   ai.created_at
+            FROM alliance_invitations ai
+            JOIN alliances a ON ai.alliance_id = a.id
+            JOIN players p ON ai.inviter_id = p.user_id
+            WHERE ai.invitee_id = ? AND ai.status = 'pending'
+            ORDER BY ai.created_at DESC
+        ''', (player_id,))
 
     def get_pending_invitation(self, alliance_id, invitee_id):
         """Check for existing pending invitation"""
-        with self.db.get_connection() as conn:
-            if self.db.use_mysql:
-                cursor = conn.cursor(dictionary=True)
-            else:
-                cursor = conn.cursor()
-            if self.db.use_mysql:
-                cursor.execute('''
-                    SELECT id FROM alliance_invitations
-                    WHERE alliance_id = %s AND invitee_id = %s AND status = 'pending'
-                ''', (alliance_id, invitee_id))
-            else:
-                cursor.execute('''
-                    SELECT id FROM alliance_invitations
-                    WHERE alliance_id = ? AND invitee_id = ? AND status = 'pending'
-                ''', (alliance_id, invitee_id))
-
-            return cursor.fetchone() is not None
+        return self.db.fetch_one('''
+            SELECT id FROM alliance_invitations
+            WHERE alliance_id = ? AND invitee_id = ? AND status = 'pending'
+        ''', (alliance_id, invitee_id)) is not None
 
     def get_invitation(self, invitation_id):
         """Get invitation details"""
-        with self.db.get_connection() as conn:
-            if self.db.use_mysql:
-                cursor = conn.cursor(dictionary=True)
-            else:
-                cursor = conn.cursor()
-            if self.db.use_mysql:
-                cursor.execute('''
-                    SELECT ai.*, a.name as alliance_name
-                    FROM alliance_invitations ai
-                    JOIN alliances a ON ai.alliance_id = a.id
-                    WHERE ai.id = %s
-                ''', (invitation_id,))
-            else:
-                cursor.execute('''
-                    SELECT ai.*, a.name as alliance_name
-                    FROM alliance_invitations ai
-                    JOIN alliances a ON ai.alliance_id = a.id
-                    WHERE ai.id = ?
-                ''', (invitation_id,))
-
-            result = cursor.fetchone()
-            return dict(result) if result else None
+        return self.db.fetch_one('''
+            SELECT ai.*, a.name as alliance_name
+            FROM alliance_invitations ai
+            JOIN alliances a ON ai.alliance_id = a.id
+            WHERE ai.id = ?
+        ''', (invitation_id,))
 
     def leave_alliance(self, player_id):
         """Leave alliance"""
@@ -376,22 +182,10 @@ class AllianceSystem:
                 # Disband alliance
                 return self.disband_alliance(alliance['alliance_id'])
 
-        with self.db.get_connection() as conn:
-            if self.db.use_mysql:
-                cursor = conn.cursor(dictionary=True)
-            else:
-                cursor = conn.cursor()
-            if self.db.use_mysql:
-                cursor.execute('''
-                    DELETE FROM alliance_members 
-                    WHERE alliance_id = %s AND user_id = %s
-                ''', (alliance['alliance_id'], player_id))
-            else:
-                cursor.execute('''
-                    DELETE FROM alliance_members 
-                    WHERE alliance_id = ? AND user_id = ?
-                ''', (alliance['alliance_id'], player_id))
-            conn.commit()
+        self.db.execute('''
+            DELETE FROM alliance_members 
+            WHERE alliance_id = ? AND user_id = ?
+        ''', (alliance['alliance_id'], player_id))
 
         return {
             'success': True,
@@ -400,57 +194,25 @@ class AllianceSystem:
 
     def disband_alliance(self, alliance_id):
         """Disband alliance"""
-        with self.db.get_connection() as conn:
-            if self.db.use_mysql:
-                cursor = conn.cursor(dictionary=True)
-            else:
-                cursor = conn.cursor()
-
+        with self.db.transaction() as conn:
             # Remove all members
-            if self.db.use_mysql:
-                cursor.execute('DELETE FROM alliance_members WHERE alliance_id = %s', (alliance_id,))
-            else:
-                cursor.execute('DELETE FROM alliance_members WHERE alliance_id = ?', (alliance_id,))
+            self.db.execute('DELETE FROM alliance_members WHERE alliance_id = ?', (alliance_id,), conn=conn)
 
             # Remove all invitations
-            if self.db.use_mysql:
-                cursor.execute('DELETE FROM alliance_invitations WHERE alliance_id = %s', (alliance_id,))
-            else:
-                cursor.execute('DELETE FROM alliance_invitations WHERE alliance_id = ?', (alliance_id,))
+            self.db.execute('DELETE FROM alliance_invitations WHERE alliance_id = ?', (alliance_id,), conn=conn)
 
             # Remove alliance
-            if self.db.use_mysql:
-                cursor.execute('DELETE FROM alliances WHERE id = %s', (alliance_id,))
-            else:
-                cursor.execute('DELETE FROM alliances WHERE id = ?', (alliance_id,))
-
-            conn.commit()
+            self.db.execute('DELETE FROM alliances WHERE id = ?', (alliance_id,), conn=conn)
 
         return {'success': True, 'message': 'اتحاد منحل شد.'}
 
     def get_all_players(self):
         """Get all players"""
-        with self.db.get_connection() as conn:
-            if self.db.use_mysql:
-                cursor = conn.cursor(dictionary=True)
-            else:
-                cursor = conn.cursor()
-            cursor.execute('SELECT user_id, country_name FROM players')
-            return [dict(row) for row in cursor.fetchall()]
+        return self.db.fetch_all('SELECT user_id, country_name FROM players')
 
     def get_player(self, player_id):
         """Get player details"""
-        with self.db.get_connection() as conn:
-            if self.db.use_mysql:
-                cursor = conn.cursor(dictionary=True)
-            else:
-                cursor = conn.cursor()
-            if self.db.use_mysql:
-                cursor.execute('SELECT user_id, country_name FROM players WHERE user_id = %s', (player_id,))
-            else:
-                cursor.execute('SELECT user_id, country_name FROM players WHERE user_id = ?', (player_id,))
-            result = cursor.fetchone()
-            return dict(result) if result else None
+        return self.db.fetch_one('SELECT user_id, country_name FROM players WHERE user_id = ?', (player_id,))
 
     async def handle_statement_text(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle statement text input"""
@@ -670,17 +432,12 @@ class AllianceSystem:
 
     def get_last_invitation_id(self, invitee_id, alliance_id=None):
         """Get the ID of the last pending invitation for a player."""
-        with self.db.get_connection() as conn:
-            if self.db.use_mysql:
-                cursor = conn.cursor(dictionary=True)
-            else:
-                cursor = conn.cursor()
-            query = "SELECT id FROM alliance_invitations WHERE invitee_id = ?"
-            params = [invitee_id]
-            if alliance_id is not None:
-                query += " AND alliance_id = ?"
-                params.append(alliance_id)
-            query += " AND status = 'pending' ORDER BY created_at DESC LIMIT 1"
-            cursor.execute(query, tuple(params))
-            result = cursor.fetchone()
-            return result[0] if result else None
+        query = "SELECT id FROM alliance_invitations WHERE invitee_id = ?"
+        params = [invitee_id]
+        if alliance_id is not None:
+            query += " AND alliance_id = ?"
+            params.append(alliance_id)
+        query += " AND status = 'pending' ORDER BY created_at DESC LIMIT 1"
+        result = self.db.fetch_one(query, tuple(params))
+        return result['id'] if result else None
+
@@ -0,0 +1,311 @@
+"""
+DragonRP Async Database
+Awaitable counterpart of Database for async handlers: aiomysql or aiosqlite with their own pools
+"""
+
+import asyncio
+import logging
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+try:
+    import aiomysql
+except ImportError:  # optional extra: pip install .[async]
+    aiomysql = None
+
+try:
+    import aiosqlite
+except ImportError:  # optional extra: pip install .[async]
+    aiosqlite = None
+
+from sqlite_engine import is_busy_error
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDatabase:
+    """Portable-SQL query API and cached player reads that await the driver
+
+    Shares the Database's SQL dialect, player state cache and income settlement,
+    so rows read here and there stay coherent. When the driver for the active
+    backend is not installed (or its pool cannot be opened) every method runs the
+    blocking Database call through run_blocking instead, so callers need only one
+    code path. A transaction on that fallback is pinned to a thread of its own:
+    its connection, and with it SQLite's write lock, belongs to the thread that
+    began it, so the commit and every statement given conn= run there too.
+    """
+
+    def __init__(self, database, run_blocking=asyncio.to_thread, pool_size=5):
+        self.db = database
+        self.run_blocking = run_blocking
+        self.pool_size = pool_size
+        self._mysql_pool = None
+        self._sqlite_connections = None
+        self._sqlite_all = []
+        # Single-thread executors that fallback transactions are pinned to, kept for reuse
+        self._idle_threads = []
+        # id() of an open fallback transaction's connection -> its thread
+        self._pinned = {}
+
+    @property
+    def native(self):
+        """True when queries go through an async driver"""
+        return self._mysql_pool is not None or self._sqlite_connections is not None
+
+    async def start(self):
+        """Open the async pool for the backend Database settled on"""
+        try:
+            if self.db.use_mysql and aiomysql is not None:
+                config = self.db.connection_config
+                self._mysql_pool = await aiomysql.create_pool(
+                    host=config['host'], port=config['port'], user=config['user'],
+                    password=config['password'], db=config['database'], charset=config['charset'],
+                    autocommit=True, minsize=1, maxsize=self.pool_size
+                )
+            elif not self.db.use_mysql and aiosqlite is not None:
+                await self._open_sqlite()
+        except Exception as e:
+            logger.warning(f"Async database pool unavailable, using the executor: {e}")
+            self._mysql_pool = None
+            self._sqlite_connections = None
+
+        backend = ('aiomysql' if self._mysql_pool else 'aiosqlite') if self.native else 'executor'
+        logger.info(f"Async database ready ({backend})")
+
+    async def _open_sqlite(self):
+        engine = self.db.sqlite_engine
+        connections = asyncio.Queue()
+        for _ in range(self.pool_size):
+            # isolation_level=None: statements autocommit, transaction() issues BEGIN itself
+            conn = await aiosqlite.connect(self.db.sqlite_db_path, timeout=engine.busy_timeout, isolation_level=None,
+                                           uri=self.db.sqlite_db_path.startswith('file:'))
+            conn.row_factory = sqlite3.Row
+            for pragma in engine.pragma_statements():
+                await conn.execute(pragma)
+            self._sqlite_all.append(conn)
+            connections.put_nowait(conn)
+        self._sqlite_connections = connections
+
+    async def close(self):
+        """Close the async pool"""
+        if self._mysql_pool is not None:
+            self._mysql_pool.close()
+            await self._mysql_pool.wait_closed()
+            self._mysql_pool = None
+        for conn in self._sqlite_all:
+            await conn.close()
+        self._sqlite_all = []
+        self._sqlite_connections = None
+        for thread in self._idle_threads:
+            thread.shutdown(wait=False)
+        self._idle_threads = []
+
+    @asynccontextmanager
+    async def _connection(self, conn=None):
+        """The caller's connection when given, otherwise one from the pool"""
+        if conn is not None:
+            yield conn
+        elif self._mysql_pool is not None:
+            async with self._mysql_pool.acquire() as conn:
+                yield conn
+        else:
+            conn = await self._sqlite_connections.get()
+            try:
+                yield conn
+            finally:
+                if conn.in_transaction:
+                    await conn.rollback()
+                self._sqlite_connections.put_nowait(conn)
+
+    @asynccontextmanager
+    async def transaction(self):
+        """Run several statements on one connection as a single transaction"""
+        if not self.native:
+            thread = self._idle_threads.pop() if self._idle_threads else \
+                ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-transaction')
+            loop = asyncio.get_running_loop()
+            context = self.db.transaction()
+            try:
+                conn = await loop.run_in_executor(thread, context.__enter__)
+                self._pinned[id(conn)] = thread
+                try:
+                    yield conn
+                except BaseException as e:
+                    await loop.run_in_executor(thread, context.__exit__, type(e), e, e.__traceback__)
+                    raise
+                else:
+                    await loop.run_in_executor(thread, context.__exit__, None, None, None)
+                finally:
+                    del self._pinned[id(conn)]
+            finally:
+                if len(self._idle_threads) < self.pool_size:
+                    self._idle_threads.append(thread)
+                else:
+                    thread.shutdown(wait=False)
+            return
+
+        async with self._connection() as conn:
+            if self._mysql_pool is not None:
+                await conn.begin()
+            else:
+                await self._retry_busy(conn.execute, 'BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                await conn.rollback()
+                raise
+            else:
+                await conn.commit()
+
+    async def _retry_busy(self, call, *args):
+        """Await call(*args), retried while SQLite stays locked past busy_timeout"""
+        engine = self.db.sqlite_engine
+        for attempt in range(engine.busy_retries + 1):
+            try:
+                return await call(*args)
+            except sqlite3.OperationalError as e:
+                if attempt == engine.busy_retries or not is_busy_error(e):
+                    raise
+                engine.retries += 1
+                await asyncio.sleep(engine.retry_backoff * 2 ** attempt)
+
+    async def _blocking(self, method, sql, params, conn):
+        """Run a blocking query method, its statement credited to the coroutine that awaited the caller
+
+        A statement inside a fallback transaction runs on the transaction's thread.
+        """
+        caller = sys._getframe(2).f_code
+        thread = self._pinned.get(id(conn)) if conn is not None else None
+        if thread is not None:
+            return await asyncio.get_running_loop().run_in_executor(
+                thread, self.db.run_as, caller, method, sql, params, conn)
+        return await self.run_blocking(self.db.run_as, caller, method, sql, params, conn)
+
+    async def _run(self, sql, params, conn, many, result):
+        """Execute a portable statement and read result(cursor) before releasing the connection"""
+        # Frame 1 is execute/fetch_one/..., frame 2 the coroutine that awaited it
+        caller = sys._getframe(2).f_code
+        started = time.perf_counter()
+        compiled = self.db.dialect.compile(sql)
+        async with self._connection(conn) as active:
+            if self._mysql_pool is not None:
+                async with active.cursor(aiomysql.DictCursor) as cursor:
+                    if many:
+                        await cursor.executemany(compiled, params)
+                    else:
+                        await cursor.execute(compiled, params)
+                    value = await result(cursor)
+                    rowcount = cursor.rowcount
+            else:
+                execute = active.executemany if many else active.execute
+                if conn is None:
+                    # A statement on its own connection is its own transaction, safe to retry
+                    cursor = await self._retry_busy(execute, compiled, params)
+                else:
+                    cursor = await execute(compiled, params)
+                try:
+                    value = await result(cursor)
+                    rowcount = cursor.rowcount
+                finally:
+                    await cursor.close()
+
+        if self.db.query_stats is not None:
+            if result is _all_rows:
+                rows = len(value)
+            elif result is _first_row:
+                rows = int(value is not None)
+            else:
+                rows = max(rowcount, 0)
+            self.db.query_stats.record(caller, sql, time.perf_counter() - started, rows)
+        return value
+
+    async def execute(self, sql, params=(), conn=None):
+        """Run a portable write statement and return the affected row count"""
+        if not self.native:
+            return await self._blocking(self.db.execute, sql, params, conn)
+        return await self._run(sql, params, conn, False, _rowcount)
+
+    async def execute_many(self, sql, seq_of_params, conn=None):
+        """Run a portable statement once per parameter tuple"""
+        if not self.native:
+            return await self._blocking(self.db.execute_many, sql, seq_of_params, conn)
+        return await self._run(sql, seq_of_params, conn, True, _rowcount)
+
+    async def insert(self, sql, params=(), conn=None):
+        """Run a portable INSERT and return the new row id"""
+        if not self.native:
+            return await self._blocking(self.db.insert, sql, params, conn)
+        return await self._run(sql, params, conn, False, _lastrowid)
+
+    async def fetch_one(self, sql, params=(), conn=None):
+        """First row of a portable query as a dict, or None"""
+        if not self.native:
+            return await self._blocking(self.db.fetch_one, sql, params, conn)
+        return await self._run(sql, params, conn, False, _first_row)
+
+    async def fetch_all(self, sql, params=(), conn=None):
+        """All rows of a portable query as dicts"""
+        if not self.native:
+            return await self._blocking(self.db.fetch_all, sql, params, conn)
+        return await self._run(sql, params, conn, False, _all_rows)
+
+    async def _settle(self, user_ids):
+        """Credit income cycles that came due before serving these players' rows"""
+        due = self.db.income_due(user_ids)
+        if due:
+            await self.run_blocking(self.db.settle_income, due)
+
+    async def _read_through(self, table, user_id):
+        """Serve a player row from the shared state cache, loading it on a miss"""
+        found, row = self.db.cache.get(user_id, table)
+        if found:
+            return row
+
+        sql_table, missing = self.db.STATE_TABLES[table]
+        generation = self.db.cache.generation(user_id)
+        row = await self.fetch_one(f'SELECT * FROM {sql_table} WHERE user_id = ?', (user_id,))
+        if row is None:
+            row = missing
+        self.db.cache.put(user_id, table, row, generation)
+        return row
+
+    async def get_player(self, user_id):
+        """Get player information"""
+        if not self.native:
+            return await self.run_blocking(self.db.get_player, user_id)
+        await self._settle((user_id,))
+        return await self._read_through('player', user_id)
+
+    async def get_player_state(self, user_id):
+        """One player's four state rows, or None if the player does not exist"""
+        if not self.native:
+            return await self.run_blocking(self.db.get_player_state, user_id)
+        await self._settle((user_id,))
+        tables = list(self.db.STATE_TABLES)
+        rows = await asyncio.gather(*(self._read_through(table, user_id) for table in tables))
+        state = dict(zip(tables, rows))
+        return state if state['player'] else None
+
+    async def get_all_countries(self):
+        """Get all countries with players"""
+        return await self.fetch_all(self.db.ALL_COUNTRIES_SQL)
+
+
+async def _rowcount(cursor):
+    return cursor.rowcount
+
+
+async def _lastrowid(cursor):
+    return cursor.lastrowid
+
+
+async def _first_row(cursor):
+    row = await cursor.fetchone()
+    return dict(row) if row else None
+
+
+async def _all_rows(cursor):
+    return [dict(row) for row in await cursor.fetchall()]
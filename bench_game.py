@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+DragonRP Game Benchmark
+Latency, statement counts and peak memory of the game engine hot paths on a synthetic world
+
+Usage: python bench_game.py [--players 35,500,2000] [--iterations N] [--output FILE] [--baseline FILE]
+
+Each world is a MemoryDatabase seeded with --players countries. Every operation
+is timed on its own; setup such as queueing due attacks is not. Statement counts
+are Database statements per run, and peak memory is measured in a separate
+tracemalloc pass so it does not skew the latencies. The results are written as
+JSON. With --baseline, any operation whose p50 latency or statement count grew
+by more than --threshold is reported and the exit status is 1.
+"""
+
+import argparse
+import gc
+import json
+import logging
+import math
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from combat import CombatSystem
+from config import Config
+from convoy import ConvoySystem
+from economy import Economy
+from game_logic import GameLogic
+from marketplace import Marketplace
+from memory_database import MemoryDatabase
+from query_stats import QueryStats
+
+STARTING_MONEY = 10 ** 12
+STARTING_RESOURCES = {resource: 10 ** 7 for resource in Config.RESOURCES}
+STARTING_BUILDINGS = {building: 2 for building in Config.BUILDINGS}
+STARTING_WEAPONS = {
+    'rifle': 100000, 'tank': 20000, 'fighter_jet': 5000, 'drone': 10000,
+    'simple_missile': 5000, 'air_defense': 2000, 'warship': 1000
+}
+LISTINGS_PER_PLAYER = 2
+MEMORY_SAMPLES = 3
+
+
+class World:
+    """A seeded MemoryDatabase with the game systems the bot runs on it"""
+
+    def __init__(self, players, rng):
+        self.rng = rng
+        self.db = MemoryDatabase()
+        if self.db.query_stats is None:
+            # Statement counts come from the query stats even when DB_QUERY_STATS=0
+            self.db.query_stats = QueryStats()
+        self.economy = Economy(self.db)
+        self.game_logic = GameLogic(self.db)
+        self.combat = CombatSystem(self.db)
+        self.convoy = ConvoySystem(self.db)
+        self.marketplace = Marketplace(self.db)
+
+        self.user_ids = self.db.seed_players(players, money=STARTING_MONEY, resources=STARTING_RESOURCES,
+                                             buildings=STARTING_BUILDINGS, weapons=STARTING_WEAPONS)
+        self.countries = {country['user_id']: country['country_code'] for country in self.db.get_all_countries()}
+        self.db.execute_many('''
+            INSERT INTO market_listings
+            (seller_id, item_type, item_category, quantity, price_per_unit, total_price, security_level)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [self._listing(seller_id) for seller_id in self.user_ids for _ in range(LISTINGS_PER_PLAYER)])
+
+    def _listing(self, seller_id):
+        resource = self.rng.choice(list(STARTING_RESOURCES))
+        return (seller_id, resource, 'resource', 1000, 10, 10000, self.rng.randint(10, 90))
+
+    def pair(self):
+        """Two different random players"""
+        return tuple(self.rng.sample(self.user_ids, 2))
+
+    def close(self):
+        self.db.close()
+
+    # Each operation is setup(world) -> args, run(world, args); only run is measured
+
+    def rewind_income(self):
+        due = datetime.now().replace(microsecond=0) - self.economy.cycle_length - timedelta(minutes=1)
+        self.db.execute('UPDATE players SET last_settled_at = ?', (due,))
+        self.db.cache.clear()
+
+    def queue_attacks(self, batch):
+        attack_time = datetime.now() - timedelta(minutes=1)
+        for _ in range(batch):
+            attacker_id, defender_id = self.pair()
+            self.db.create_pending_attack({
+                'attacker_id': attacker_id, 'defender_id': defender_id, 'attack_type': 'mixed',
+                'travel_time': 0, 'attack_time': attack_time, 'status': 'traveling'
+            })
+
+    def queue_convoys(self, batch):
+        for _ in range(batch):
+            sender_id, receiver_id = self.pair()
+            self.db.create_convoy(sender_id, receiver_id, {'money': 1000, 'iron': 100}, travel_minutes=-1)
+
+    def add_listing(self):
+        seller_id, buyer_id = self.pair()
+        listing_id = self.db.insert('''
+            INSERT INTO market_listings
+            (seller_id, item_type, item_category, quantity, price_per_unit, total_price, security_level)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', self._listing(seller_id))
+        return buyer_id, listing_id
+
+    def attack_weapons_args(self):
+        attacker_id, defender_id = self.pair()
+        return self.countries[attacker_id], self.countries[defender_id], self.db.get_player_weapons(attacker_id)
+
+
+def operations(batch):
+    """name -> (setup, run, samples divisor); sweeps are slower, so they take fewer samples"""
+    return {
+        'income_cycle': (
+            lambda world: world.rewind_income(),
+            lambda world, _: world.economy.run_income_cycle(),
+            10
+        ),
+        'execute_attack': (
+            lambda world: world.pair(),
+            lambda world, pair: world.combat.execute_attack(*pair),
+            1
+        ),
+        'process_pending_attacks': (
+            lambda world: world.queue_attacks(batch),
+            lambda world, _: world.combat.process_pending_attacks(),
+            10
+        ),
+        'process_convoy_arrivals': (
+            lambda world: world.queue_convoys(batch),
+            lambda world, _: world.convoy.process_convoy_arrivals(),
+            10
+        ),
+        'purchase_item': (
+            lambda world: world.add_listing(),
+            lambda world, args: world.marketplace.purchase_item(args[0], args[1], 10),
+            1
+        ),
+        'get_active_listings': (
+            lambda world: world.rng.choice([None, 'resource']),
+            lambda world, category: world.marketplace.get_active_listings(category),
+            1
+        ),
+        'produce_weapon': (
+            lambda world: (world.rng.choice(world.user_ids), world.rng.choice(['rifle', 'tank', 'drone'])),
+            lambda world, args: world.game_logic.produce_weapon(*args),
+            1
+        ),
+        'get_available_weapons_for_attack': (
+            lambda world: world.attack_weapons_args(),
+            lambda world, args: Config.get_available_weapons_for_attack(*args),
+            1
+        ),
+    }
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an ascending list"""
+    index = min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def measure(world, setup, run, samples):
+    latencies = []
+    statements = 0
+    query_stats = world.db.query_stats
+    query_stats.reset()
+    for _ in range(samples):
+        args = setup(world)
+        before = query_stats.statement_count
+        started = time.perf_counter()
+        run(world, args)
+        latencies.append((time.perf_counter() - started) * 1000)
+        statements += query_stats.statement_count - before
+
+    peak = 0
+    tracemalloc.start()
+    try:
+        for _ in range(MEMORY_SAMPLES):
+            args = setup(world)
+            gc.collect()
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            run(world, args)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - base)
+    finally:
+        tracemalloc.stop()
+
+    ordered = sorted(latencies)
+    return {
+        'samples': samples,
+        'mean_ms': round(sum(ordered) / samples, 4),
+        'p50_ms': round(percentile(ordered, 0.50), 4),
+        'p90_ms': round(percentile(ordered, 0.90), 4),
+        'p99_ms': round(percentile(ordered, 0.99), 4),
+        'max_ms': round(ordered[-1], 4),
+        'statements': round(statements / samples, 2),
+        'peak_kib': round(peak / 1024, 1)
+    }
+
+
+def run_benchmarks(player_counts, iterations, batch, seed):
+    results = {}
+    for players in player_counts:
+        rng = random.Random(seed)
+        random.seed(seed)  # combat, convoys and deliveries roll on the module RNG
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        world = World(players, rng)
+        seed_seconds = time.perf_counter() - started
+        seed_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        try:
+            world_results = {'seed_s': round(seed_seconds, 3), 'seed_peak_kib': round(seed_peak / 1024, 1),
+                             'operations': {}}
+            for name, (setup, run, divisor) in operations(min(batch, players)).items():
+                world_results['operations'][name] = measure(world, setup, run, max(3, iterations // divisor))
+        finally:
+            world.close()
+        results[str(players)] = world_results
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """Operations whose p50 latency or statement count grew beyond threshold"""
+    regressions = []
+    for players, world_results in results.items():
+        previous = baseline.get('results', {}).get(players)
+        if not previous:
+            continue
+        for name, current in world_results['operations'].items():
+            before = previous['operations'].get(name)
+            if not before:
+                continue
+            for metric in ('p50_ms', 'statements'):
+                if before[metric] and current[metric] > before[metric] * (1 + threshold):
+                    regressions.append(f"{players} players {name} {metric}: {before[metric]} -> {current[metric]}")
+    return regressions
+
+
+def print_table(results):
+    header = f"{'operation':<34}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'stmts':>8}{'peak KiB':>10}"
+    for players, world_results in results.items():
+        print(f"\n{players} players (seeded in {world_results['seed_s']}s, "
+              f"{world_results['seed_peak_kib']:,.0f} KiB)")
+        print(header)
+        for name, stats in world_results['operations'].items():
+            print(f"{name:<34}{stats['p50_ms']:>10.3f}{stats['p90_ms']:>10.3f}{stats['p99_ms']:>10.3f}"
+                  f"{stats['statements']:>8}{stats['peak_kib']:>10,.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    parser.add_argument('--players', default='35,500,2000', help='comma separated world sizes')
+    parser.add_argument('--iterations', type=int, default=200, help='samples per operation (sweeps take a tenth)')
+    parser.add_argument('--batch', type=int, default=50, help='attacks/convoys due per sweep')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default='bench_game.json', help='JSON results file')
+    parser.add_argument('--baseline', help='JSON results of an earlier build to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed growth before a regression (0.25 = 25%%)')
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.WARNING)
+    player_counts = [int(count) for count in args.players.split(',')]
+    results = run_benchmarks(player_counts, args.iterations, args.batch, args.seed)
+
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'iterations': args.iterations,
+            'batch': args.batch,
+            'seed': args.seed
+        },
+        'results': results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print_table(results)
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print(f"No regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
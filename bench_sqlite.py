@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+DragonRP SQLite Benchmark
+Compares SQLite with default pragmas, the tuned SQLite engine and (optionally) MySQL
+
+Usage: python bench_sqlite.py [--players N] [--mysql]
+
+The workloads run through Database.execute/fetch_one/transaction on a scratch
+bench_players table that is dropped afterwards. --mysql benchmarks the database
+named by DB_NAME/DB_HOST; it is skipped if MySQL is unreachable.
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from config import Config
+from database import Database
+
+# What sqlite3 gives you without any pragmas
+SQLITE_DEFAULTS = {
+    'journal_mode': 'DELETE',
+    'synchronous': 'FULL',
+    'cache_size_kb': 2000,
+    'mmap_size_mb': 0
+}
+
+
+def make_database(backend):
+    db = Database()
+    if backend == 'mysql':
+        db.use_mysql = True
+        with db.get_connection():
+            pass
+        if not db.use_mysql:
+            return None
+    else:
+        db.use_mysql = False
+        db.sqlite_db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+        if backend == 'sqlite-default':
+            db.sqlite_settings.update(SQLITE_DEFAULTS)
+    return db
+
+
+def timed(operations, func):
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    return operations / elapsed
+
+
+def run_workloads(db, players):
+    db.execute('DROP TABLE IF EXISTS bench_players')
+    db.execute('CREATE TABLE bench_players (user_id INTEGER PRIMARY KEY, money BIGINT NOT NULL DEFAULT 0)')
+    db.execute_many('INSERT INTO bench_players (user_id, money) VALUES (?, 0)',
+                    [(user_id,) for user_id in range(players)])
+    results = {}
+
+    def point_reads():
+        for number in range(players * 10):
+            db.fetch_one('SELECT money FROM bench_players WHERE user_id = ?', (number % players,))
+    results['point reads'] = timed(players * 10, point_reads)
+
+    def single_writes():
+        for number in range(players * 5):
+            db.execute('UPDATE bench_players SET money = money + 1 WHERE user_id = ?', (number % players,))
+    results['autocommit writes'] = timed(players * 5, single_writes)
+
+    def transactions():
+        for number in range(players * 2):
+            with db.transaction() as conn:
+                db.fetch_one('SELECT money FROM bench_players WHERE user_id = ?', (number % players,), conn=conn)
+                db.execute('UPDATE bench_players SET money = money - 1 WHERE user_id = ?', (number % players,), conn=conn)
+                db.execute('UPDATE bench_players SET money = money + 1 WHERE user_id = ?', ((number + 1) % players,), conn=conn)
+    results['transfer transactions'] = timed(players * 2, transactions)
+
+    workers = Config.DATABASE_CONFIG['executor_workers']
+
+    def contended():
+        def worker(offset):
+            for number in range(players):
+                with db.transaction() as conn:
+                    db.execute('UPDATE bench_players SET money = money + 1 WHERE user_id = ?',
+                               ((number + offset) % players,), conn=conn)
+                db.fetch_one('SELECT money FROM bench_players WHERE user_id = ?', (number % players,))
+        threads = [threading.Thread(target=worker, args=(offset,)) for offset in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    results[f'{workers} threads write+read'] = timed(players * workers * 2, contended)
+
+    db.execute('DROP TABLE bench_players')
+    db.close_pools()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--players', type=int, default=200)
+    parser.add_argument('--mysql', action='store_true', help='also benchmark the MySQL server in DB_NAME')
+    args = parser.parse_args()
+
+    backends = ['sqlite-default', 'sqlite-tuned'] + (['mysql'] if args.mysql else [])
+    table = {}
+    for backend in backends:
+        db = make_database(backend)
+        if db is None:
+            print(f"{backend}: unreachable, skipped")
+            continue
+        table[backend] = run_workloads(db, args.players)
+
+    workloads = next(iter(table.values())).keys()
+    print(f"{'ops/s':<24}" + ''.join(f"{backend:>16}" for backend in table))
+    for workload in workloads:
+        print(f"{workload:<24}" + ''.join(f"{table[backend][workload]:>16,.0f}" for backend in table))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+DragonRP Callback Router
+Maps callback_data to handlers by exact key (dict) or longest prefix (trie)
+"""
+
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Rate classes: how expensive a route is for the bot and the database
+VIEW = 'view'        # renders a menu from cached state
+ACTION = 'action'    # changes game state
+ADMIN = 'admin'      # admin tools
+
+
+class Route:
+    """A registered callback with its metadata"""
+
+    __slots__ = ('name', 'handler', 'is_prefix', 'parse', 'admin_only', 'rate_class', 'read_only')
+
+    def __init__(self, name, handler, is_prefix, parse=None, admin_only=False, rate_class=VIEW, read_only=True):
+        self.name = name
+        self.handler = handler
+        self.is_prefix = is_prefix
+        self.parse = parse
+        self.admin_only = admin_only
+        self.rate_class = rate_class
+        self.read_only = read_only
+
+
+class RouteStats:
+    """Calls, errors and time spent per route"""
+
+    __slots__ = ('calls', 'errors', 'seconds')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.seconds = 0.0
+
+
+class CallbackRouter:
+    """Exact keys resolve with one dict lookup; prefixes by walking a character trie
+
+    The longest registered prefix wins, so `convoy_escort_` takes precedence over
+    `convoy_` regardless of registration order. A prefix route's parse(suffix)
+    returns the extra handler arguments, parsed once here.
+    """
+
+    _END = ''  # trie key holding the route that ends at this node
+
+    def __init__(self, is_admin=None, denied_text="❌ شما مجاز به این کار نیستید!"):
+        self.is_admin = is_admin
+        self.denied_text = denied_text
+        self._exact = {}
+        self._trie = {}
+        self.stats = {}
+
+    def exact(self, key, handler, **meta):
+        """Route callback_data equal to key"""
+        self._exact[key] = Route(key, handler, False, **meta)
+        self.stats.setdefault(key, RouteStats())
+
+    def prefix(self, prefix, handler, parse=None, **meta):
+        """Route callback_data starting with prefix; parse(suffix) gives extra handler args"""
+        node = self._trie
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node[self._END] = Route(prefix, handler, True, parse, **meta)
+        self.stats.setdefault(prefix, RouteStats())
+
+    def resolve(self, data):
+        """(route, args) for callback_data, or (None, ()) when nothing matches"""
+        route = self._exact.get(data)
+        if route is not None:
+            return route, ()
+
+        node = self._trie
+        for char in data:
+            node = node.get(char)
+            if node is None:
+                break
+            route = node.get(self._END, route)
+        if route is None:
+            return None, ()
+        if route.parse is None:
+            return route, ()
+        return route, route.parse(data[len(route.name):])
+
+    async def dispatch(self, query, context):
+        """Run the handler for query.data; False when no route matches"""
+        route, args = self.resolve(query.data)
+        if route is None:
+            return False
+
+        if route.admin_only and not (self.is_admin and self.is_admin(query.from_user.id)):
+            await query.edit_message_text(self.denied_text)
+            return True
+
+        stats = self.stats[route.name]
+        stats.calls += 1
+        started = time.perf_counter()
+        try:
+            await route.handler(query, context, *args)
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            stats.seconds += time.perf_counter() - started
+        return True
+
+    def report(self, limit=10):
+        """Busiest routes as (name, calls, errors, average ms)"""
+        rows = [
+            (name, stats.calls, stats.errors, stats.seconds * 1000 / stats.calls)
+            for name, stats in self.stats.items() if stats.calls
+        ]
+        rows.sort(key=lambda row: row[1], reverse=True)
+        return rows[:limit]
@@ -1,6 +1,8 @@
 import logging
 import random
 from config import Config
+from power_model import PowerModel
+from database import as_datetime
 from datetime import datetime, timedelta
 import asyncio
 
@@ -9,6 +11,24 @@ logger = logging.getLogger(__name__)
 class CombatSystem:
     def __init__(self, database):
         self.db = database
+        self.power = PowerModel(database.WEAPON_COLUMNS, Config)
+        self.deadlines = None
+
+    def set_deadline_scheduler(self, deadlines):
+        """Push attack arrivals into the bot's deadline scheduler"""
+        self.deadlines = deadlines
+
+    def schedule_attack(self, attack_id, attack_time):
+        """Fire process_pending_attacks when this attack lands"""
+        if self.deadlines is not None:
+            self.deadlines.schedule('attack', attack_id, attack_time)
+
+    def schedule_traveling_attacks(self):
+        """Load every traveling attack into the deadline scheduler (startup)"""
+        attacks = self.db.get_pending_attack_deadlines()
+        for attack in attacks:
+            self.schedule_attack(attack['id'], as_datetime(attack['attack_time']))
+        return len(attacks)
 
     def can_attack_country(self, attacker_id, defender_id):
         """Check if attacker can attack defender based on distance and available weapons"""
@@ -125,8 +145,9 @@ class CombatSystem:
                 # Check if this is conquest mode
                 conquest_mode = bool(attack.get('conquest_mode', 0))
 
-                # Execute the attack
-                result = self.execute_attack(attack['attacker_id'], attack['defender_id'], conquest_mode)
+                # Execute the attack; its war news commits with the battle
+                result = self.execute_attack(attack['attacker_id'], attack['defender_id'], conquest_mode,
+                                             news_key=f"attack:{attack['id']}")
 
                 # Mark as completed
                 self.db.update_pending_attack_status(attack['id'], 'completed')
@@ -146,66 +167,20 @@ class CombatSystem:
 
     def calculate_attack_power(self, user_id):
         """Calculate total attack power"""
-        weapons = self.db.get_player_weapons(user_id)
-        total_power = 0
-
-        # Only offensive weapons count for attack
-        for weapon_type, count in weapons.items():
-            if weapon_type != 'user_id' and count > 0:
-                # Check if weapon exists in config
-                if weapon_type in Config.WEAPONS:
-                    weapon_info = Config.WEAPONS[weapon_type]
-                    
-                    # Skip transport and pure defense weapons
-                    if weapon_info.get('category') in ['transport', 'defense']:
-                        continue
-                        
-                    # Skip specific defensive weapons
-                    if weapon_type in ['s500_defense', 'thaad_defense', 's400_defense',
-                                      'iron_dome', 'slq32_ew', 'phalanx_ciws']:
-                        continue
-                    
-                    weapon_power = weapon_info.get('power', 0)
-                    total_power += weapon_power * count
-
-        return total_power
+        return self.power.attack_power(self.db.get_player_weapons(user_id))
 
     def calculate_defense_power(self, user_id):
         """Calculate total defense power"""
-        weapons = self.db.get_player_weapons(user_id)
-        defense_power = 0
-
-        # Defense weapons
-        defense_weapons = ['s500_defense', 'thaad_defense', 's400_defense', 'iron_dome', 'slq32_ew', 'phalanx_ciws']
-
-        for weapon_type in defense_weapons:
-            count = weapons.get(weapon_type, 0)
-            if count > 0 and weapon_type in Config.WEAPONS:
-                weapon_power = Config.WEAPONS[weapon_type]['power']
-                defense_power += weapon_power * count
-
-        # Add some defensive value from other weapons
-        for weapon_type, count in weapons.items():
-            if weapon_type not in defense_weapons and weapon_type != 'user_id' and count > 0:
-                if weapon_type in Config.WEAPONS:
-                    weapon_power = Config.WEAPONS[weapon_type]['power']
-                    defense_power += weapon_power * count * 0.3  # 30% defensive value
-
-        return defense_power
+        return self.power.defense_power(self.db.get_player_weapons(user_id))
 
     def calculate_military_power(self, user_id):
         """Calculate total military power for display purposes"""
-        weapons = self.db.get_player_weapons(user_id)
-        total_power = 0
+        return self.power.military_power(self.db.get_player_weapons(user_id))
 
-        # Calculate total power from all weapons
-        for weapon_type, count in weapons.items():
-            if weapon_type != 'user_id' and count > 0:
-                if weapon_type in Config.WEAPONS:
-                    weapon_power = Config.WEAPONS[weapon_type]['power']
-                    total_power += weapon_power * count
-
-        return total_power
+    def calculate_all_powers(self, user_ids=None):
+        """Attack, defense and military power for many players in one pass"""
+        state = self.db.load_player_state(user_ids)
+        return self.power.powers({uid: s['weapons'] for uid, s in state.items()})
 
     def schedule_delayed_attack(self, attacker_id, defender_id, attack_type="mixed", conquest_mode=False):
         """Schedule a delayed attack based on travel time"""
@@ -232,11 +207,12 @@ class CombatSystem:
             'attack_type': attack_type,
             'conquest_mode': conquest_mode,
             'travel_time': travel_time,
-            'attack_time': attack_time.isoformat(),
+            'attack_time': attack_time,
             'status': 'traveling'
         }
 
         attack_id = self.db.create_pending_attack(attack_data)
+        self.schedule_attack(attack_id, attack_time)
 
         mode_text = " (حالت فتح)" if conquest_mode else ""
         return {
@@ -248,8 +224,11 @@ class CombatSystem:
             'message': f'نیروهای شما به سمت {defender["country_name"]} در حرکت هستند{mode_text}! زمان رسیدن: {travel_time} دقیقه'
         }
 
-    def execute_attack(self, attacker_id, defender_id, conquest_mode=False):
-        """Execute attack between countries"""
+    def execute_attack(self, attacker_id, defender_id, conquest_mode=False, news_key=None):
+        """Execute attack between countries
+
+        news_key queues the war news of a successful attack under that dedup key.
+        """
         can_attack, reason = self.can_attack_country(attacker_id, defender_id)
         if not can_attack:
             return {'success': False, 'message': reason}
@@ -291,8 +270,8 @@ class CombatSystem:
             result['success'] = True
             result['winner'] = attacker['country_name']
 
-            # Apply battle consequences
-            self._apply_successful_attack(attacker_id, defender_id, damage, result, conquest_mode)
+            # Work out battle consequences
+            deltas = self._apply_successful_attack(attacker_id, defender_id, damage, result, conquest_mode)
 
         else:
             # Attack failed
@@ -300,21 +279,25 @@ class CombatSystem:
             result['winner'] = defender['country_name']
 
             # Attacker suffers losses (doubled in failed attacks)
-            self._apply_failed_attack(attacker_id, abs(damage), result)
+            deltas = self._apply_failed_attack(attacker_id, abs(damage), result)
 
-        # Log the war
-        self._log_war(attacker_id, defender_id, result)
+        # Apply losses, loot and the war log together
+        self._commit_battle(attacker_id, defender_id, deltas, result, news_key)
 
         return result
 
     def _apply_successful_attack(self, attacker_id, defender_id, damage, result, conquest_mode=False):
-        """Apply consequences of successful attack"""
-        defender = self.db.get_player(defender_id)
-        defender_resources = self.db.get_player_resources(defender_id)
-        defender_weapons = self.db.get_player_weapons(defender_id)
-        defender_buildings = self.db.get_player_buildings(defender_id)
+        """Work out consequences of successful attack as per-player deltas"""
+        defender_state = self.db.get_player_state(defender_id)
+        defender = defender_state['player']
+        defender_resources = defender_state['resources']
+        defender_weapons = defender_state['weapons']
+        defender_buildings = defender_state['buildings']
         attacker_weapons = self.db.get_player_weapons(attacker_id)
 
+        attacker_delta = {'weapons': {}, 'resources': {}, 'buildings': {}}
+        defender_delta = {'weapons': {}, 'resources': {}, 'buildings': {}}
+
         # Calculate attack and defense power for percentage calculations
         attack_power = self.calculate_attack_power(attacker_id)
         defense_power = self.calculate_defense_power(defender_id)
@@ -343,8 +326,7 @@ class CombatSystem:
                         
                         if losses > 0:
                             result['attacker_losses'][weapon_type] = losses
-                            new_count = count - losses
-                            self.db.update_weapon_count(attacker_id, weapon_type, new_count)
+                            attacker_delta['weapons'][weapon_type] = -losses
 
         # Calculate resource loot percentage (10% to 75%)
         if power_ratio <= 0.5:
@@ -390,13 +372,12 @@ class CombatSystem:
         # Enhanced weapon losses based on power ratio
         weapon_loss_chance = min(0.4, 0.1 + (power_ratio * 0.05))
         for weapon_type, count in defender_weapons.items():
-            if count > 0 and random.random() < weapon_loss_chance:
+            if weapon_type != 'user_id' and count > 0 and random.random() < weapon_loss_chance:
                 loss_percentage = min(0.3, 0.05 + (power_ratio * 0.03))
                 losses = min(count, max(1, int(count * loss_percentage)))
                 result['defender_losses'][weapon_type] = losses
                 # Remove weapons from defender
-                new_count = count - losses
-                self.db.update_weapon_count(defender_id, weapon_type, new_count)
+                defender_delta['weapons'][weapon_type] = -losses
 
         # Steal resources based on calculated percentage
         for resource_type, amount in defender_resources.items():
@@ -405,14 +386,13 @@ class CombatSystem:
                 if steal_amount > 0:
                     result['stolen_resources'][resource_type] = steal_amount
                     # Transfer resources
-                    self.db.add_resources(attacker_id, resource_type, steal_amount)
-                    self.db.consume_resources(defender_id, {resource_type: steal_amount})
+                    attacker_delta['resources'][resource_type] = steal_amount
+                    defender_delta['resources'][resource_type] = -steal_amount
 
         # Handle buildings (mines and refineries)
         result['destroyed_buildings'] = {}
         result['conquered_buildings'] = {}
-        attacker_buildings = self.db.get_player_buildings(attacker_id)
-        
+
         mine_buildings = ['iron_mine', 'copper_mine', 'oil_mine', 'gas_mine', 
                          'aluminum_mine', 'gold_mine', 'uranium_mine', 'lithium_mine',
                          'coal_mine', 'silver_mine', 'nitro_mine', 'sulfur_mine', 
@@ -428,32 +408,30 @@ class CombatSystem:
                     if conquest_mode:
                         # In conquest mode, transfer buildings to attacker
                         result['conquered_buildings'][building_type] = affected_count
-                        # Remove from defender
-                        new_defender_count = building_count - affected_count
-                        self.db.update_building_count(defender_id, building_type, new_defender_count)
-                        # Add to attacker
-                        current_attacker_count = attacker_buildings.get(building_type, 0)
-                        new_attacker_count = current_attacker_count + affected_count
-                        self.db.update_building_count(attacker_id, building_type, new_attacker_count)
+                        # Move from defender to attacker
+                        defender_delta['buildings'][building_type] = -affected_count
+                        attacker_delta['buildings'][building_type] = affected_count
                     else:
                         # Normal mode, destroy buildings
                         result['destroyed_buildings'][building_type] = affected_count
-                        new_count = building_count - affected_count
-                        self.db.update_building_count(defender_id, building_type, new_count)
+                        defender_delta['buildings'][building_type] = -affected_count
 
         # Update defender soldiers
-        new_soldiers = max(0, defender['soldiers'] - soldier_losses)
-        self.db.update_player_soldiers(defender_id, new_soldiers)
+        defender_delta['soldiers'] = -soldier_losses
         result['defender_losses']['soldiers'] = soldier_losses
         result['loot_percentage'] = loot_percentage * 100
         result['building_percentage'] = building_percentage * 100
         result['power_ratio'] = power_ratio
         result['conquest_mode'] = conquest_mode
 
+        return {attacker_id: attacker_delta, defender_id: defender_delta}
+
     def _apply_failed_attack(self, attacker_id, damage, result):
-        """Apply consequences of failed attack"""
-        attacker = self.db.get_player(attacker_id)
-        attacker_weapons = self.db.get_player_weapons(attacker_id)
+        """Work out consequences of failed attack as per-player deltas"""
+        attacker_state = self.db.get_player_state(attacker_id)
+        attacker = attacker_state['player']
+        attacker_weapons = attacker_state['weapons']
+        attacker_delta = {'weapons': {}}
 
         # Attacker losses
         soldier_losses = min(attacker['soldiers'], int(damage * 50))
@@ -470,31 +448,78 @@ class CombatSystem:
                             losses = min(count, max(1, int(count * 0.1)))  # Double the normal loss rate
                             result['attacker_losses'][weapon_type] = losses
                             # Remove weapons from attacker
-                            new_count = count - losses
-                            self.db.update_weapon_count(attacker_id, weapon_type, new_count)
+                            attacker_delta['weapons'][weapon_type] = -losses
 
         # Update attacker soldiers
-        new_soldiers = max(0, attacker['soldiers'] - soldier_losses)
-        self.db.update_player_soldiers(attacker_id, new_soldiers)
+        attacker_delta['soldiers'] = -soldier_losses
         result['attacker_losses']['soldiers'] = soldier_losses
 
-    def _log_war(self, attacker_id, defender_id, result):
-        """Log war in database"""
+        return {attacker_id: attacker_delta}
+
+    def _commit_battle(self, attacker_id, defender_id, deltas, result, news_key=None):
+        """Write battle deltas, the war log and the war news in one transaction"""
         try:
-            with self.db.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO wars (attacker_id, defender_id, attack_power, defense_power, result, damage_dealt)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (
+            with self.db.transaction() as conn:
+                if result['success']:
+                    self._cap_to_defender_stock(conn, attacker_id, defender_id, deltas, result)
+                # Clamp rather than reject: the attacker's own losses may exceed what is left
+                self.db.apply_deltas(deltas, clamp=True, conn=conn)
+                self.db.log_war(
                     attacker_id, defender_id,
                     result['attack_power'], result['defense_power'],
                     'success' if result['success'] else 'failed',
-                    result['damage']
-                ))
-                conn.commit()
-        except Exception as e:
-            logger.error(f"Error logging war: {e}")
+                    result['damage'], result['stolen_resources'], conn=conn
+                )
+                if news_key and result['success']:
+                    self.db.queue_news('war', {
+                        'attacker_country': result['attacker_country'],
+                        'defender_country': result['defender_country'],
+                        'result': result
+                    }, news_key, conn=conn)
+        finally:
+            # Readers between the UPDATEs and the commit may have cached old rows
+            self.db.invalidate_players(deltas)
+
+    def _cap_to_defender_stock(self, conn, attacker_id, defender_id, deltas, result):
+        """Limit the defender's losses to what it holds now; the attacker gets only what was taken
+
+        The battle was worked out from rows read before this transaction, and
+        income, trades or another battle may have moved them since. The rows are
+        re-read under the write lock so loot is never credited twice.
+        """
+        defender_delta = deltas[defender_id]
+        attacker_delta = deltas[attacker_id]
+        held = {
+            table: self.db.fetch_one(f'SELECT * FROM {table} WHERE user_id = ? FOR UPDATE',
+                                     (defender_id,), conn=conn) or {}
+            for table in ('players', 'resources', 'buildings', 'weapons')
+        }
+
+        for resource_type, amount in defender_delta['resources'].items():
+            taken = min(-amount, held['resources'].get(resource_type, 0))
+            defender_delta['resources'][resource_type] = -taken
+            if resource_type in attacker_delta['resources']:
+                attacker_delta['resources'][resource_type] = taken
+            _set_or_drop(result['stolen_resources'], resource_type, taken)
+
+        for building_type, amount in defender_delta['buildings'].items():
+            lost = min(-amount, held['buildings'].get(building_type, 0))
+            defender_delta['buildings'][building_type] = -lost
+            if building_type in attacker_delta['buildings']:
+                attacker_delta['buildings'][building_type] = lost
+                _set_or_drop(result['conquered_buildings'], building_type, lost)
+            else:
+                _set_or_drop(result['destroyed_buildings'], building_type, lost)
+
+        for weapon_type, amount in defender_delta['weapons'].items():
+            column = self.db.weapon_column(weapon_type) or weapon_type
+            lost = min(-amount, held['weapons'].get(column, 0))
+            defender_delta['weapons'][weapon_type] = -lost
+            _set_or_drop(result['defender_losses'], weapon_type, lost)
+
+        soldiers = min(-defender_delta.get('soldiers', 0), held['players'].get('soldiers', 0))
+        defender_delta['soldiers'] = -soldiers
+        result['defender_losses']['soldiers'] = soldiers
 
     def get_available_targets(self, attacker_id):
         """Get list of countries that can be attacked"""
@@ -600,4 +625,12 @@ class CombatSystem:
                         weapon_name = Config.WEAPONS.get(loss_type, {}).get('name', loss_type)
                         report += f"• {weapon_name}: {amount:,}\n"
 
-        return report
\ No newline at end of file
+        return report
+
+
+def _set_or_drop(losses, key, amount):
+    """Record a capped amount, dropping entries that came to nothing"""
+    if amount > 0:
+        losses[key] = amount
+    else:
+        losses.pop(key, None)
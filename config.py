@@ -383,7 +383,14 @@ class Config:
         'neighbor_attack_always_allowed': True,
         'long_range_threshold_km': 3000,
         'base_defense_multiplier': 0.3,
-        'weapon_loss_chance': 0.2
+        'weapon_loss_chance': 0.2,
+        'full_defense_weapons': ['s500_defense', 'thaad_defense', 's400_defense', 'iron_dome', 'slq32_ew', 'phalanx_ciws'],  # قدرت کامل در دفاع، بدون قدرت حمله
+        'non_attack_categories': ['transport', 'defense'],  # دسته‌هایی که در حمله حساب نمی‌شوند
+        'regional_range_km': 1500,          # حداقل برد برای حمله منطقه‌ای
+        'intercontinental_range_km': 3000,  # حداقل برد برای حمله بین قاره‌ای
+        'carrier_range_bonus': 500,         # افزایش برد جت با ناوبر
+        'tanker_range_bonus': 300,          # افزایش برد جت با سوخت‌رسان
+        'range_extended_weapons': ['fighter_jet', 'jet', 'f22', 'f35', 'su57', 'j20', 'f15ex', 'su35s']
     }
 
     # Distance-based combat timing (in minutes)
@@ -415,26 +422,20 @@ class Config:
         'intercontinental': ['missile', 'ballistic_missile', 'nuclear_missile', 'simple_missile', 'trident2_conventional', 'trident2_nuclear', 'satan2_conventional', 'satan2_nuclear', 'df41_nuclear', 'tomahawk_conventional', 'tomahawk_nuclear', 'kalibr_conventional']  # بین قاره‌ای
     }
 
+    _distance_index = None
+
+    @classmethod
+    def distance_index(cls):
+        """Shared precomputed distance/range index (built on first use)"""
+        if cls._distance_index is None:
+            from distance_index import DistanceIndex
+            cls._distance_index = DistanceIndex(cls)
+        return cls._distance_index
+
     @classmethod
     def get_country_distance_type(cls, country1, country2):
         """Get distance type between two countries"""
-        if cls.are_countries_neighbors(country1, country2):
-            return 'neighbor'
-
-        # Find regions for both countries
-        region1 = None
-        region2 = None
-
-        for region, countries in cls.COUNTRY_DISTANCE_CATEGORY.items():
-            if country1 in countries:
-                region1 = region
-            if country2 in countries:
-                region2 = region
-
-        if region1 == region2:
-            return 'regional'
-        else:
-            return 'intercontinental'
+        return cls.distance_index().distance_type(country1, country2)
 
     @classmethod
     def are_countries_neighbors(cls, country1, country2):
@@ -463,56 +464,71 @@ class Config:
     @classmethod
     def get_available_weapons_for_attack(cls, attacker_country, defender_country, player_weapons, has_tanker=False, has_carrier=False):
         """Get list of weapons that can attack based on distance and range"""
-        distance_type = Config.get_country_distance_type(attacker_country, defender_country)
-        available_weapons = []
-
-        for weapon_type, count in player_weapons.items():
-            if weapon_type == 'user_id' or count <= 0:
-                continue
-
-            weapon_config = Config.WEAPONS.get(weapon_type) # Changed from WEAPON_CAPABILITIES to WEAPONS
-            if not weapon_config:
-                continue
-
-            # Special case: Nuclear submarines can attack any coastal country
-            if weapon_type == 'nuclear_submarine' and weapon_config.get('coastal_attack'):
-                if defender_country in Config.COASTAL_COUNTRIES:
-                    available_weapons.append(weapon_type)
-                    continue
-
-            # Check weapon range vs distance
-            if distance_type == 'neighbor':
-                # All weapons can attack neighbors
-                available_weapons.append(weapon_type)
-            elif distance_type == 'regional':
-                # Check if weapon has enough range for regional attack
-                weapon_range = weapon_config.get('range', 0)
-
-                # Apply range bonus from transport equipment
-                if has_carrier and weapon_type in ['fighter_jet', 'jet', 'f22', 'f35', 'su57', 'j20', 'f15ex', 'su35s']:
-                    weapon_range += 500  # Carrier extends jet range
-                if has_tanker and weapon_type in ['fighter_jet', 'jet', 'f22', 'f35', 'su57', 'j20', 'f15ex', 'su35s']:
-                    weapon_range += 300  # Tanker extends jet range
-
-                if weapon_range >= 1500:  # Regional range requirement
-                    available_weapons.append(weapon_type)
-            else:  # intercontinental
-                # Only long-range weapons
-                weapon_range = weapon_config.get('range', 0)
-
-                # Apply range bonus
-                if has_carrier and weapon_type in ['fighter_jet', 'jet', 'f22', 'f35', 'su57', 'j20', 'f15ex', 'su35s']:
-                    weapon_range += 500
-                if has_tanker and weapon_type in ['fighter_jet', 'jet', 'f22', 'f35', 'su57', 'j20', 'f15ex', 'su35s']:
-                    weapon_range += 300
-
-                if weapon_range >= 3000:  # Intercontinental range requirement
-                    available_weapons.append(weapon_type)
-
-        return available_weapons
+        return cls.distance_index().available_weapons(
+            attacker_country, defender_country, player_weapons, has_tanker, has_carrier
+        )
 
     # Bot configuration
     BOT_CONFIG = {
         'news_channel': '@Dragon0RP',
-        'income_cycle_hours': 6
+        'income_cycle_hours': 6,
+        'income_sweep_minutes': 30,  # تسویه درآمد بازیکنان غیرفعال (بقیه هنگام خواندن تسویه می‌شوند)
+        'concurrent_updates': 8  # callbacks handled in parallel while DB work runs on the executor
+    }
+
+    # News channel dispatcher (Telegram: ~30 messages/second per bot, 20/minute per group or channel)
+    NEWS_CONFIG = {
+        'queue_size': 500,            # حداکثر خبرهای در صف ارسال
+        'global_rate': 25,            # پیام در ثانیه برای کل ربات
+        'chat_rate': 20,              # پیام در دقیقه برای هر کانال
+        'chat_burst': 3,              # پیام‌های پشت‌سرهم مجاز در هر کانال
+        'digest_window': 60,          # ثانیه جمع‌آوری خبرهای مشابه در یک خلاصه
+        'max_retries': 5              # تلاش مجدد پیام پس از خطای شبکه
+    }
+
+    # Durable news outbox flushed into the dispatcher above
+    NEWS_OUTBOX_CONFIG = {
+        'batch_size': 50,             # خبرهای خوانده‌شده از جدول در هر نوبت
+        'flush_interval': 3,          # ثانیه بین نوبت‌های ارسال
+        'redeliver_after': 600,       # ثانیه تا ارسال دوباره خبر تأییدنشده
+        'retention_days': 7           # نگهداری خبرهای ارسال‌شده برای جلوگیری از تکرار
+    }
+
+    # SQLite engine (DB_ENGINE=sqlite, or the fallback when MySQL is unreachable)
+    SQLITE_CONFIG = {
+        'journal_mode': 'WAL',        # خواننده‌ها هم‌زمان با نویسنده کار می‌کنند
+        'synchronous': 'NORMAL',      # در حالت WAL فقط هنگام checkpoint همگام‌سازی می‌شود
+        'cache_size_kb': 16384,       # کش صفحات هر اتصال (کیلوبایت)
+        'mmap_size_mb': 64,           # خواندن فایل دیتابیس از طریق حافظه نگاشت‌شده
+        'busy_timeout': 5,            # ثانیه انتظار برای قفل نوشتن
+        'busy_retries': 2,            # تلاش مجدد پس از پایان زمان انتظار قفل
+        'retry_backoff': 0.05         # ثانیه مکث اولیه بین تلاش‌ها (دوبرابر در هر بار)
+    }
+
+    # Rendered menu screens reused while the player's state is unchanged
+    VIEW_CACHE_CONFIG = {
+        'max_entries': 2000,          # حداکثر صفحه‌های ذخیره‌شده (کاربر × صفحه)
+        'ttl': 60                     # اعتبار صفحه ذخیره‌شده (ثانیه)
+    }
+
+    # Per-query timings and slow-query log (admin panel)
+    QUERY_STATS_CONFIG = {
+        'enabled': True,              # ثبت زمان هر دستور (سربار ناچیز، در تولید روشن بماند)
+        'slow_query_ms': 200,         # دستورات کندتر از این در لاگ کندها ثبت می‌شوند (میلی‌ثانیه)
+        'slow_log_size': 100,         # تعداد آخرین دستورات کند نگه‌داشته شده
+        'latency_samples': 256        # آخرین زمان‌ها برای محاسبه p50/p99 هر دستور
+    }
+
+    # Database connection pool configuration
+    DATABASE_CONFIG = {
+        'pool_size': 5,               # اتصال‌های باز نگه‌داشته شده
+        'max_overflow': 10,           # اتصال‌های اضافه در زمان اوج
+        'pool_timeout': 10,           # ثانیه انتظار برای اتصال آزاد
+        'pool_recycle': 3600,         # بازسازی اتصال‌های قدیمی‌تر از این (ثانیه)
+        'ping_interval': 30,          # بررسی سلامت اتصال‌های بیکار (ثانیه)
+        'executor_workers': 4,        # ترد‌های اجرای کارهای سنگین دیتابیس
+        'async_pool_size': 5,         # اتصال‌های درایور async (aiomysql / aiosqlite)
+        'state_cache_size': 1000,     # حداکثر بازیکنان در کش وضعیت
+        'state_cache_ttl': 30,        # اعتبار کش وضعیت بازیکن (ثانیه)
+        'statement_cache_size': 256   # تعداد دستورات کامپایل‌شده نگه‌داشته در هر اتصال SQLite
     }
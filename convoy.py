@@ -1,6 +1,7 @@
 import logging
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from config import Config
+from database import as_datetime
 import json
 from datetime import datetime, timedelta
 import random
@@ -10,6 +11,28 @@ logger = logging.getLogger(__name__)
 class ConvoySystem:
     def __init__(self, database):
         self.db = database
+        self.deadlines = None
+
+    def set_deadline_scheduler(self, deadlines):
+        """Push convoy arrivals into the bot's deadline scheduler"""
+        self.deadlines = deadlines
+
+    def schedule_arrival(self, convoy_id, arrival_time):
+        """Fire process_convoy_arrivals when this convoy is due"""
+        if self.deadlines is not None:
+            self.deadlines.schedule('convoy', convoy_id, arrival_time)
+
+    def cancel_arrival(self, convoy_id):
+        """Drop the arrival of a convoy that left transit early"""
+        if self.deadlines is not None:
+            self.deadlines.cancel('convoy', convoy_id)
+
+    def schedule_convoys_in_transit(self):
+        """Load every in-transit convoy into the deadline scheduler (startup)"""
+        convoys = self.db.get_convoy_deadlines()
+        for convoy in convoys:
+            self.schedule_arrival(convoy['id'], as_datetime(convoy['arrival_time']))
+        return len(convoys)
 
     def calculate_convoy_security(self, sender_id, resources_value):
         """Calculate convoy security based on sender's military power and transport equipment"""
@@ -78,7 +101,7 @@ class ConvoySystem:
             return {'success': False, 'message': 'محموله یافت نشد یا قبلاً رسیده!'}
 
         # Check if convoy is still in transit
-        arrival_time = datetime.fromisoformat(convoy['arrival_time'])
+        arrival_time = as_datetime(convoy['arrival_time'])
         if datetime.now() >= arrival_time:
             return {'success': False, 'message': 'محموله قبلاً به مقصد رسیده!'}
 
@@ -103,6 +126,7 @@ class ConvoySystem:
             if action_type == 'stop':
                 # Stop convoy - return to sender
                 self.db.update_convoy_status(convoy_id, 'stopped')
+                self.cancel_arrival(convoy_id)
                 return {
                     'success': True,
                     'message': f'محموله با موفقیت متوقف شد! منابع به فرستنده بازگردانده می‌شود.',
@@ -112,6 +136,7 @@ class ConvoySystem:
                 # Steal convoy resources
                 resources = json.loads(convoy['resources'])
                 self.db.update_convoy_status(convoy['id'], 'stolen')
+                self.cancel_arrival(convoy['id'])
 
                 # Add resources to interceptor
                 for resource, amount in resources.items():
@@ -161,7 +186,8 @@ class ConvoySystem:
 
         # Resume convoy with new arrival time
         new_arrival = datetime.now() + timedelta(hours=2)
-        self.db.update_convoy_arrival(convoy_id, new_arrival.isoformat(), 'in_transit')
+        self.db.update_convoy_arrival(convoy_id, new_arrival, 'in_transit')
+        self.schedule_arrival(convoy_id, new_arrival)
 
         return {
             'success': True,
@@ -206,13 +232,15 @@ class ConvoySystem:
 
         # Create convoy in database
         convoy_id = self.db.create_convoy(sender_id, receiver_id, resources, travel_time, security_level)
+        estimated_arrival = datetime.now() + timedelta(minutes=travel_time)
+        self.schedule_arrival(convoy_id, estimated_arrival)
 
         return {
             'success': True,
             'convoy_id': convoy_id,
             'travel_time': travel_time,
             'security_level': security_level,
-            'estimated_arrival': datetime.now() + timedelta(minutes=travel_time)
+            'estimated_arrival': estimated_arrival
         }
 
     def calculate_convoy_travel_time_with_transport(self, sender_id, transport_type):
@@ -320,7 +348,7 @@ class ConvoySystem:
             return {'success': False, 'message': 'محموله یافت نشد یا قبلاً رسیده!'}
 
         # Check if convoy is still in transit
-        arrival_time = datetime.fromisoformat(convoy['arrival_time'])
+        arrival_time = as_datetime(convoy['arrival_time'])
         if datetime.now() >= arrival_time:
             return {'success': False, 'message': 'محموله قبلاً به مقصد رسیده!'}
 
@@ -417,28 +445,28 @@ class ConvoySystem:
         resources = json.loads(convoy['resources'])
         security_level = convoy['security_level']
 
+        sender = self.db.get_player(sender_id)
+        receiver = self.db.get_player(receiver_id)
+        route = f"از {sender['country_name'] if sender else '؟'} به {receiver['country_name'] if receiver else '؟'}"
+
         # Calculate delivery success chance based on security
         success_chance = min(security_level + 10, 95)
 
         if random.randint(1, 100) <= success_chance:
-            # Successful delivery
+            # Successful delivery: cargo, status and news commit together
+            delta = {receiver_id: {
+                'money': resources.get('money', 0),
+                'resources': {resource: amount for resource, amount in resources.items() if resource != 'money'}
+            }}
             try:
-                # Add resources to receiver
-                player = self.db.get_player(receiver_id)
-
-                # Handle money separately
-                if 'money' in resources:
-                    money_amount = resources['money']
-                    new_money = player['money'] + money_amount
-                    self.db.update_player_money(receiver_id, new_money)
-
-                # Handle other resources
-                for resource, amount in resources.items():
-                    if resource != 'money':
-                        self.db.add_resources(receiver_id, resource, amount)
-
-                # Mark convoy as delivered
-                self.db.update_convoy_status(convoy_id, 'delivered')
+                with self.db.transaction() as conn:
+                    if not self.db.apply_deltas(delta, conn=conn):
+                        raise ValueError(f"invalid cargo {sorted(resources)}")
+                    self.db.update_convoy_status(convoy_id, 'delivered', conn=conn)
+                    self.db.queue_news('convoy', {
+                        'message': f"📦 محموله {route} تحویل شد!",
+                        'cargo': resources
+                    }, f"convoy:{convoy_id}", conn=conn)
 
                 return {
                     'convoy_id': convoy_id,
@@ -455,9 +483,17 @@ class ConvoySystem:
                     'success': False,
                     'message': 'خطا در تحویل محموله!'
                 }
+            finally:
+                # Readers between the UPDATEs and the commit may have cached old rows
+                self.db.invalidate_players(delta)
         else:
             # Failed delivery - convoy intercepted/lost
-            self.db.update_convoy_status(convoy_id, 'lost')
+            with self.db.transaction() as conn:
+                self.db.update_convoy_status(convoy_id, 'lost', conn=conn)
+                self.db.queue_news('convoy', {
+                    'message': f"💀 محموله {route} دزدیده شد!",
+                    'cargo': resources
+                }, f"convoy:{convoy_id}", conn=conn)
             return {
                 'convoy_id': convoy_id,
                 'success': False,
@@ -2,13 +2,92 @@ import mysql.connector
 import sqlite3
 import logging
 from datetime import datetime
+import functools
 import json
 import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
 from config import Config
+from db_pool import ConnectionPool
+from sqlite_engine import SQLiteEngine
+from migrations import MigrationRunner
+import sql_dialect
+from player_cache import PlayerStateCache
+from query_stats import QueryStats
 
 logger = logging.getLogger(__name__)
 
+
+class DeltaRejected(Exception):
+    """Raised inside apply_deltas to roll back when a guarded UPDATE matches no row"""
+
+
+def invalidates_player(*tables):
+    """Drop the written player's cached rows once the write has finished"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, user_id, *args, **kwargs):
+            try:
+                return method(self, user_id, *args, **kwargs)
+            finally:
+                self.cache.invalidate(user_id, *tables)
+                if not tables or 'buildings' in tables:
+                    self.buildings_changed(user_id)
+        return wrapper
+    return decorator
+
+
+def as_datetime(value):
+    """DATETIME column value as a datetime (SQLite returns text, MySQL a datetime)"""
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
 class Database:
+    # Columns of the resources table, in table order
+    RESOURCE_TYPES = [
+        'iron', 'copper', 'oil', 'gas', 'aluminum', 'gold', 'uranium',
+        'lithium', 'coal', 'silver', 'fuel', 'nitro', 'sulfur', 'titanium'
+    ]
+
+    # Columns of the buildings table, in table order
+    BUILDING_TYPES = [
+        'iron_mine', 'copper_mine', 'oil_mine', 'gas_mine', 'aluminum_mine', 'gold_mine',
+        'uranium_mine', 'lithium_mine', 'coal_mine', 'silver_mine', 'nitro_mine', 'sulfur_mine',
+        'titanium_mine', 'weapon_factory', 'refinery', 'power_plant', 'wheat_farm',
+        'military_base', 'housing'
+    ]
+    # Player columns that apply_delta may change
+    PLAYER_COUNTERS = ['money', 'population', 'soldiers']
+
+    # Columns of the weapons table, in table order
+    WEAPON_COLUMNS = [
+        'rifle', 'tank', 'fighter_jet', 'jet', 'drone', 'warship', 'submarine',
+        'destroyer', 'aircraft_carrier', 'air_defense', 'missile_shield', 'cyber_shield',
+        'simple_bomb', 'nuclear_bomb', 'simple_missile', 'ballistic_missile',
+        'nuclear_missile', 'trident2_conventional', 'trident2_nuclear',
+        'satan2_conventional', 'satan2_nuclear', 'df41_nuclear', 'tomahawk_conventional',
+        'tomahawk_nuclear', 'kalibr_conventional', 'f22', 'f35', 'su57', 'j20', 'f15ex',
+        'su35s', 'helicopter', 'strategic_bomber', 'armored_truck', 'cargo_helicopter',
+        'cargo_plane', 'escort_frigate', 'logistics_drone', 'heavy_transport',
+        'supply_ship', 'stealth_transport', 'kf51_panther', 'abrams_x', 'm1e3_abrams',
+        't90ms_proryv', 'm1a2_abrams_sepv3', 's500_defense', 'thaad_defense',
+        's400_defense', 'iron_dome', 'slq32_ew', 'phalanx_ciws', 'aircraft_carrier_full',
+        'nuclear_submarine', 'patrol_ship', 'patrol_boat', 'amphibious_ship',
+        'tanker_aircraft', 'aircraft_carrier_transport'
+    ]
+    # Alternative weapon names accepted by add_weapon
+    WEAPON_ALIASES = {
+        'fighter': 'fighter_jet'
+    }
+
+    # Single-column statements, built once per validated column by _column_sql
+    SET_COLUMN = 'UPDATE {table} SET {column} = ? WHERE user_id = ?'
+    ADD_TO_COLUMN = 'UPDATE {table} SET {column} = {column} + ? WHERE user_id = ?'
+
     def __init__(self):
         # Use environment variable or fallback to your MariaDB config
         self.connection_config = {
@@ -20,399 +99,258 @@ class Database:
             'charset': 'utf8mb4',
             'autocommit': True
         }
-        self.use_mysql = True
-        self.sqlite_db_path = 'dragonrp.db'
+        # DB_ENGINE=sqlite runs on the local file only (single-node); mysql falls back to it when unreachable
+        self.use_mysql = os.getenv('DB_ENGINE', 'mysql').lower() != 'sqlite'
+        self.sqlite_db_path = os.getenv('DB_SQLITE_PATH', 'dragonrp.db')
+
+        pool_config = Config.DATABASE_CONFIG
+        self.pool_settings = {
+            'pool_size': int(os.getenv('DB_POOL_SIZE', pool_config['pool_size'])),
+            'max_overflow': int(os.getenv('DB_POOL_OVERFLOW', pool_config['max_overflow'])),
+            'timeout': float(os.getenv('DB_POOL_TIMEOUT', pool_config['pool_timeout'])),
+            'recycle': int(os.getenv('DB_POOL_RECYCLE', pool_config['pool_recycle'])),
+            'ping_interval': int(os.getenv('DB_POOL_PING_INTERVAL', pool_config['ping_interval']))
+        }
+        sqlite_config = Config.SQLITE_CONFIG
+        self.sqlite_settings = {
+            'journal_mode': os.getenv('DB_SQLITE_JOURNAL_MODE', sqlite_config['journal_mode']),
+            'synchronous': os.getenv('DB_SQLITE_SYNCHRONOUS', sqlite_config['synchronous']),
+            'cache_size_kb': int(os.getenv('DB_SQLITE_CACHE_KB', sqlite_config['cache_size_kb'])),
+            'mmap_size_mb': int(os.getenv('DB_SQLITE_MMAP_MB', sqlite_config['mmap_size_mb'])),
+            'busy_timeout': float(os.getenv('DB_SQLITE_BUSY_TIMEOUT', sqlite_config['busy_timeout'])),
+            'busy_retries': int(os.getenv('DB_SQLITE_BUSY_RETRIES', sqlite_config['busy_retries'])),
+            'retry_backoff': sqlite_config['retry_backoff'],
+            'statement_cache_size': pool_config['statement_cache_size']
+        }
+        self._mysql_pool = None
+        self._sqlite_engine = None
+        self._pool_lock = threading.Lock()
+        self._weapon_column_set = frozenset(self.WEAPON_COLUMNS)
+        self._weapon_upsert_cache = {}
+        self._delta_sql_cache = {}
+        self._column_sql_cache = {}
+        self._income_resources_sql = 'UPDATE resources SET {} WHERE user_id = ?'.format(
+            ', '.join(f"{resource} = {resource} + ?" for resource in self.RESOURCE_TYPES)
+        )
+        self._delta_columns = {
+            'players': frozenset(self.PLAYER_COUNTERS),
+            'resources': frozenset(self.RESOURCE_TYPES),
+            'buildings': frozenset(self.BUILDING_TYPES),
+            'weapons': self._weapon_column_set
+        }
+
+        # Settles accrued income before a player's state is served (installed by Economy)
+        self.income_settler = None
+        self._next_settlement = {}
+        # Per-player income per cycle, kept current by the buildings writes (installed by Economy)
+        self.income_rates = None
+
+        # Read-through cache of the per-player rows, invalidated by every write below
+        self.cache = PlayerStateCache(
+            max_players=int(os.getenv('DB_STATE_CACHE_SIZE', pool_config['state_cache_size'])),
+            ttl=float(os.getenv('DB_STATE_CACHE_TTL', pool_config['state_cache_ttl']))
+        )
+
+        # Statement timings per method and SQL fingerprint, plus the slow-query log (DB_QUERY_STATS=0 disables)
+        stats_config = Config.QUERY_STATS_CONFIG
+        self.query_stats = None
+        if os.getenv('DB_QUERY_STATS', '1' if stats_config['enabled'] else '0') != '0':
+            self.query_stats = QueryStats(
+                slow_ms=float(os.getenv('DB_SLOW_QUERY_MS', stats_config['slow_query_ms'])),
+                slow_log_size=stats_config['slow_log_size'],
+                samples=stats_config['latency_samples']
+            )
+        # Set by run_as() so statements run on behalf of another caller are credited to it
+        self._callers = threading.local()
 
     def get_connection(self):
-        """Get database connection"""
+        """Get pooled database connection"""
+        if self.query_stats is None:
+            return self._checkout()
+        started = time.perf_counter()
+        conn = self._checkout()
+        self.query_stats.record_checkout(time.perf_counter() - started)
+        return conn
+
+    def _checkout(self):
         if self.use_mysql:
             try:
-                conn = mysql.connector.connect(**self.connection_config)
-                return conn
+                return self._get_mysql_pool().acquire()
             except mysql.connector.Error as e:
                 logger.warning(f"MySQL connection failed, falling back to SQLite: {e}")
                 self.use_mysql = False
 
         # Fallback to SQLite
         try:
-            conn = sqlite3.connect(self.sqlite_db_path)
-            conn.row_factory = sqlite3.Row
-            return conn
+            return self._get_sqlite_engine().acquire()
         except sqlite3.Error as e:
             logger.error(f"Error connecting to SQLite: {e}")
             raise
 
-    def initialize(self):
-        """Initialize database tables"""
-        # Handle schema migration for MySQL
-        if self.use_mysql:
-            self.migrate_user_id_schema()
-
+    def close_pools(self):
+        """Close all idle pooled connections and the SQLite thread connections"""
+        for pool in (self._mysql_pool, self._sqlite_engine):
+            if pool:
+                pool.dispose()
+
+    def _get_mysql_pool(self):
+        """Create the MySQL pool on first use"""
+        if self._mysql_pool is None:
+            with self._pool_lock:
+                if self._mysql_pool is None:
+                    self._mysql_pool = ConnectionPool(
+                        lambda: mysql.connector.connect(**self.connection_config),
+                        ping=lambda conn: conn.is_connected(),
+                        reset=self._reset_mysql_connection,
+                        name='mysql',
+                        **self.pool_settings
+                    )
+        return self._mysql_pool
+
+    @property
+    def sqlite_engine(self):
+        """The SQLite engine, whose settings the async backend shares"""
+        return self._get_sqlite_engine()
+
+    def _get_sqlite_engine(self):
+        """Create the SQLite engine (per-thread connections) on first use"""
+        if self._sqlite_engine is None:
+            with self._pool_lock:
+                if self._sqlite_engine is None:
+                    self._sqlite_engine = SQLiteEngine(
+                        self.sqlite_db_path,
+                        **self.sqlite_settings,
+                        **self.pool_settings
+                    )
+        return self._sqlite_engine
+
+    @staticmethod
+    def _reset_mysql_connection(conn):
+        """Drop leftover results and open transactions before reuse"""
+        if conn.unread_result:
+            conn.consume_results()
+        if conn.in_transaction:
+            conn.rollback()
+
+    @contextmanager
+    def transaction(self):
+        """Run several statements on one connection as a single transaction"""
         with self.get_connection() as conn:
             if self.use_mysql:
-                cursor = conn.cursor(dictionary=True)
+                conn.start_transaction()
             else:
-                cursor = conn.cursor()
-
-            # Players table
-            user_id_type = "BIGINT" if self.use_mysql else "INTEGER"
-            cursor.execute(f'''
-                CREATE TABLE IF NOT EXISTS players (
-                    user_id {user_id_type} PRIMARY KEY,
-                    username TEXT NOT NULL,
-                    country_code TEXT UNIQUE NOT NULL,
-                    country_name TEXT NOT NULL,
-                    money INTEGER DEFAULT 900000,
-                    population INTEGER DEFAULT 1000000,
-                    soldiers INTEGER DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-
-            # Resources table
-            cursor.execute(f'''
-                CREATE TABLE IF NOT EXISTS resources (
-                    user_id {user_id_type} PRIMARY KEY,
-                    iron INTEGER DEFAULT 0,
-                    copper INTEGER DEFAULT 0,
-                    oil INTEGER DEFAULT 0,
-                    gas INTEGER DEFAULT 0,
-                    aluminum INTEGER DEFAULT 0,
-                    gold INTEGER DEFAULT 0,
-                    uranium INTEGER DEFAULT 0,
-                    lithium INTEGER DEFAULT 0,
-                    coal INTEGER DEFAULT 0,
-                    silver INTEGER DEFAULT 0,
-                    fuel INTEGER DEFAULT 0,
-                    nitro INTEGER DEFAULT 0,
-                    sulfur INTEGER DEFAULT 0,
-                    titanium INTEGER DEFAULT 0
-                )
-            ''')
-
-            # Buildings table
-            cursor.execute(f'''
-                CREATE TABLE IF NOT EXISTS buildings (
-                    user_id {user_id_type} PRIMARY KEY,
-                    iron_mine INTEGER DEFAULT 0,
-                    copper_mine INTEGER DEFAULT 0,
-                    oil_mine INTEGER DEFAULT 0,
-                    gas_mine INTEGER DEFAULT 0,
-                    aluminum_mine INTEGER DEFAULT 0,
-                    gold_mine INTEGER DEFAULT 0,
-                    uranium_mine INTEGER DEFAULT 0,
-                    lithium_mine INTEGER DEFAULT 0,
-                    coal_mine INTEGER DEFAULT 0,
-                    silver_mine INTEGER DEFAULT 0,
-                    nitro_mine INTEGER DEFAULT 0,
-                    sulfur_mine INTEGER DEFAULT 0,
-                    titanium_mine INTEGER DEFAULT 0,
-                    weapon_factory INTEGER DEFAULT 0,
-                    refinery INTEGER DEFAULT 0,
-                    power_plant INTEGER DEFAULT 0,
-                    wheat_farm INTEGER DEFAULT 0,
-                    military_base INTEGER DEFAULT 0,
-                    housing INTEGER DEFAULT 0
-                )
-            ''')
-
-            # Weapons table
-            cursor.execute(f'''
-                CREATE TABLE IF NOT EXISTS weapons (
-                    user_id {user_id_type} PRIMARY KEY,
-                    rifle INTEGER DEFAULT 0,
-                    tank INTEGER DEFAULT 0,
-                    fighter_jet INTEGER DEFAULT 0,
-                    jet INTEGER DEFAULT 0,
-                    drone INTEGER DEFAULT 0,
-                    warship INTEGER DEFAULT 0,
-                    submarine INTEGER DEFAULT 0,
-                    destroyer INTEGER DEFAULT 0,
-                    aircraft_carrier INTEGER DEFAULT 0,
-                    air_defense INTEGER DEFAULT 0,
-                    missile_shield INTEGER DEFAULT 0,
-                    cyber_shield INTEGER DEFAULT 0,
-                    simple_bomb INTEGER DEFAULT 0,
-                    nuclear_bomb INTEGER DEFAULT 0,
-                    simple_missile INTEGER DEFAULT 0,
-                    ballistic_missile INTEGER DEFAULT 0,
-                    nuclear_missile INTEGER DEFAULT 0,
-                    trident2_conventional INTEGER DEFAULT 0,
-                    trident2_nuclear INTEGER DEFAULT 0,
-                    satan2_conventional INTEGER DEFAULT 0,
-                    satan2_nuclear INTEGER DEFAULT 0,
-                    df41_nuclear INTEGER DEFAULT 0,
-                    tomahawk_conventional INTEGER DEFAULT 0,
-                    tomahawk_nuclear INTEGER DEFAULT 0,
-                    kalibr_conventional INTEGER DEFAULT 0,
-                    f22 INTEGER DEFAULT 0,
-                    f35 INTEGER DEFAULT 0,
-                    su57 INTEGER DEFAULT 0,
-                    j20 INTEGER DEFAULT 0,
-                    f15ex INTEGER DEFAULT 0,
-                    su35s INTEGER DEFAULT 0,
-                    helicopter INTEGER DEFAULT 0,
-                    strategic_bomber INTEGER DEFAULT 0,
-                    armored_truck INTEGER DEFAULT 0,
-                    cargo_helicopter INTEGER DEFAULT 0,
-                    cargo_plane INTEGER DEFAULT 0,
-                    escort_frigate INTEGER DEFAULT 0,
-                    logistics_drone INTEGER DEFAULT 0,
-                    heavy_transport INTEGER DEFAULT 0,
-                    supply_ship INTEGER DEFAULT 0,
-                    stealth_transport INTEGER DEFAULT 0,
-                    kf51_panther INTEGER DEFAULT 0,
-                    abrams_x INTEGER DEFAULT 0,
-                    m1e3_abrams INTEGER DEFAULT 0,
-                    t90ms_proryv INTEGER DEFAULT 0,
-                    m1a2_abrams_sepv3 INTEGER DEFAULT 0,
-                    s500_defense INTEGER DEFAULT 0,
-                    thaad_defense INTEGER DEFAULT 0,
-                    s400_defense INTEGER DEFAULT 0,
-                    iron_dome INTEGER DEFAULT 0,
-                    slq32_ew INTEGER DEFAULT 0,
-                    phalanx_ciws INTEGER DEFAULT 0,
-                    aircraft_carrier_full INTEGER DEFAULT 0,
-                    nuclear_submarine INTEGER DEFAULT 0,
-                    patrol_ship INTEGER DEFAULT 0,
-                    patrol_boat INTEGER DEFAULT 0,
-                    amphibious_ship INTEGER DEFAULT 0,
-                    tanker_aircraft INTEGER DEFAULT 0,
-                    aircraft_carrier_transport INTEGER DEFAULT 0
-                )
-            ''')
+                # Take the write lock up front: a deferred transaction that reads first
+                # cannot wait for the lock when it later writes (SQLITE_BUSY_SNAPSHOT)
+                self._sqlite_engine.retry_busy(conn.execute, 'BEGIN IMMEDIATE')
+            yield conn
 
-            # Wars table
-            if self.use_mysql:
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS wars (
-                        id BIGINT PRIMARY KEY AUTO_INCREMENT,
-                        attacker_id BIGINT NOT NULL,
-                        defender_id BIGINT NOT NULL,
-                        attack_power BIGINT NOT NULL,
-                        defense_power BIGINT NOT NULL,
-                        result VARCHAR(50) NOT NULL,
-                        damage_dealt BIGINT DEFAULT 0,
-                        resources_stolen TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-            else:
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS wars (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        attacker_id INTEGER NOT NULL,
-                        defender_id INTEGER NOT NULL,
-                        attack_power INTEGER NOT NULL,
-                        defense_power INTEGER NOT NULL,
-                        result TEXT NOT NULL,
-                        damage_dealt INTEGER DEFAULT 0,
-                        resources_stolen TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
+    def set_income_settler(self, settler):
+        """Install settler(user_ids) that credits income cycles which have come due"""
+        self.income_settler = settler
 
-            # Convoys table
-            if self.use_mysql:
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS convoys (
-                        id BIGINT PRIMARY KEY AUTO_INCREMENT,
-                        sender_id BIGINT NOT NULL,
-                        receiver_id BIGINT NOT NULL,
-                        resources TEXT NOT NULL,
-                        departure_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        arrival_time TIMESTAMP NOT NULL,
-                        status VARCHAR(50) DEFAULT 'in_transit',
-                        security_level INTEGER DEFAULT 50,
-                        thief_id BIGINT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-            else:
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS convoys (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        sender_id INTEGER NOT NULL,
-                        receiver_id INTEGER NOT NULL,
-                        resources TEXT NOT NULL,
-                        departure_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        arrival_time TIMESTAMP NOT NULL,
-                        status TEXT DEFAULT 'in_transit',
-                        security_level INTEGER DEFAULT 50,
-                        thief_id INTEGER NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-
-            # Alliance tables
-            auto_increment = "AUTO_INCREMENT" if self.use_mysql else "AUTOINCREMENT"
-            id_type = "BIGINT" if self.use_mysql else "INTEGER"
-
-            cursor.execute(f'''
-                CREATE TABLE IF NOT EXISTS alliances (
-                    id {id_type} PRIMARY KEY {auto_increment},
-                    name TEXT NOT NULL UNIQUE,
-                    description TEXT,
-                    leader_id {"BIGINT" if self.use_mysql else "INTEGER"} NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-
-            cursor.execute(f'''
-                CREATE TABLE IF NOT EXISTS alliance_members (
-                    id {id_type} PRIMARY KEY {auto_increment},
-                    alliance_id {"BIGINT" if self.use_mysql else "INTEGER"} NOT NULL,
-                    user_id {"BIGINT" if self.use_mysql else "INTEGER"} NOT NULL,
-                    role TEXT DEFAULT 'member',
-                    joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(user_id)
-                )
-            ''')
-
-            cursor.execute(f'''
-                CREATE TABLE IF NOT EXISTS alliance_invitations (
-                    id {id_type} PRIMARY KEY {auto_increment},
-                    alliance_id {"BIGINT" if self.use_mysql else "INTEGER"} NOT NULL,
-                    user_id {"BIGINT" if self.use_mysql else "INTEGER"} NOT NULL,
-                    inviter_id {"BIGINT" if self.use_mysql else "INTEGER"} NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(alliance_id, user_id)
-                )
-            ''')
-
-            # Pending attacks table
-
-            cursor.execute(f'''
-                CREATE TABLE IF NOT EXISTS pending_attacks (
-                    id {id_type} PRIMARY KEY {auto_increment},
-                    attacker_id {"BIGINT" if self.use_mysql else "INTEGER"} NOT NULL,
-                    defender_id {"BIGINT" if self.use_mysql else "INTEGER"} NOT NULL,
-                    attack_type TEXT DEFAULT 'mixed',
-                    conquest_mode INTEGER DEFAULT 0,
-                    travel_time INTEGER NOT NULL,
-                    departure_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    attack_time TIMESTAMP NOT NULL,
-                    status TEXT DEFAULT 'traveling'
-                )
-            ''')
-
-            # Admin logs table
-            cursor.execute(f'''
-                CREATE TABLE IF NOT EXISTS admin_logs (
-                    id {id_type} PRIMARY KEY {auto_increment},
-                    admin_id {"BIGINT" if self.use_mysql else "INTEGER"} NOT NULL,
-                    action TEXT NOT NULL,
-                    target_id {"BIGINT" if self.use_mysql else "INTEGER"},
-                    details TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-
-            # Marketplace listings
-            cursor.execute(f"""
-            CREATE TABLE IF NOT EXISTS marketplace_listings (
-                id {id_type} PRIMARY KEY {auto_increment},
-                seller_id {"BIGINT" if self.use_mysql else "INTEGER"} NOT NULL,
-                item_name TEXT NOT NULL,
-                item_type TEXT NOT NULL,
-                item_id TEXT NOT NULL,
-                quantity INTEGER NOT NULL,
-                price INTEGER NOT NULL,
-                status TEXT DEFAULT 'active',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """)
-
-            # Market transactions table
-            cursor.execute(f'''
-                CREATE TABLE IF NOT EXISTS market_transactions (
-                    id {id_type} PRIMARY KEY {auto_increment},
-                    listing_id INTEGER NOT NULL,
-                    buyer_id {"BIGINT" if self.use_mysql else "INTEGER"} NOT NULL,
-                    seller_id {"BIGINT" if self.use_mysql else "INTEGER"} NOT NULL,
-                    item_type TEXT NOT NULL,
-                    quantity INTEGER NOT NULL,
-                    total_paid INTEGER NOT NULL,
-                    status TEXT DEFAULT 'pending',
-                    transaction_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    delivery_date TIMESTAMP NULL
-                )
-            ''')
-
-            # Purchase tracking table for preventing duplicate news
-            cursor.execute(f'''
-                CREATE TABLE IF NOT EXISTS purchase_tracking (
-                    id {id_type} PRIMARY KEY {auto_increment},
-                    buyer_id {"BIGINT" if self.use_mysql else "INTEGER"} NOT NULL,
-                    item_type TEXT NOT NULL,
-                    first_purchase_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE (buyer_id, item_type)
-                )
-            ''')
-
-            # Build tracking table for preventing duplicate news
-            cursor.execute(f'''
-                CREATE TABLE IF NOT EXISTS build_tracking (
-                    id {id_type} PRIMARY KEY {auto_increment},
-                    builder_id {"BIGINT" if self.use_mysql else "INTEGER"} NOT NULL,
-                    item_type TEXT NOT NULL,
-                    first_build_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE (builder_id, item_type)
-                )
-            ''')
-
-            # Banned users table
-            cursor.execute(f'''
-                CREATE TABLE IF NOT EXISTS banned_users (
-                    user_id {user_id_type} PRIMARY KEY,
-                    username TEXT,
-                    banned_by {user_id_type},
-                    ban_reason TEXT,
-                    banned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
+    def settle_income(self, user_ids=None):
+        """Settle players whose next income cycle is due (a dict lookup when none are)
 
-            conn.commit()
-            cursor.close()
-            logger.info("MariaDB database initialized successfully")
+        None settles every due player, as the periodic sweep does.
+        """
+        if self.income_settler is None:
+            return
+        if user_ids is None:
+            self.income_settler(None)
+            return
 
-    def create_player(self, user_id, username, country_code):
-        """Create a new player"""
-        try:
-            with self.get_connection() as conn:
-                if self.use_mysql:
-                    cursor = conn.cursor(dictionary=True)
-                else:
-                    cursor = conn.cursor()
+        due = self.income_due(user_ids)
+        if due:
+            self.income_settler(due)
 
-                country_name = Config.COUNTRIES.get(country_code, country_code)
+    def income_due(self, user_ids):
+        """Players among user_ids whose next income cycle may have come due"""
+        if self.income_settler is None:
+            return []
+        now = datetime.now()
+        return [user_id for user_id in user_ids if self._next_settlement.get(user_id, now) <= now]
 
-                # Insert player
-                cursor.execute('''
-                    INSERT INTO players (user_id, username, country_code, country_name)
-                    VALUES (%s, %s, %s, %s)
-                ''', (user_id, username, country_code, country_name))
+    def note_next_settlement(self, user_id, when):
+        """Remember when a player's next income cycle comes due"""
+        self._next_settlement[user_id] = when
 
-                # Initialize resources
-                cursor.execute('''
-                    INSERT INTO resources (user_id) VALUES (%s)
-                ''', (user_id,))
+    def set_income_rates(self, rates):
+        """Install the IncomeRates cache that buildings writes keep up to date"""
+        self.income_rates = rates
 
-                # Initialize buildings
-                cursor.execute('''
-                    INSERT INTO buildings (user_id) VALUES (%s)
-                ''', (user_id,))
+    def begin_buildings_change(self, user_id):
+        """Token for buildings_changed() when the change is applied incrementally"""
+        if self.income_rates is None:
+            return None
+        return self.income_rates.begin_change(user_id)
 
-                # Initialize weapons
-                cursor.execute('''
-                    INSERT INTO weapons (user_id) VALUES (%s)
-                ''', (user_id,))
+    def buildings_changed(self, user_id, changes=None, token=None):
+        """Adjust a player's income rate by {building: delta}, or mark it dirty
 
-                conn.commit()
-                cursor.close()
-                logger.info(f"Player created: {username} - {country_name}")
-                return True
+        Call once the write has committed and the player's cached rows are dropped.
+        """
+        if self.income_rates is None:
+            return
+        if changes is None or token is None:
+            self.income_rates.mark_dirty(user_id)
+        else:
+            self.income_rates.adjust(user_id, changes, token)
+
+    def invalidate_players(self, deltas):
+        """Drop cached state of players written in a caller's transaction, after it commits"""
+        self.cache.invalidate_many(deltas)
+        for user_id, delta in deltas.items():
+            if delta.get('buildings'):
+                self.buildings_changed(user_id)
+
+    def state_version(self, user_id):
+        """Token that changes whenever the player's state is written (settling due income first)
+
+        Take it before reading the state a cached render is built from.
+        """
+        self.settle_income((user_id,))
+        return self.cache.generation(user_id)
+
+    def _read_through(self, table, user_id, loader):
+        """Serve a player row from the state cache, loading it on a miss"""
+        if table in ('player', 'resources'):
+            self.settle_income((user_id,))
+
+        found, row = self.cache.get(user_id, table)
+        if found:
+            return row
+
+        generation = self.cache.generation(user_id)
+        row = loader(user_id)
+        self.cache.put(user_id, table, row, generation)
+        return row
+
+    def initialize(self):
+        """Bring the schema up to date (no DDL runs when the recorded version matches)"""
+        version = MigrationRunner(self).run()
+        logger.info(f"{'MariaDB' if self.use_mysql else 'SQLite'} database initialized (schema v{version})")
+
+    @invalidates_player()
+    def create_player(self, user_id, username, country_code):
+        """Create a new player"""
+        try:
+            country_name = Config.COUNTRIES.get(country_code, country_code)
+
+            with self.transaction() as conn:
+                # Insert player; income accrues from now
+                self.execute('''
+                    INSERT INTO players (user_id, username, country_code, country_name, last_settled_at)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (user_id, username, country_code, country_name, datetime.now().replace(microsecond=0)), conn=conn)
+
+                # Initialize resources, buildings and weapons
+                self.execute('INSERT INTO resources (user_id) VALUES (?)', (user_id,), conn=conn)
+                self.execute('INSERT INTO buildings (user_id) VALUES (?)', (user_id,), conn=conn)
+                self.execute('INSERT INTO weapons (user_id) VALUES (?)', (user_id,), conn=conn)
+
+            self._next_settlement.pop(user_id, None)
+            logger.info(f"Player created: {username} - {country_name}")
+            return True
 
         except (sqlite3.IntegrityError, mysql.connector.IntegrityError):
             logger.error(f"Country {country_code} already taken")
@@ -423,574 +361,583 @@ class Database:
 
     def get_player(self, user_id):
         """Get player information"""
+        return self._read_through('player', user_id, self._fetch_player)
+
+    def _fetch_player(self, user_id):
+        """Load player row from the database"""
+        return self.fetch_one('SELECT * FROM players WHERE user_id = ?', (user_id,))
+
+    # State table name -> (SQL table, value when the row is missing)
+    STATE_TABLES = {
+        'player': ('players', None),
+        'resources': ('resources', {}),
+        'buildings': ('buildings', {}),
+        'weapons': ('weapons', {})
+    }
+
+    def load_player_state(self, user_ids=None):
+        """Load players, resources, buildings and weapons rows for many users at once
+
+        Returns {user_id: {'player': ..., 'resources': ..., 'buildings': ..., 'weapons': ...}}.
+        Rows already in the state cache are reused; the rest are read with one
+        `WHERE user_id IN (...)` query per table. Pass None to load every player.
+        """
+        if isinstance(user_ids, int):
+            user_ids = [user_ids]
+        self.settle_income(user_ids)
+
+        states = {}
+        missing = {table: [] for table in self.STATE_TABLES}
+        generations = {}
+
         with self.get_connection() as conn:
-            if self.use_mysql:
-                cursor = conn.cursor(dictionary=True)
-                cursor.execute('SELECT * FROM players WHERE user_id = %s', (user_id,))
-                result = cursor.fetchone()
+            if user_ids is None:
+                # Bulk screens: the players scan itself provides the id list
+                for row in self.fetch_all('SELECT * FROM players ORDER BY country_name', conn=conn):
+                    states[row['user_id']] = {'player': row}
+                user_ids = list(states)
+                tables = [table for table in self.STATE_TABLES if table != 'player']
             else:
-                cursor = conn.cursor()
-                cursor.execute('SELECT * FROM players WHERE user_id = ?', (user_id,))
-                row = cursor.fetchone()
-                result = dict(row) if row else None
-            cursor.close()
-            return result
+                tables = list(self.STATE_TABLES)
+                for user_id in user_ids:
+                    states.setdefault(user_id, {})
+
+            for user_id in states:
+                generations[user_id] = self.cache.generation(user_id)
+                for table in tables:
+                    found, row = self.cache.get(user_id, table)
+                    if found:
+                        states[user_id][table] = row
+                    else:
+                        missing[table].append(user_id)
+
+            for table in tables:
+                sql_table, default = self.STATE_TABLES[table]
+                wanted = missing[table]
+                for start in range(0, len(wanted), 500):
+                    chunk = wanted[start:start + 500]
+                    rows = self.fetch_all(
+                        f'SELECT * FROM {sql_table} WHERE user_id IN ({self.dialect.placeholders(len(chunk))})',
+                        tuple(chunk), conn=conn
+                    )
+                    loaded = {row['user_id']: row for row in rows}
+
+                    for user_id in chunk:
+                        row = loaded.get(user_id, default)
+                        states[user_id][table] = dict(row) if row is not None else None
+                        self.cache.put(user_id, table, row, generations[user_id])
+
+        return states
+
+    def get_player_state(self, user_id):
+        """Load one player's four state rows, or None if the player does not exist"""
+        state = self.load_player_state([user_id])[user_id]
+        return state if state['player'] else None
 
     def get_all_players(self):
         """Get all players"""
-        with self.get_connection() as conn:
-            if self.use_mysql:
-                cursor = conn.cursor(dictionary=True)
-                cursor.execute('SELECT * FROM players ORDER BY country_name')
-                result = cursor.fetchall()
-            else:
-                cursor = conn.cursor()
-                cursor.execute('SELECT * FROM players ORDER BY country_name')
-                result = [dict(row) for row in cursor.fetchall()]
-            cursor.close()
-            return result
+        return self.fetch_all('SELECT * FROM players ORDER BY country_name')
 
+    @invalidates_player('buildings')
     def set_player_building(self, user_id, building_type, count):
         """Set player building count to specific value"""
         try:
-            with self.get_connection() as conn:
-                if self.use_mysql:
-                    cursor = conn.cursor(dictionary=True)
-                    query = f'''
-                        UPDATE buildings 
-                        SET {building_type} = %s
-                        WHERE user_id = %s
-                    '''
-                    cursor.execute(query, (count, user_id))
-                else:
-                    cursor = conn.cursor()
-                    query = f'''
-                        UPDATE buildings 
-                        SET {building_type} = ?
-                        WHERE user_id = ?
-                    '''
-                    cursor.execute(query, (count, user_id))
-                conn.commit()
-                cursor.close()
-                logger.info(f"Set {building_type} to {count} for player {user_id}")
-                return True
+            self.execute(self._column_sql('buildings', building_type, self.SET_COLUMN), (count, user_id))
+            logger.info(f"Set {building_type} to {count} for player {user_id}")
+            return True
         except Exception as e:
             logger.error(f"Error setting building count: {e}")
             return False
 
+    @invalidates_player('player')
     def update_player_income(self, user_id, new_money, new_population, new_soldiers):
         """Update player money, population, and soldiers (for income cycle)"""
         try:
-            with self.get_connection() as conn:
-                if self.use_mysql:
-                    cursor = conn.cursor(dictionary=True)
-                    cursor.execute('''
-                        UPDATE players 
-                        SET money = %s, population = %s, soldiers = %s
-                        WHERE user_id = %s
-                    ''', (new_money, new_population, new_soldiers, user_id))
-                else:
-                    cursor = conn.cursor()
-                    cursor.execute('''
-                        UPDATE players 
-                        SET money = ?, population = ?, soldiers = ?
-                        WHERE user_id = ?
-                    ''', (new_money, new_population, new_soldiers, user_id))
-                conn.commit()
-                cursor.close()
-                logger.info(f"Updated income for player {user_id}: ${new_money:,}, population: {new_population:,}, soldiers: {new_soldiers:,}")
-                return True
+            self.execute('''
+                UPDATE players 
+                SET money = ?, population = ?, soldiers = ?
+                WHERE user_id = ?
+            ''', (new_money, new_population, new_soldiers, user_id))
+            logger.info(f"Updated income for player {user_id}: ${new_money:,}, population: {new_population:,}, soldiers: {new_soldiers:,}")
+            return True
         except Exception as e:
             logger.error(f"Error updating player income: {e}")
             return False
 
+    def get_income_snapshot(self, user_ids=None, due_before=None):
+        """Current oil and last_settled_at for the given players (or every player)
+
+        due_before limits the scan to players last settled at or before that time.
+        """
+        sql = '''
+            SELECT p.user_id, COALESCE(r.oil, 0) AS current_oil, p.last_settled_at
+            FROM players p
+            LEFT JOIN resources r ON r.user_id = p.user_id
+        '''
+        conditions, params = [], []
+        if user_ids is not None:
+            if not user_ids:
+                return []
+            conditions.append(f'p.user_id IN ({self.dialect.placeholders(len(user_ids))})')
+            params.extend(user_ids)
+        if due_before is not None:
+            conditions.append('p.last_settled_at <= ?')
+            params.append(due_before)
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        return self.fetch_all(sql, tuple(params))
+
+    _SETTLE_SQL = '''
+        UPDATE players
+        SET money = money + ?,
+            population = population + ?,
+            soldiers = soldiers + ?,
+            last_settled_at = ?
+        WHERE user_id = ? AND {anchor}
+    '''
+
+    def apply_income_settlements(self, settlements):
+        """Credit accrued income cycles in one transaction
+
+        settlements: list of (user_id, settled_at, new_settled_at, money, population, soldiers, {resource: amount})
+        Each player's row is only credited if last_settled_at still equals settled_at, so two
+        threads settling the same player cannot both pay out. Returns the credited user ids.
+        """
+        credited = []
+        with self.transaction() as conn:
+            for user_id, settled_at, new_settled_at, money, population, soldiers, resources in settlements:
+                params = (money, population, soldiers, new_settled_at, user_id)
+                if settled_at is None:
+                    # Rows written before accrual existed start accruing now
+                    sql = self._SETTLE_SQL.format(anchor='last_settled_at IS NULL')
+                else:
+                    sql = self._SETTLE_SQL.format(anchor='last_settled_at = ?')
+                    params += (settled_at,)
+                updated = self.execute(sql, params, conn=conn)
+                if not updated:
+                    continue
+
+                if any(resources.values()):
+                    self.execute(
+                        self._income_resources_sql,
+                        tuple(resources.get(resource, 0) for resource in self.RESOURCE_TYPES) + (user_id,),
+                        conn=conn
+                    )
+                credited.append(user_id)
+
+        self.cache.invalidate_many(credited, 'player', 'resources')
+        return credited
+
+    ALL_COUNTRIES_SQL = 'SELECT user_id, username, country_name, country_code FROM players ORDER BY country_name'
+
     def get_all_countries(self):
         """Get all countries with players"""
-        with self.get_connection() as conn:
-            if self.use_mysql:
-                cursor = conn.cursor(dictionary=True)
-                cursor.execute('SELECT user_id, username, country_name, country_code FROM players ORDER BY country_name')
-                result = cursor.fetchall()
-            else:
-                cursor = conn.cursor()
-                cursor.execute('SELECT user_id, username, country_name, country_code FROM players ORDER BY country_name')
-                result = [dict(row) for row in cursor.fetchall()]
-            cursor.close()
-            return result
+        return self.fetch_all(self.ALL_COUNTRIES_SQL)
 
     def is_country_taken(self, country_code):
         """Check if country is already taken"""
-        with self.get_connection() as conn:
-            if self.use_mysql:
-                cursor = conn.cursor(dictionary=True)
-                cursor.execute('SELECT 1 FROM players WHERE country_code = %s', (country_code,))
-            else:
-                cursor = conn.cursor()
-                cursor.execute('SELECT 1 FROM players WHERE country_code = ?', (country_code,))
-            result = cursor.fetchone()
-            cursor.close()
-            return result is not None
+        return self.fetch_one('SELECT 1 AS taken FROM players WHERE country_code = ?', (country_code,)) is not None
 
     def get_player_resources(self, user_id):
         """Get player resources"""
-        with self.get_connection() as conn:
-            if self.use_mysql:
-                cursor = conn.cursor(dictionary=True)
-                cursor.execute('SELECT * FROM resources WHERE user_id = %s', (user_id,))
-                result = cursor.fetchone()
-            else:
-                cursor = conn.cursor()
-                cursor.execute('SELECT * FROM resources WHERE user_id = ?', (user_id,))
-                row = cursor.fetchone()
-                result = dict(row) if row else {}
-            cursor.close()
-            return result if result else {}
+        return self._read_through('resources', user_id, self._fetch_player_resources)
+
+    def _fetch_player_resources(self, user_id):
+        """Load resources row from the database"""
+        return self.fetch_one('SELECT * FROM resources WHERE user_id = ?', (user_id,)) or {}
 
     def get_player_buildings(self, user_id):
         """Get player buildings"""
-        with self.get_connection() as conn:
-            if self.use_mysql:
-                cursor = conn.cursor(dictionary=True)
-                cursor.execute('SELECT * FROM buildings WHERE user_id = %s', (user_id,))
-                result = cursor.fetchone()
-            else:
-                cursor = conn.cursor()
-                cursor.execute('SELECT * FROM buildings WHERE user_id = ?', (user_id,))
-                row = cursor.fetchone()
-                result = dict(row) if row else {}
-            cursor.close()
-            return result if result else {}
+        return self._read_through('buildings', user_id, self._fetch_player_buildings)
+
+    def _fetch_player_buildings(self, user_id):
+        """Load buildings row from the database"""
+        return self.fetch_one('SELECT * FROM buildings WHERE user_id = ?', (user_id,)) or {}
 
     def get_player_weapons(self, user_id):
         """Get player weapons"""
-        with self.get_connection() as conn:
-            if self.use_mysql:
-                cursor = conn.cursor(dictionary=True)
-                cursor.execute('SELECT * FROM weapons WHERE user_id = %s', (user_id,))
-                result = cursor.fetchone()
-            else:
-                cursor = conn.cursor()
-                cursor.execute('SELECT * FROM weapons WHERE user_id = ?', (user_id,))
-                row = cursor.fetchone()
-                result = dict(row) if row else None
-            cursor.close()
-            if result:
-                logger.info(f"get_player_weapons for user {user_id}: rifle={result.get('rifle', 0)}")
-                return result
-            else:
-                logger.warning(f"No weapons found for user {user_id}")
-                return {}
+        return self._read_through('weapons', user_id, self._fetch_player_weapons)
+
+    def _fetch_player_weapons(self, user_id):
+        """Load weapons row from the database"""
+        result = self.fetch_one('SELECT * FROM weapons WHERE user_id = ?', (user_id,))
+        if result:
+            logger.info(f"get_player_weapons for user {user_id}: rifle={result.get('rifle', 0)}")
+            return result
+        else:
+            logger.warning(f"No weapons found for user {user_id}")
+            return {}
 
+    @invalidates_player('player')
     def update_player_money(self, user_id, new_amount):
         """Update player money"""
         try:
-            with self.get_connection() as conn:
-                if self.use_mysql:
-                    cursor = conn.cursor(dictionary=True)
-                    cursor.execute("""
-                        UPDATE players SET money = %s WHERE user_id = %s
-                    """, (new_amount, user_id))
-                else:
-                    cursor = conn.cursor()
-                    cursor.execute("""
-                        UPDATE players SET money = ? WHERE user_id = ?
-                    """, (new_amount, user_id))
-                conn.commit()
-                cursor.close()
-                logger.info(f"Updated player {user_id} money to {new_amount}")
-                return True
+            self.execute('UPDATE players SET money = ? WHERE user_id = ?', (new_amount, user_id))
+            logger.info(f"Updated player {user_id} money to {new_amount}")
+            return True
         except Exception as e:
             logger.error(f"Error updating player money: {e}")
             return False
 
+    @invalidates_player('player')
     def update_player_population(self, user_id, new_population):
         """Update player population"""
         try:
-            with self.get_connection() as conn:
-                if self.use_mysql:
-                    cursor = conn.cursor(dictionary=True)
-                    cursor.execute(
-                        "UPDATE players SET population = %s WHERE user_id = %s",
-                        (new_population, user_id)
-                    )
-                else:
-                    cursor = conn.cursor()
-                    cursor.execute(
-                        "UPDATE players SET population = ? WHERE user_id = ?",
-                        (new_population, user_id)
-                    )
-                conn.commit()
-                cursor.close()
-                return True
+            self.execute('UPDATE players SET population = ? WHERE user_id = ?', (new_population, user_id))
+            return True
         except Exception as e:
             logger.error(f"Error updating player population: {e}")
             return False
 
+    @invalidates_player('player')
     def update_player_soldiers(self, user_id, new_soldiers):
         """Update player's soldiers count"""
-        with self.get_connection() as conn:
-            if self.use_mysql:
-                cursor = conn.cursor(dictionary=True)
-                cursor.execute('''
-                    UPDATE players 
-                    SET soldiers = %s
-                    WHERE user_id = %s
-                ''', (new_soldiers, user_id))
-            else:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    UPDATE players 
-                    SET soldiers = ?
-                    WHERE user_id = ?
-                ''', (new_soldiers, user_id))
-            conn.commit()
-            cursor.close()
+        self.execute('UPDATE players SET soldiers = ? WHERE user_id = ?', (new_soldiers, user_id))
 
+    @invalidates_player('resources')
     def update_resource(self, user_id, resource_type, new_amount):
         """Update specific resource amount"""
-        with self.get_connection() as conn:
-            if self.use_mysql:
-                cursor = conn.cursor(dictionary=True)
-                query = f'''
-                    UPDATE resources 
-                    SET {resource_type} = %s
-                    WHERE user_id = %s
-                '''
-                cursor.execute(query, (new_amount, user_id))
-            else:
-                cursor = conn.cursor()
-                query = f'''
-                    UPDATE resources 
-                    SET {resource_type} = ?
-                    WHERE user_id = ?
-                '''
-                cursor.execute(query, (new_amount, user_id))
-            conn.commit()
-            cursor.close()
+        self.execute(self._column_sql('resources', resource_type, self.SET_COLUMN), (new_amount, user_id))
 
+    @invalidates_player('buildings')
     def update_building_count(self, user_id, building_type, new_count):
         """Update building count"""
-        with self.get_connection() as conn:
-            if self.use_mysql:
-                cursor = conn.cursor(dictionary=True)
-                query = f'''
-                    UPDATE buildings 
-                    SET {building_type} = %s
-                    WHERE user_id = %s
-                '''
-                cursor.execute(query, (new_count, user_id))
-            else:
-                cursor = conn.cursor()
-                query = f'''
-                    UPDATE buildings 
-                    SET {building_type} = ?
-                    WHERE user_id = ?
-                '''
-                cursor.execute(query, (new_count, user_id))
-            conn.commit()
-            cursor.close()
+        self.execute(self._column_sql('buildings', building_type, self.SET_COLUMN), (new_count, user_id))
 
     def add_building(self, user_id, building_type):
         """Add a building to player"""
-        with self.get_connection() as conn:
-            if self.use_mysql:
-                cursor = conn.cursor(dictionary=True)
-                query = f'''
-                    UPDATE buildings 
-                    SET {building_type} = {building_type} + 1 
-                    WHERE user_id = %s
-                '''
-                cursor.execute(query, (user_id,))
-            else:
-                cursor = conn.cursor()
-                query = f'''
-                    UPDATE buildings 
-                    SET {building_type} = {building_type} + 1 
-                    WHERE user_id = ?
-                '''
-                cursor.execute(query, (user_id,))
-            conn.commit()
-            cursor.close()
+        token = self.begin_buildings_change(user_id)
+        added = False
+        try:
+            self.execute(self._column_sql('buildings', building_type, self.ADD_TO_COLUMN), (1, user_id))
+            added = True
+        finally:
+            self.cache.invalidate(user_id, 'buildings')
+            self.buildings_changed(user_id, {building_type: 1} if added else None, token)
 
     def add_weapon(self, user_id, weapon_type, quantity=1):
         """Add weapons to player"""
-        logger.info(f"add_weapon called: user_id={user_id}, weapon_type={weapon_type}, quantity={quantity}")
-
-        # Map weapon names to database column names
-        weapon_column_map = {
-            'rifle': 'rifle',
-            'tank': 'tank',
-            'fighter': 'fighter_jet',
-            'fighter_jet': 'fighter_jet',
-            'helicopter': 'helicopter',
-            'jet': 'jet',
-            'drone': 'drone',
-            'strategic_bomber': 'strategic_bomber',
-            'warship': 'warship',
-            'submarine': 'submarine',
-            'destroyer': 'destroyer',
-            'aircraft_carrier': 'aircraft_carrier',
-            'aircraft_carrier_full': 'aircraft_carrier_full',
-            'nuclear_submarine': 'nuclear_submarine',
-            'patrol_ship': 'patrol_ship',
-            'patrol_boat': 'patrol_boat',
-            'amphibious_ship': 'amphibious_ship',
-            'air_defense': 'air_defense',
-            'missile_shield': 'missile_shield',
-            'cyber_shield': 'cyber_shield',
-            's500_defense': 's500_defense',
-            'thaad_defense': 'thaad_defense',
-            's400_defense': 's400_defense',
-            'iron_dome': 'iron_dome',
-            'slq32_ew': 'slq32_ew',
-            'phalanx_ciws': 'phalanx_ciws',
-            'simple_bomb': 'simple_bomb',
-            'nuclear_bomb': 'nuclear_bomb',
-            'simple_missile': 'simple_missile',
-            'ballistic_missile': 'ballistic_missile',
-            'nuclear_missile': 'nuclear_missile',
-            'trident2_conventional': 'trident2_conventional',
-            'trident2_nuclear': 'trident2_nuclear',
-            'satan2_conventional': 'satan2_conventional',
-            'satan2_nuclear': 'satan2_nuclear',
-            'df41_nuclear': 'df41_nuclear',
-            'tomahawk_conventional': 'tomahawk_conventional',
-            'tomahawk_nuclear': 'tomahawk_nuclear',
-            'kalibr_conventional': 'kalibr_conventional',
-            'f22': 'f22',
-            'f35': 'f35',
-            'su57': 'su57',
-            'j20': 'j20',
-            'f15ex': 'f15ex',
-            'su35s': 'su35s',
-            'kf51_panther': 'kf51_panther',
-            'abrams_x': 'abrams_x',
-            'm1e3_abrams': 'm1e3_abrams',
-            't90ms_proryv': 't90ms_proryv',
-            'm1a2_abrams_sepv3': 'm1a2_abrams_sepv3',
-            'armored_truck': 'armored_truck',
-            'cargo_helicopter': 'cargo_helicopter',
-            'cargo_plane': 'cargo_plane',
-            'escort_frigate': 'escort_frigate',
-            'logistics_drone': 'logistics_drone',
-            'heavy_transport': 'heavy_transport',
-            'supply_ship': 'supply_ship',
-            'stealth_transport': 'stealth_transport',
-            'tanker_aircraft': 'tanker_aircraft',
-            'aircraft_carrier_transport': 'aircraft_carrier_transport'
-        }
+        return self.add_weapons(user_id, {weapon_type: quantity})
+
+    def weapon_column(self, weapon_type):
+        """Map a weapon name to its weapons table column, or None if unknown"""
+        column = self.WEAPON_ALIASES.get(weapon_type, weapon_type)
+        return column if column in self._weapon_column_set else None
+
+    def add_weapons(self, user_id, weapons):
+        """Add several weapon types to a player with one upsert statement"""
+        return self.add_weapons_to_players([user_id], weapons)
+
+    def add_weapons_to_players(self, user_ids, weapons):
+        """Add the same weapons to many players in one batch"""
+        logger.debug(f"add_weapons called: user_ids={user_ids}, weapons={weapons}")
+
+        quantities = {}
+        for weapon_type, quantity in weapons.items():
+            column = self.weapon_column(weapon_type)
+            if column is None:
+                logger.error(f"Invalid weapon type: {weapon_type}")
+                return False
+            quantities[column] = quantities.get(column, 0) + quantity
+
+        if not quantities or not user_ids:
+            return True
 
-        column_name = weapon_column_map.get(weapon_type, weapon_type)
-        logger.info(f"Mapped weapon_type '{weapon_type}' to column '{column_name}'")
+        columns = tuple(quantities)
+        values = tuple(quantities[column] for column in columns)
 
-        # Validate column name to prevent SQL injection - allow alphanumeric and underscores only
-        if not all(c.isalnum() or c == '_' for c in column_name):
-            logger.error(f"Invalid column name: {column_name}")
-            return
-        # Validate column name to prevent SQL injection - allow alphanumeric and underscores only
-        if not all(c.isalnum() or c == '_' for c in column_name):
-            logger.error(f"Invalid column name: {column_name}")
-            return
-        # Validate column name to prevent SQL injection - allow alphanumeric and underscores only
-        if not all(c.isalnum() or c == '_' for c in column_name):
-            logger.error(f"Invalid column name: {column_name}")
-            return
-        # Validate column name to prevent SQL injection - allow alphanumeric and underscores only
-        if not all(c.isalnum() or c == '_' for c in column_name):
-            logger.error(f"Invalid column name: {column_name}")
-            return
+        try:
+            with self.get_connection() as conn:
+                self.execute_many(
+                    self._weapon_upsert_sql(columns),
+                    [(user_id,) + values for user_id in user_ids],
+                    conn=conn
+                )
 
-        with self.get_connection() as conn:
-            if self.use_mysql:
-                cursor = conn.cursor(dictionary=True)
-                # Check if user exists in weapons table
-                cursor.execute('SELECT COUNT(*) FROM weapons WHERE user_id = %s', (user_id,))
-                user_exists = cursor.fetchone()['COUNT(*)'] > 0
-                logger.info(f"User {user_id} exists in weapons table: {user_exists}")
-
-                if not user_exists:
-                    logger.info(f"Creating weapons entry for user {user_id}")
-                    cursor.execute('INSERT INTO weapons (user_id) VALUES (%s)', (user_id,))
-
-                # Check current value before update
-                query = f'SELECT `{column_name}` FROM weapons WHERE user_id = %s'
-                cursor.execute(query, (user_id,))
-                current_value = cursor.fetchone()
-                if current_value:
-                    current_value = current_value[column_name] or 0
-                else:
-                    current_value = 0
-                logger.info(f"Current {column_name} value for user {user_id}: {current_value}")
-
-                # Update weapons using backticks to escape column name
-                update_query = f'UPDATE weapons SET `{column_name}` = `{column_name}` + %s WHERE user_id = %s'
-                cursor.execute(update_query, (quantity, user_id))
-
-                # Check after update
-                cursor.execute(query, (user_id,))
-                new_value = cursor.fetchone()
-                if new_value:
-                    new_value = new_value[column_name] or 0
-                else:
-                    new_value = 0
-                logger.info(f"New {column_name} value for user {user_id}: {new_value}")
-            else:
-                cursor = conn.cursor()
-                # Check if user exists in weapons table
-                cursor.execute('SELECT COUNT(*) FROM weapons WHERE user_id = ?', (user_id,))
-                user_exists = cursor.fetchone()[0] > 0
-                logger.info(f"User {user_id} exists in weapons table: {user_exists}")
-
-                if not user_exists:
-                    logger.info(f"Creating weapons entry for user {user_id}")
-                    cursor.execute('INSERT INTO weapons (user_id) VALUES (?)', (user_id,))
-
-                # Check current value before update
-                query = f'SELECT "{column_name}" FROM weapons WHERE user_id = ?'
-                cursor.execute(query, (user_id,))
-                current_row = cursor.fetchone()
-                if current_row:
-                    current_value = current_row[0] or 0
-                else:
-                    current_value = 0
-                logger.info(f"Current {column_name} value for user {user_id}: {current_value}")
-
-                # Update weapons using double quotes to escape column name
-                update_query = f'UPDATE weapons SET "{column_name}" = "{column_name}" + ? WHERE user_id = ?'
-                cursor.execute(update_query, (quantity, user_id))
-
-                # Check after update
-                cursor.execute(query, (user_id,))
-                new_row = cursor.fetchone()
-                if new_row:
-                    new_value = new_row[0] or 0
-                else:
-                    new_value = 0
-                logger.info(f"New {column_name} value for user {user_id}: {new_value}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    for user_id in user_ids:
+                        row = self.fetch_one(
+                            f"SELECT {', '.join(columns)} FROM weapons WHERE user_id = ?", (user_id,), conn=conn
+                        )
+                        logger.debug(f"Weapons for user {user_id} after add: {row}")
+        finally:
+            self.cache.invalidate_many(user_ids, 'weapons')
 
-            conn.commit()
-            cursor.close()
+        return True
 
+    def _weapon_upsert_sql(self, columns):
+        """Build (once per column set) the portable weapons upsert statement"""
+        sql = self._weapon_upsert_cache.get(columns)
+        if sql is None:
+            updates = ', '.join(f"{column} = {column} + excluded.{column}" for column in columns)
+            sql = (f"INSERT INTO weapons (user_id, {', '.join(columns)}) "
+                   f"VALUES ({self.dialect.placeholders(len(columns) + 1)}) "
+                   f"ON CONFLICT(user_id) DO UPDATE SET {updates}")
+            self._weapon_upsert_cache[columns] = sql
+        return sql
+
+    @invalidates_player('resources')
     def add_resources(self, user_id, resource_type, quantity):
         """Add resources to player"""
-        with self.get_connection() as conn:
-            if self.use_mysql:
-                cursor = conn.cursor(dictionary=True)
-                query = f'''
-                    UPDATE resources 
-                    SET {resource_type} = {resource_type} + %s 
-                    WHERE user_id = %s
-                '''
-                cursor.execute(query, (quantity, user_id))
-            else:
-                cursor = conn.cursor()
-                query = f'''
-                    UPDATE resources 
-                    SET {resource_type} = {resource_type} + ? 
-                    WHERE user_id = ?
-                '''
-                cursor.execute(query, (quantity, user_id))
-            conn.commit()
-            cursor.close()
+        self.execute(self._column_sql('resources', resource_type, self.ADD_TO_COLUMN), (quantity, user_id))
 
+    @invalidates_player('resources')
     def subtract_resources(self, user_id, resource_type, quantity):
         """Subtract resources from player"""
-        with self.get_connection() as conn:
-            if self.use_mysql:
-                cursor = conn.cursor(dictionary=True)
-                query = f'''
-                    UPDATE resources 
-                    SET {resource_type} = {resource_type} - %s 
-                    WHERE user_id = %s
-                '''
-                cursor.execute(query, (quantity, user_id))
-            else:
-                cursor = conn.cursor()
-                query = f'''
-                    UPDATE resources 
-                    SET {resource_type} = {resource_type} - ? 
-                    WHERE user_id = ?
-                '''
-                cursor.execute(query, (quantity, user_id))
-            conn.commit()
-            cursor.close()
+        self.execute(self._column_sql('resources', resource_type, self.ADD_TO_COLUMN), (-quantity, user_id))
 
     def consume_resources(self, user_id, resources_needed):
         """Consume resources from player"""
-        with self.get_connection() as conn:
-            if self.use_mysql:
-                cursor = conn.cursor(dictionary=True)
-            else:
-                cursor = conn.cursor()
-
-            # Check if player has enough resources
-            current_resources = self.get_player_resources(user_id)
-            for resource, amount in resources_needed.items():
-                if current_resources.get(resource, 0) < amount:
-                    cursor.close()
+        return self.apply_delta(user_id, resources={
+            resource: -amount for resource, amount in resources_needed.items()
+        })
+
+    def apply_delta(self, user_id, money=0, population=0, soldiers=0,
+                    resources=None, weapons=None, buildings=None):
+        """Apply relative changes to one player's state in a single transaction
+
+        Every decrease is conditional on the value staying non-negative. If any
+        part cannot be applied nothing is written and False is returned.
+        """
+        return self.apply_deltas({user_id: {
+            'money': money,
+            'population': population,
+            'soldiers': soldiers,
+            'resources': resources,
+            'weapons': weapons,
+            'buildings': buildings
+        }})
+
+    def apply_deltas(self, deltas, clamp=False, conn=None):
+        """Apply apply_delta-style changes for several players in one transaction
+
+        deltas: {user_id: {'money': .., 'population': .., 'soldiers': ..,
+                           'resources': {..}, 'weapons': {..}, 'buildings': {..}}}
+        clamp: floor decreases at zero instead of rejecting the whole change
+        conn: run inside the caller's transaction (DeltaRejected propagates)
+        """
+        if conn is None:
+            # Income accrued so far counts toward the guarded decreases
+            self.settle_income(list(deltas))
+
+        statements = []
+        touched = {}
+        for user_id, delta in deltas.items():
+            counters = {column: delta.get(column) or 0 for column in self.PLAYER_COUNTERS}
+            changes = [
+                ('players', 'player', counters),
+                ('resources', 'resources', delta.get('resources') or {}),
+                ('buildings', 'buildings', delta.get('buildings') or {}),
+                ('weapons', 'weapons', {
+                    self.weapon_column(weapon) or weapon: amount
+                    for weapon, amount in (delta.get('weapons') or {}).items()
+                })
+            ]
+            for table, cache_table, values in changes:
+                values = {column: amount for column, amount in values.items() if amount}
+                if not values:
+                    continue
+                invalid = set(values) - self._delta_columns[table]
+                if invalid:
+                    logger.error(f"apply_delta: invalid {table} columns {sorted(invalid)}")
                     return False
+                statements.append((table, user_id, values))
+                touched.setdefault(user_id, []).append(cache_table)
 
-            # Consume resources
-            for resource, amount in resources_needed.items():
-                query = f'''
-                    UPDATE resources 
-                    SET {resource} = {resource} - %s 
-                    WHERE user_id = %s
-                '''
-                cursor.execute(query, (amount, user_id))
-
-            conn.commit()
-            cursor.close()
+        if not statements:
             return True
 
+        if conn is not None:
+            # Callers inside a transaction read (and so settled) the players beforehand;
+            # they call invalidate_players() again once their transaction commits
+            try:
+                self._execute_deltas(conn, statements, clamp)
+                return True
+            finally:
+                for user_id, tables in touched.items():
+                    self.cache.invalidate(user_id, *tables)
+                    if 'buildings' in tables:
+                        self.buildings_changed(user_id)
+
+        # Exact building deltas move the cached income rates; clamped ones may
+        # have applied less than asked, so those rates are recomputed instead
+        building_changes = {} if clamp else {
+            user_id: (values, self.begin_buildings_change(user_id))
+            for table, user_id, values in statements if table == 'buildings'
+        }
+        applied = False
+        try:
+            with self.transaction() as conn:
+                self._execute_deltas(conn, statements, clamp)
+            applied = True
+            return True
+        except DeltaRejected as e:
+            logger.info(f"apply_delta rolled back: {e}")
+            return False
+        finally:
+            for user_id, tables in touched.items():
+                self.cache.invalidate(user_id, *tables)
+                if 'buildings' in tables:
+                    changes, token = building_changes.get(user_id, (None, None))
+                    self.buildings_changed(user_id, changes if applied else None, token)
+
+    def _execute_deltas(self, conn, statements, clamp):
+        """Run prepared delta UPDATEs on an open transaction"""
+        for table, user_id, values in statements:
+            columns = tuple(sorted(values))
+            decreases = tuple(column for column in columns if values[column] < 0)
+            params = [values[column] for column in columns] + [user_id]
+            if not clamp:
+                params += [values[column] for column in decreases]
+            rowcount = self.execute(self._delta_update_sql(table, columns, decreases, clamp), params, conn=conn)
+            # MySQL reports changed (not matched) rows, so a clamp that changes
+            # nothing would look like a miss; only guarded updates are checked
+            if not clamp and rowcount != 1:
+                raise DeltaRejected(f"{table} update for user {user_id} did not apply")
+
+    def _delta_update_sql(self, table, columns, decreases, clamp=False):
+        """Build (once) a relative UPDATE guarded against (or clamped at) zero"""
+        key = (table, columns, decreases, clamp)
+        sql = self._delta_sql_cache.get(key)
+        if sql is None:
+            assignments = ', '.join(
+                f"{column} = GREATEST({column} + ?, 0)" if clamp and column in decreases
+                else f"{column} = {column} + ?"
+                for column in columns
+            )
+            guards = '' if clamp else ''.join(f" AND {column} + ? >= 0" for column in decreases)
+            sql = f"UPDATE {table} SET {assignments} WHERE user_id = ?{guards}"
+            self._delta_sql_cache[key] = sql
+        return sql
+
+    @contextmanager
+    def _connection(self, conn=None):
+        """Use the caller's connection when given, otherwise a pooled one"""
+        if conn is not None:
+            yield conn
+        else:
+            with self.get_connection() as conn:
+                yield conn
+
+    @property
+    def dialect(self):
+        """SQL dialect of the active backend"""
+        return sql_dialect.for_backend(self.use_mysql)
+
+    @contextmanager
+    def _statement(self, sql, params=(), conn=None, many=False):
+        """Compile a portable statement, run it and yield the open cursor"""
+        with self._connection(conn) as active:
+            cursor = active.cursor(dictionary=True) if self.use_mysql else active.cursor()
+            try:
+                compiled = self.dialect.compile(sql)
+                run = cursor.executemany if many else cursor.execute
+                if conn is None and not self.use_mysql:
+                    # A statement on its own connection is its own transaction, safe to retry
+                    self._sqlite_engine.retry_busy(run, compiled, params)
+                else:
+                    run(compiled, params)
+                yield cursor
+            finally:
+                cursor.close()
+
+    def _run(self, sql, params, conn, many, result):
+        """Run a portable statement, read result(cursor) and time it for query_stats"""
+        started = time.perf_counter()
+        with self._statement(sql, params, conn, many) as cursor:
+            value = result(cursor)
+            if self.query_stats is None:
+                return value
+            if result is _all_rows:
+                rows = len(value)
+            elif result is _first_row:
+                rows = int(value is not None)
+            else:
+                rows = max(cursor.rowcount, 0)
+        # Frame 2 is the method that called execute/fetch_one/...
+        caller = getattr(self._callers, 'code', None) or sys._getframe(2).f_code
+        self.query_stats.record(caller, sql, time.perf_counter() - started, rows)
+        return value
+
+    def run_as(self, caller, method, *args):
+        """method(*args) with its statements credited to caller (a code object) in query_stats"""
+        self._callers.code = caller
+        try:
+            return method(*args)
+        finally:
+            self._callers.code = None
+
+    def execute(self, sql, params=(), conn=None):
+        """Run a portable write statement and return the affected row count"""
+        return self._run(sql, params, conn, False, _rowcount)
+
+    def execute_many(self, sql, seq_of_params, conn=None):
+        """Run a portable statement once per parameter tuple"""
+        return self._run(sql, seq_of_params, conn, True, _rowcount)
+
+    def insert(self, sql, params=(), conn=None):
+        """Run a portable INSERT and return the new row id"""
+        return self._run(sql, params, conn, False, _lastrowid)
+
+    def fetch_one(self, sql, params=(), conn=None):
+        """First row of a portable query as a dict, or None"""
+        return self._run(sql, params, conn, False, _first_row)
+
+    def fetch_all(self, sql, params=(), conn=None):
+        """All rows of a portable query as dicts"""
+        return self._run(sql, params, conn, False, _all_rows)
+
+    def _column_sql(self, table, column, template):
+        """Single-column statement for a whitelisted column, built once"""
+        key = (table, column, template)
+        sql = self._column_sql_cache.get(key)
+        if sql is None:
+            if table == 'weapons':
+                column = self.weapon_column(column) or column
+            if column not in self._delta_columns[table]:
+                raise ValueError(f"Invalid {table} column: {column}")
+            sql = self._column_sql_cache[key] = template.format(table=table, column=column)
+        return sql
+
+    def log_war(self, attacker_id, defender_id, attack_power, defense_power, result,
+                damage=0, resources_stolen=None, conn=None):
+        """Record a resolved battle in the wars table"""
+        self.execute('''
+            INSERT INTO wars (attacker_id, defender_id, attack_power, defense_power,
+                              result, damage_dealt, resources_stolen)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            attacker_id, defender_id, int(attack_power), int(defense_power),
+            result, int(damage),
+            json.dumps(resources_stolen) if resources_stolen else None
+        ), conn=conn)
+
     def log_admin_action(self, admin_id, action, target_id=None, details=None):
         """Log admin action"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute('''
-                INSERT INTO admin_logs (admin_id, action, target_id, details)
-                VALUES (%s, %s, %s, %s)
-            ''', (admin_id, action, target_id, details))
-            conn.commit()
-            cursor.close()
+        self.execute('''
+            INSERT INTO admin_logs (admin_id, action, target_id, details)
+            VALUES (?, ?, ?, ?)
+        ''', (admin_id, action, target_id, details))
 
     def get_admin_logs(self, limit=50):
         """Get admin logs"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute('''
-                SELECT * FROM admin_logs 
-                ORDER BY created_at DESC 
-                LIMIT %s
-            ''', (limit,))
-            result = cursor.fetchall()
-            cursor.close()
-            return result
+        return self.fetch_all('''
+            SELECT * FROM admin_logs 
+            ORDER BY created_at DESC 
+            LIMIT ?
+        ''', (limit,))
 
+    @invalidates_player()
     def delete_player(self, user_id):
         """Delete player and all related data"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor(dictionary=True)
-
-            # Delete from all tables (CASCADE will handle related data)
-            cursor.execute('DELETE FROM players WHERE user_id = %s', (user_id,))
-
-            conn.commit()
-            cursor.close()
-            return True
+        # Delete from all tables (CASCADE will handle related data)
+        self.execute('DELETE FROM players WHERE user_id = ?', (user_id,))
+        return True
 
+    @invalidates_player('weapons')
     def update_weapon_count(self, user_id, weapon_type, new_count):
         """Update weapon count"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor(dictionary=True)
-            query = f'''
-                UPDATE weapons 
-                SET {weapon_type} = %s 
-                WHERE user_id = %s
-            '''
-            cursor.execute(query, (new_count, user_id))
-            conn.commit()
-            cursor.close()
+        self.execute(self._column_sql('weapons', weapon_type, self.SET_COLUMN), (new_count, user_id))
 
     def get_weapon_count(self, user_id, weapon_type):
         """Get specific weapon count"""
@@ -999,189 +946,128 @@ class Database:
 
     def get_active_convoys(self):
         """Get all active convoys in transit"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute('''
-                SELECT c.*, 
-                       s.country_name as sender_country,
-                       r.country_name as receiver_country
-                FROM convoys c
-                JOIN players s ON c.sender_id = s.user_id
-                JOIN players r ON c.receiver_id = r.user_id
-                WHERE c.status = 'in_transit'
-                AND c.arrival_time > NOW()
-                ORDER BY c.created_at DESC
-            ''')
-            results = cursor.fetchall()
-            cursor.close()
-            return results if results else []
+        return self.fetch_all('''
+            SELECT c.*, 
+                   s.country_name as sender_country,
+                   r.country_name as receiver_country
+            FROM convoys c
+            JOIN players s ON c.sender_id = s.user_id
+            JOIN players r ON c.receiver_id = r.user_id
+            WHERE c.status = 'in_transit'
+            AND c.arrival_time > NOW()
+            ORDER BY c.created_at DESC
+        ''')
 
     def create_convoy(self, sender_id, receiver_id, resources, travel_minutes=30, security_level=50):
         """Create a new convoy"""
-        import json
-        from datetime import datetime, timedelta
+        from datetime import timedelta
 
         arrival_time = datetime.now() + timedelta(minutes=travel_minutes)
 
-        with self.get_connection() as conn:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute('''
-                INSERT INTO convoys (sender_id, receiver_id, resources, arrival_time, security_level, status, created_at)
-                VALUES (%s, %s, %s, %s, %s, 'in_transit', NOW())
-            ''', (sender_id, receiver_id, json.dumps(resources), arrival_time, security_level))
-
-            convoy_id = cursor.lastrowid
-            conn.commit()
-            cursor.close()
-            return convoy_id
+        return self.insert('''
+            INSERT INTO convoys (sender_id, receiver_id, resources, arrival_time, security_level, status, created_at)
+            VALUES (?, ?, ?, ?, ?, 'in_transit', NOW())
+        ''', (sender_id, receiver_id, json.dumps(resources), arrival_time, security_level))
 
     def get_convoy(self, convoy_id):
         """Get convoy details"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute('SELECT * FROM convoys WHERE id = %s', (convoy_id,))
-            result = cursor.fetchone()
-            cursor.close()
-            return result
+        return self.fetch_one('SELECT * FROM convoys WHERE id = ?', (convoy_id,))
 
-    def update_convoy_status(self, convoy_id, new_status, thief_id=None):
+    def update_convoy_status(self, convoy_id, new_status, thief_id=None, conn=None):
         """Update convoy status and thief if applicable"""
-        with self.get_connection() as conn:
-            if self.use_mysql:
-                cursor = conn.cursor(dictionary=True)
-                if thief_id:
-                    cursor.execute('UPDATE convoys SET status = %s, thief_id = %s WHERE id = %s', (new_status, thief_id, convoy_id))
-                else:
-                    cursor.execute('UPDATE convoys SET status = %s WHERE id = %s', (new_status, convoy_id))
-            else:
-                cursor = conn.cursor()
-                if thief_id:
-                    cursor.execute('UPDATE convoys SET status = ?, thief_id = ? WHERE id = ?', (new_status, thief_id, convoy_id))
-                else:
-                    cursor.execute('UPDATE convoys SET status = ? WHERE id = ?', (new_status, convoy_id))
-            conn.commit()
-            cursor.close()
+        if thief_id:
+            self.execute('UPDATE convoys SET status = ?, thief_id = ? WHERE id = ?',
+                         (new_status, thief_id, convoy_id), conn=conn)
+        else:
+            self.execute('UPDATE convoys SET status = ? WHERE id = ?', (new_status, convoy_id), conn=conn)
 
     def update_convoy_arrival(self, convoy_id, new_arrival_time, new_status):
         """Update convoy arrival time and status"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute('''
-                UPDATE convoys 
-                SET arrival_time = %s, status = %s 
-                WHERE id = %s
-            ''', (new_arrival_time, new_status, convoy_id))
-            conn.commit()
-            cursor.close()
+        self.execute('''
+            UPDATE convoys 
+            SET arrival_time = ?, status = ? 
+            WHERE id = ?
+        ''', (new_arrival_time, new_status, convoy_id))
 
     def update_convoy_security(self, convoy_id, new_security_level):
         """Update convoy security level"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute('''
-                UPDATE convoys 
-                SET security_level = %s 
-                WHERE id = %s
-            ''', (new_security_level, convoy_id))
-            conn.commit()
-            cursor.close()
+        self.execute('''
+            UPDATE convoys 
+            SET security_level = ? 
+            WHERE id = ?
+        ''', (new_security_level, convoy_id))
 
     def get_arrived_convoys(self):
         """Get all convoys that have arrived at their destination"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute('''
-                SELECT c.*, 
-                       s.country_name as sender_country,
-                       r.country_name as receiver_country
-                FROM convoys c
-                JOIN players s ON c.sender_id = s.user_id
-                JOIN players r ON c.receiver_id = r.user_id
-                WHERE c.status = 'in_transit'
-                AND c.arrival_time <= NOW()
-                ORDER BY c.arrival_time ASC
-            ''')
-            results = cursor.fetchall()
-            cursor.close()
-            return results if results else []
+        return self.fetch_all('''
+            SELECT c.*, 
+                   s.country_name as sender_country,
+                   r.country_name as receiver_country
+            FROM convoys c
+            JOIN players s ON c.sender_id = s.user_id
+            JOIN players r ON c.receiver_id = r.user_id
+            WHERE c.status = 'in_transit'
+            AND c.arrival_time <= ?
+            ORDER BY c.arrival_time ASC
+        ''', (datetime.now(),))
+
+    def get_convoy_deadlines(self):
+        """(id, arrival_time) of every convoy still in transit"""
+        return self.fetch_all("SELECT id, arrival_time FROM convoys WHERE status = 'in_transit'")
 
     def create_pending_attack(self, attack_data):
         """Create a new pending attack"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute('''
-                INSERT INTO pending_attacks (attacker_id, defender_id, attack_type, conquest_mode, travel_time, attack_time, status)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-            ''', (
-                attack_data['attacker_id'],
-                attack_data['defender_id'], 
-                attack_data['attack_type'],
-                1 if attack_data.get('conquest_mode', False) else 0,
-                attack_data['travel_time'],
-                attack_data['attack_time'],
-                attack_data['status']
-            ))
-            attack_id = cursor.lastrowid
-            conn.commit()
-            cursor.close()
-            return attack_id
+        return self.insert('''
+            INSERT INTO pending_attacks (attacker_id, defender_id, attack_type, conquest_mode, travel_time, attack_time, status)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            attack_data['attacker_id'],
+            attack_data['defender_id'], 
+            attack_data['attack_type'],
+            1 if attack_data.get('conquest_mode', False) else 0,
+            attack_data['travel_time'],
+            as_datetime(attack_data['attack_time']),
+            attack_data['status']
+        ))
 
     def get_pending_attack(self, attack_id):
         """Get pending attack details"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute('SELECT * FROM pending_attacks WHERE id = %s', (attack_id,))
-            result = cursor.fetchone()
-            cursor.close()
-            return result
+        return self.fetch_one('SELECT * FROM pending_attacks WHERE id = ?', (attack_id,))
 
     def get_player_pending_attacks(self, player_id):
         """Get all pending attacks for a player"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute('''
-                SELECT * FROM pending_attacks 
-                WHERE attacker_id = %s AND status IN ('traveling', 'pending')
-            ''', (player_id,))
-            results = cursor.fetchall()
-            cursor.close()
-            return results
+        return self.fetch_all('''
+            SELECT * FROM pending_attacks 
+            WHERE attacker_id = ? AND status IN ('traveling', 'pending')
+        ''', (player_id,))
 
     def get_pending_attacks_due(self):
         """Get all pending attacks that are due for execution"""
-        from datetime import datetime
-        with self.get_connection() as conn:
-            cursor = conn.cursor(dictionary=True)
-            current_time = datetime.now()
-            cursor.execute('''
-                SELECT * FROM pending_attacks 
-                WHERE attack_time <= %s AND status = 'traveling'
-            ''', (current_time,))
-            result = cursor.fetchall()
-            cursor.close()
-            return result
+        return self.fetch_all('''
+            SELECT * FROM pending_attacks 
+            WHERE attack_time <= ? AND status = 'traveling'
+        ''', (datetime.now(),))
+
+    def get_pending_attack_deadlines(self):
+        """(id, attack_time) of every attack still traveling"""
+        return self.fetch_all("SELECT id, attack_time FROM pending_attacks WHERE status = 'traveling'")
 
     def update_pending_attack_status(self, attack_id, new_status):
         """Update pending attack status"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute('UPDATE pending_attacks SET status = %s WHERE id = %s', (new_status, attack_id))
-            conn.commit()
-            cursor.close()
+        self.execute('UPDATE pending_attacks SET status = ? WHERE id = ?', (new_status, attack_id))
 
     def reset_all_data(self):
         """Reset all game data (admin function)"""
         with self.get_connection() as conn:
-            cursor = conn.cursor(dictionary=True)
-
             # Drop and recreate all game tables
             tables = ['market_transactions', 'marketplace_listings', 'purchase_tracking', 'build_tracking',
-                     'pending_attacks', 'convoys', 'wars', 'weapons', 'buildings', 'resources', 'players']
+                     'pending_attacks', 'convoys', 'wars', 'weapons', 'buildings', 'resources', 'players',
+                     'news_outbox', 'schema_version']
             for table in tables:
-                cursor.execute(f'DROP TABLE IF EXISTS {table}')
-
-            conn.commit()
-            cursor.close()
+                self.execute(f'DROP TABLE IF EXISTS {table}', conn=conn)
+        self.cache.clear()
+        if self.income_rates is not None:
+            self.income_rates.clear()
 
         # Reinitialize database
         self.initialize()
@@ -1189,61 +1075,100 @@ class Database:
 
     def check_first_purchase(self, user_id, item_type):
         """Check if this is user's first purchase of this item type"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute(
-                'SELECT id FROM purchase_tracking WHERE buyer_id = %s AND item_type = %s',
-                (user_id, item_type)
-            )
-            result = cursor.fetchone()
-            cursor.close()
-            return result is None
-
-    def record_first_purchase(self, user_id, item_type):
-        """Record first purchase of an item type"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute('''
-                INSERT IGNORE INTO purchase_tracking (buyer_id, item_type)
-                VALUES (%s, %s)
-            ''', (user_id, item_type))
-            conn.commit()
-            cursor.close()
+        return self.fetch_one(
+            'SELECT id FROM purchase_tracking WHERE buyer_id = ? AND item_type = ?',
+            (user_id, item_type)
+        ) is None
+
+    def record_first_purchase(self, user_id, item_type, conn=None):
+        """Record first purchase of an item type; True if this was the first"""
+        return self.execute('''
+            INSERT IGNORE INTO purchase_tracking (buyer_id, item_type)
+            VALUES (?, ?)
+        ''', (user_id, item_type), conn=conn) > 0
+
+    def queue_news(self, event, payload, dedup_key, conn=None):
+        """Record a news event in the outbox, inside the caller's transaction when conn is given
+
+        Returns False if an event with this dedup_key was already queued.
+        """
+        return self.execute('''
+            INSERT IGNORE INTO news_outbox (dedup_key, event, payload, created_at)
+            VALUES (?, ?, ?, ?)
+        ''', (dedup_key, event, json.dumps(payload), datetime.now().replace(microsecond=0)), conn=conn) > 0
+
+    def claim_pending_news(self, limit, offered_before):
+        """Oldest unsent outbox rows not offered since offered_before, marked as offered now"""
+        with self.transaction() as conn:
+            rows = self.fetch_all('''
+                SELECT id, event, payload FROM news_outbox
+                WHERE sent_at IS NULL AND failed_at IS NULL AND (offered_at IS NULL OR offered_at <= ?)
+                ORDER BY id
+                LIMIT ?
+            ''', (offered_before, limit), conn=conn)
+            if rows:
+                ids = [row['id'] for row in rows]
+                self.execute(f'UPDATE news_outbox SET offered_at = ? WHERE id IN ({self.dialect.placeholders(len(ids))})',
+                             (datetime.now().replace(microsecond=0), *ids), conn=conn)
+        for row in rows:
+            row['payload'] = json.loads(row['payload'])
+        return rows
+
+    def mark_news_sent(self, news_ids):
+        """Record outbox rows Telegram accepted"""
+        if not news_ids:
+            return 0
+        return self.execute(
+            f'UPDATE news_outbox SET sent_at = ? WHERE id IN ({self.dialect.placeholders(len(news_ids))})',
+            (datetime.now().replace(microsecond=0), *news_ids)
+        )
+
+    def mark_news_failed(self, news_ids):
+        """Record outbox rows Telegram rejected or that ran out of retries; they are not offered again"""
+        if not news_ids:
+            return 0
+        return self.execute(
+            f'UPDATE news_outbox SET failed_at = ? WHERE id IN ({self.dialect.placeholders(len(news_ids))})',
+            (datetime.now().replace(microsecond=0), *news_ids)
+        )
+
+    def release_news_offers(self):
+        """Make every unsent outbox row deliverable again (startup)"""
+        return self.execute('''
+            UPDATE news_outbox SET offered_at = NULL
+            WHERE sent_at IS NULL AND failed_at IS NULL AND offered_at IS NOT NULL
+        ''')
+
+    def purge_sent_news(self, sent_before):
+        """Drop delivered and failed outbox rows (their dedup keys are no longer needed)"""
+        return self.execute('''
+            DELETE FROM news_outbox
+            WHERE (sent_at IS NOT NULL AND sent_at < ?) OR (failed_at IS NOT NULL AND failed_at < ?)
+        ''', (sent_before, sent_before))
 
     def check_first_build(self, user_id, item_type):
         """Check if this is user's first build of this item type"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute(
-                'SELECT id FROM build_tracking WHERE builder_id = %s AND item_type = %s',
-                (user_id, item_type)
-            )
-            result = cursor.fetchone()
-            cursor.close()
-            return result is None
+        return self.fetch_one(
+            'SELECT id FROM build_tracking WHERE builder_id = ? AND item_type = ?',
+            (user_id, item_type)
+        ) is None
 
     def record_first_build(self, user_id, item_type):
         """Record first build of an item type"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute('''
-                INSERT IGNORE INTO build_tracking (builder_id, item_type)
-                VALUES (%s, %s)
-            ''', (user_id, item_type))
-            conn.commit()
-            cursor.close()
+        self.execute('''
+            INSERT IGNORE INTO build_tracking (builder_id, item_type)
+            VALUES (?, ?)
+        ''', (user_id, item_type))
 
     def give_infinite_resources_to_all_players(self):
         """Give infinite money and resources to all players for testing"""
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor(dictionary=True)
-
+            with self.transaction() as conn:
                 # Give 1 billion money to all players
-                cursor.execute("UPDATE players SET money = 1000000000, population = 50000000, soldiers = 10000000")
+                self.execute("UPDATE players SET money = 1000000000, population = 50000000, soldiers = 10000000", conn=conn)
 
                 # Give massive resources to all players
-                cursor.execute("""
+                self.execute("""
                     UPDATE resources SET 
                     iron = 1000000,
                     copper = 1000000,
@@ -1259,10 +1184,10 @@ class Database:
                     nitro = 1000000,
                     sulfur = 1000000,
                     titanium = 1000000
-                """)
+                """, conn=conn)
 
                 # Give lots of buildings to all players
-                cursor.execute("""
+                self.execute("""
                     UPDATE buildings SET 
                     iron_mine = 100,
                     copper_mine = 100,
@@ -1283,12 +1208,13 @@ class Database:
                     wheat_farm = 50,
                     military_base = 50,
                     housing = 50
-                """)
+                """, conn=conn)
 
-                conn.commit()
-                cursor.close()
-                logger.info("Infinite resources given to all players for testing")
-                return True
+            self.cache.clear()
+            if self.income_rates is not None:
+                self.income_rates.clear()
+            logger.info("Infinite resources given to all players for testing")
+            return True
         except Exception as e:
             logger.error(f"Error giving infinite resources: {e}")
             return False
@@ -1296,17 +1222,12 @@ class Database:
     def clear_test_data(self):
         """Clear test data from database"""
         try:
-            with self.get_connection() as conn:
-                if self.use_mysql:
-                    cursor = conn.cursor(dictionary=True)
-                    cursor.execute("DELETE FROM players WHERE user_id IN (%s, %s, %s)", (123456, 123457, 123458))
-                else:
-                    cursor = conn.cursor()
-                    cursor.execute("DELETE FROM players WHERE user_id IN (?, ?, ?)", (123456, 123457, 123458))
-                conn.commit()
-                cursor.close()
-                logger.info("Test data cleared successfully")
-                return True
+            self.execute("DELETE FROM players WHERE user_id IN (?, ?, ?)", (123456, 123457, 123458))
+            self.cache.clear()
+            if self.income_rates is not None:
+                self.income_rates.clear()
+            logger.info("Test data cleared successfully")
+            return True
         except Exception as e:
             logger.error(f"Error clearing test data: {e}")
             return False
@@ -1314,16 +1235,7 @@ class Database:
     def is_user_banned(self, user_id):
         """Check if user is banned"""
         try:
-            with self.get_connection() as conn:
-                if self.use_mysql:
-                    cursor = conn.cursor(dictionary=True)
-                    cursor.execute('SELECT 1 FROM banned_users WHERE user_id = %s', (user_id,))
-                else:
-                    cursor = conn.cursor()
-                    cursor.execute('SELECT 1 FROM banned_users WHERE user_id = ?', (user_id,))
-                result = cursor.fetchone()
-                cursor.close()
-                return result is not None
+            return self.fetch_one('SELECT 1 AS banned FROM banned_users WHERE user_id = ?', (user_id,)) is not None
         except Exception as e:
             logger.error(f"Error checking if user is banned: {e}")
             return False
@@ -1331,23 +1243,12 @@ class Database:
     def ban_user(self, user_id, username, banned_by, reason="سوء استفاده از ربات"):
         """Ban a user"""
         try:
-            with self.get_connection() as conn:
-                if self.use_mysql:
-                    cursor = conn.cursor(dictionary=True)
-                    cursor.execute('''
-                        INSERT INTO banned_users (user_id, username, banned_by, ban_reason)
-                        VALUES (%s, %s, %s, %s)
-                    ''', (user_id, username, banned_by, reason))
-                else:
-                    cursor = conn.cursor()
-                    cursor.execute('''
-                        INSERT INTO banned_users (user_id, username, banned_by, ban_reason)
-                        VALUES (?, ?, ?, ?)
-                    ''', (user_id, username, banned_by, reason))
-                conn.commit()
-                cursor.close()
-                logger.info(f"User {user_id} ({username}) banned by {banned_by}")
-                return True
+            self.execute('''
+                INSERT INTO banned_users (user_id, username, banned_by, ban_reason)
+                VALUES (?, ?, ?, ?)
+            ''', (user_id, username, banned_by, reason))
+            logger.info(f"User {user_id} ({username}) banned by {banned_by}")
+            return True
         except Exception as e:
             logger.error(f"Error banning user: {e}")
             return False
@@ -1355,17 +1256,9 @@ class Database:
     def unban_user(self, user_id):
         """Unban a user"""
         try:
-            with self.get_connection() as conn:
-                if self.use_mysql:
-                    cursor = conn.cursor(dictionary=True)
-                    cursor.execute('DELETE FROM banned_users WHERE user_id = %s', (user_id,))
-                else:
-                    cursor = conn.cursor()
-                    cursor.execute('DELETE FROM banned_users WHERE user_id = ?', (user_id,))
-                conn.commit()
-                cursor.close()
-                logger.info(f"User {user_id} unbanned")
-                return True
+            self.execute('DELETE FROM banned_users WHERE user_id = ?', (user_id,))
+            logger.info(f"User {user_id} unbanned")
+            return True
         except Exception as e:
             logger.error(f"Error unbanning user: {e}")
             return False
@@ -1373,58 +1266,24 @@ class Database:
     def get_banned_users(self):
         """Get list of banned users"""
         try:
-            with self.get_connection() as conn:
-                if self.use_mysql:
-                    cursor = conn.cursor(dictionary=True)
-                    cursor.execute('SELECT * FROM banned_users ORDER BY banned_at DESC')
-                    result = cursor.fetchall()
-                else:
-                    cursor = conn.cursor()
-                    cursor.execute('SELECT * FROM banned_users ORDER BY banned_at DESC')
-                    rows = cursor.fetchall()
-                    result = [dict(row) for row in rows] if rows else []
-                cursor.close()
-                return result
+            return self.fetch_all('SELECT * FROM banned_users ORDER BY banned_at DESC')
         except Exception as e:
             logger.error(f"Error getting banned users: {e}")
             return []
 
-    def migrate_user_id_schema(self):
-        """Migrate existing tables to use BIGINT for user_id columns"""
-        if not self.use_mysql:
-            return True  # SQLite handles large integers automatically
 
-        try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
+def _rowcount(cursor):
+    return cursor.rowcount
 
-                # Check if migration is needed
-                cursor.execute("SHOW COLUMNS FROM players LIKE 'user_id'")
-                result = cursor.fetchone()
-                if result and 'bigint' in result[1].lower():
-                    logger.info("Schema already migrated")
-                    return True
 
-                logger.info("Starting user_id schema migration...")
+def _lastrowid(cursor):
+    return cursor.lastrowid
 
-                # Drop tables in correct order (respecting foreign key constraints)
-                tables_to_drop = [
-                    'build_tracking', 'purchase_tracking', 'market_transactions', 
-                    'marketplace_listings', 'admin_logs', 'pending_attacks', 
-                    'convoys', 'wars', 'weapons', 'buildings', 'resources', 'players'
-                ]
 
-                for table in tables_to_drop:
-                    cursor.execute(f"DROP TABLE IF EXISTS {table}")
+def _first_row(cursor):
+    row = cursor.fetchone()
+    return dict(row) if row else None
 
-                conn.commit()
-                cursor.close()
 
-                # Reinitialize with new schema
-                self.initialize()
-                logger.info("Schema migration completed successfully")
-                return True
-
-        except Exception as e:
-            logger.error(f"Error during schema migration: {e}")
-            return False
+def _all_rows(cursor):
+    return [dict(row) for row in cursor.fetchall()]
@@ -0,0 +1,192 @@
+"""
+DragonRP Connection Pool
+Keeps database connections open between calls instead of reconnecting every time
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class PoolExhaustedError(Exception):
+    """Raised when no connection becomes available before the checkout timeout"""
+
+
+class _PoolEntry:
+    """A raw driver connection plus its bookkeeping"""
+
+    __slots__ = ('raw', 'created_at', 'last_used')
+
+    def __init__(self, raw):
+        now = time.monotonic()
+        self.raw = raw
+        self.created_at = now
+        self.last_used = now
+
+
+class PooledConnection:
+    """Checked-out connection that goes back to the pool instead of closing"""
+
+    def __init__(self, pool, entry):
+        self._pool = pool
+        self._entry = entry
+
+    def __getattr__(self, name):
+        entry = self.__dict__.get('_entry')
+        if entry is None:
+            raise AttributeError(f"connection already returned to pool ({name})")
+        return getattr(entry.raw, name)
+
+    @property
+    def raw(self):
+        """Underlying driver connection"""
+        return self._entry.raw
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                if getattr(self._entry.raw, 'in_transaction', False):
+                    self._entry.raw.commit()
+            else:
+                self._entry.raw.rollback()
+        except Exception as e:
+            logger.warning(f"Error finishing pooled connection: {e}")
+        finally:
+            self.close()
+        return False
+
+    def close(self):
+        """Return the connection to the pool (safe to call twice)"""
+        entry, self._entry = self._entry, None
+        if entry is not None:
+            self._pool.release(entry)
+
+
+class ConnectionPool:
+    """Thread-safe pool with health checks on checkout and stale recycling"""
+
+    def __init__(self, factory, pool_size=5, max_overflow=10, timeout=10.0,
+                 recycle=3600, ping_interval=30, ping=None, reset=None, name='db'):
+        self.factory = factory
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_interval = ping_interval
+        self.ping = ping
+        self.reset = reset
+        self.name = name
+
+        self._idle = deque()
+        self._size = 0
+        self._cond = threading.Condition()
+
+    @property
+    def size(self):
+        """Number of open connections (idle and checked out)"""
+        return self._size
+
+    @property
+    def idle_count(self):
+        """Number of connections waiting in the pool"""
+        return len(self._idle)
+
+    def acquire(self):
+        """Check out a healthy connection, creating one if the pool allows it"""
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                if self._idle:
+                    entry = self._idle.pop()
+                    break
+                if self._size < self.pool_size + self.max_overflow:
+                    self._size += 1
+                    entry = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolExhaustedError(
+                        f"{self.name} pool exhausted ({self._size} connections in use)"
+                    )
+                self._cond.wait(remaining)
+
+        if entry is None:
+            entry = self._connect()
+        else:
+            entry = self._validate(entry)
+
+        return PooledConnection(self, entry)
+
+    def release(self, entry):
+        """Take a connection back, discarding it if it is broken or surplus"""
+        try:
+            if self.reset:
+                self.reset(entry.raw)
+        except Exception as e:
+            logger.warning(f"Discarding {self.name} connection that failed reset: {e}")
+            self._discard(entry)
+            return
+
+        entry.last_used = time.monotonic()
+        with self._cond:
+            if len(self._idle) < self.pool_size:
+                self._idle.append(entry)
+                self._cond.notify()
+                return
+        self._discard(entry)
+
+    def dispose(self):
+        """Close every idle connection"""
+        with self._cond:
+            entries = list(self._idle)
+            self._idle.clear()
+        for entry in entries:
+            self._discard(entry)
+
+    def _connect(self):
+        """Open a new connection for a slot already counted in _size"""
+        try:
+            return _PoolEntry(self.factory())
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def _validate(self, entry):
+        """Recycle old connections and ping ones that sat idle too long"""
+        now = time.monotonic()
+        if self.recycle and now - entry.created_at > self.recycle:
+            self._close_raw(entry)
+            return self._connect()
+
+        if self.ping and now - entry.last_used > self.ping_interval:
+            try:
+                healthy = self.ping(entry.raw)
+            except Exception as e:
+                logger.warning(f"{self.name} connection health check failed: {e}")
+                healthy = False
+            if not healthy:
+                self._close_raw(entry)
+                return self._connect()
+
+        return entry
+
+    def _discard(self, entry):
+        """Close a connection and free its slot"""
+        self._close_raw(entry)
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def _close_raw(self, entry):
+        try:
+            entry.raw.close()
+        except Exception:
+            pass
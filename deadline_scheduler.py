@@ -0,0 +1,161 @@
+"""
+DragonRP Deadline Scheduler
+Fires attack and convoy arrivals at their exact time from an in-memory heap
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+
+def round_up_to_second(when):
+    """MySQL DATETIME drops fractions (rounding up), so never fire before the stored second"""
+    if when.microsecond:
+        return when.replace(microsecond=0) + timedelta(seconds=1)
+    return when
+
+
+class DeadlineScheduler:
+    """Min-heap of (deadline, kind, key) entries; sleeps until the earliest one is due
+
+    When a handler raises, the keys it was given are scheduled again after
+    retry_delay seconds, doubling per failed attempt up to max_retry_delay, so a
+    transient database error does not strand them until the next restart.
+    """
+
+    def __init__(self, clock=datetime.now, retry_delay=5, max_retry_delay=300):
+        self.clock = clock
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._attempts = {}  # (kind, key) -> failed firings in a row
+        self._heap = []
+        self._deadlines = {}  # (kind, key) -> current deadline; older heap entries are stale
+        self._handlers = {}
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._loop = None
+        self._wakeup = None
+        self._task = None
+
+    def register(self, kind, handler):
+        """Async handler(keys) called with every key of this kind that came due together"""
+        self._handlers[kind] = handler
+
+    def schedule(self, kind, key, when):
+        """Add or move a deadline; safe to call from executor threads"""
+        when = round_up_to_second(when)
+        with self._lock:
+            self._deadlines[(kind, key)] = when
+            heapq.heappush(self._heap, (when, next(self._sequence), kind, key))
+        self._notify()
+
+    def cancel(self, kind, key):
+        """Forget a deadline (its heap entry is skipped when it surfaces)"""
+        with self._lock:
+            self._deadlines.pop((kind, key), None)
+            self._attempts.pop((kind, key), None)
+
+    @property
+    def pending(self):
+        """Number of live deadlines"""
+        return len(self._deadlines)
+
+    def next_deadline(self):
+        """Earliest live deadline, or None when idle"""
+        with self._lock:
+            self._drop_stale()
+            return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now=None):
+        """{kind: [keys]} for every deadline at or before now"""
+        now = now or self.clock()
+        due = defaultdict(list)
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                when, _, kind, key = heapq.heappop(self._heap)
+                if self._deadlines.get((kind, key)) == when:
+                    del self._deadlines[(kind, key)]
+                    due[kind].append(key)
+            self._drop_stale()
+        return dict(due)
+
+    def _drop_stale(self):
+        while self._heap:
+            when, _, kind, key = self._heap[0]
+            if self._deadlines.get((kind, key)) == when:
+                return
+            heapq.heappop(self._heap)
+
+    def _notify(self):
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def start(self):
+        """Begin firing deadlines on the running event loop"""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = self._loop.create_task(self._run())
+        logger.info(f"Deadline scheduler started with {self.pending} pending deadlines")
+
+    async def stop(self):
+        """Stop the firing loop (pending deadlines stay in the heap)"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            # Clear before reading the heap so a schedule() racing with us is not lost
+            self._wakeup.clear()
+            deadline = self.next_deadline()
+            timeout = None if deadline is None else max(0.0, (deadline - self.clock()).total_seconds())
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+                continue  # schedule() changed the heap, recompute the earliest deadline
+            except asyncio.TimeoutError:
+                pass
+
+            await self.fire_due()
+
+    async def fire_due(self, now=None):
+        """Run the handlers for everything due now"""
+        for kind, keys in self.pop_due(now).items():
+            handler = self._handlers.get(kind)
+            if handler is None:
+                logger.warning(f"No handler registered for {len(keys)} due '{kind}' deadlines")
+                continue
+            try:
+                await handler(keys)
+            except Exception as e:
+                delay = self._retry(kind, keys)
+                logger.error(f"Error firing '{kind}' deadlines {keys}, retrying in {delay}s: {e}")
+            else:
+                with self._lock:
+                    for key in keys:
+                        self._attempts.pop((kind, key), None)
+
+    def _retry(self, kind, keys):
+        """Schedule failed keys again with exponential backoff; returns the longest delay used"""
+        now = self.clock()
+        longest = 0
+        for key in keys:
+            with self._lock:
+                if (kind, key) in self._deadlines:
+                    continue  # rescheduled while the handler ran
+                attempt = self._attempts.get((kind, key), 0)
+                self._attempts[(kind, key)] = attempt + 1
+            delay = min(self.retry_delay * 2 ** attempt, self.max_retry_delay)
+            longest = max(longest, delay)
+            self.schedule(kind, key, now + timedelta(seconds=delay))
+        return longest
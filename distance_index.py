@@ -0,0 +1,120 @@
+"""
+DragonRP Distance Index
+Precomputed country distance classes and weapon reach, built once from Config
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+NEIGHBOR = 0
+REGIONAL = 1
+INTERCONTINENTAL = 2
+
+DISTANCE_CLASSES = ('neighbor', 'regional', 'intercontinental')
+
+# (has_tanker, has_carrier) combinations
+MODIFIERS = ((False, False), (True, False), (False, True), (True, True))
+
+
+class DistanceIndex:
+    """Country-to-country distance matrix plus the weapon set reachable at each distance"""
+
+    def __init__(self, config):
+        self.config = config
+        combat = config.COMBAT_CONFIG
+
+        self.range_requirements = {
+            NEIGHBOR: 0,
+            REGIONAL: combat['regional_range_km'],
+            INTERCONTINENTAL: combat['intercontinental_range_km']
+        }
+        self.range_extended = frozenset(combat['range_extended_weapons'])
+
+        self.countries = list(config.COUNTRIES)
+        self._position = {code: i for i, code in enumerate(self.countries)}
+        self._regions = {}
+        for region, countries in config.COUNTRY_DISTANCE_CATEGORY.items():
+            for code in countries:
+                self._regions[code] = region
+
+        self.matrix = [
+            [self._classify(attacker, defender) for defender in self.countries]
+            for attacker in self.countries
+        ]
+
+        # weapon -> {modifiers: farthest distance class the weapon reaches}
+        self.max_reach = {
+            weapon_type: {mods: self._reach(weapon_type, spec, *mods) for mods in MODIFIERS}
+            for weapon_type, spec in config.WEAPONS.items()
+        }
+
+        # (distance class, modifiers) -> weapons able to attack at that distance
+        self.reachable = {
+            (distance, mods): frozenset(w for w, reach in self.max_reach.items() if reach[mods] >= distance)
+            for distance in (NEIGHBOR, REGIONAL, INTERCONTINENTAL)
+            for mods in MODIFIERS
+        }
+
+        # Nuclear submarines can attack any coastal country regardless of distance
+        self.coastal_weapons = frozenset(
+            w for w, spec in config.WEAPONS.items()
+            if w == 'nuclear_submarine' and spec.get('coastal_attack')
+        )
+        self.coastal_countries = frozenset(config.COASTAL_COUNTRIES)
+
+        logger.info(f"Distance index built: {len(self.countries)} countries, {len(self.max_reach)} weapons")
+
+    def _classify(self, country1, country2):
+        """Distance class between two countries, from the neighbor and region tables"""
+        if country2 in self.config.COUNTRY_NEIGHBORS.get(country1, []):
+            return NEIGHBOR
+        if self._regions.get(country1) == self._regions.get(country2):
+            return REGIONAL
+        return INTERCONTINENTAL
+
+    def _reach(self, weapon_type, spec, has_tanker, has_carrier):
+        """Farthest distance class a weapon covers with the given range extenders"""
+        weapon_range = spec.get('range', 0)
+        if weapon_type in self.range_extended:
+            if has_carrier:
+                weapon_range += self.config.COMBAT_CONFIG['carrier_range_bonus']
+            if has_tanker:
+                weapon_range += self.config.COMBAT_CONFIG['tanker_range_bonus']
+
+        if weapon_range >= self.range_requirements[INTERCONTINENTAL]:
+            return INTERCONTINENTAL
+        if weapon_range >= self.range_requirements[REGIONAL]:
+            return REGIONAL
+        return NEIGHBOR
+
+    def distance_class(self, country1, country2):
+        """Distance class (NEIGHBOR/REGIONAL/INTERCONTINENTAL) between two countries"""
+        i = self._position.get(country1)
+        j = self._position.get(country2)
+        if i is None or j is None:
+            return self._classify(country1, country2)
+        return self.matrix[i][j]
+
+    def distance_type(self, country1, country2):
+        """Distance class name as used in messages and COMBAT_TIMING keys"""
+        return DISTANCE_CLASSES[self.distance_class(country1, country2)]
+
+    def weapons_in_range(self, attacker_country, defender_country, has_tanker=False, has_carrier=False):
+        """Frozenset of every weapon type able to hit the defender"""
+        distance = self.distance_class(attacker_country, defender_country)
+        weapons = self.reachable[(distance, (bool(has_tanker), bool(has_carrier)))]
+        if self.coastal_weapons and defender_country in self.coastal_countries:
+            weapons = weapons | self.coastal_weapons
+        return weapons
+
+    def available_weapons(self, attacker_country, defender_country, player_weapons,
+                          has_tanker=False, has_carrier=False):
+        """Owned weapons able to hit the defender, in player_weapons order"""
+        in_range = self.weapons_in_range(attacker_country, defender_country, has_tanker, has_carrier)
+        return [w for w, count in player_weapons.items() if w in in_range and count > 0]
+
+    @staticmethod
+    def owned_weapons(player_weapons):
+        """Set of weapon types the player has at least one of"""
+        return {w for w, count in player_weapons.items() if w != 'user_id' and count and count > 0}
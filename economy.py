@@ -1,89 +1,124 @@
 import logging
+from datetime import datetime, timedelta
 from config import Config
+from database import as_datetime
+from income_rates import IncomeRates
 
 logger = logging.getLogger(__name__)
 
 class Economy:
+    # Mine output per cycle: building -> (resource, amount per mine)
+    MINE_PRODUCTION = {
+        'iron_mine': ('iron', 1000),
+        'copper_mine': ('copper', 800),
+        'oil_mine': ('oil', 600),
+        'gas_mine': ('gas', 700),
+        'aluminum_mine': ('aluminum', 500),
+        'gold_mine': ('gold', 200),
+        'uranium_mine': ('uranium', 18),
+        'lithium_mine': ('lithium', 300),
+        'coal_mine': ('coal', 1200),
+        'silver_mine': ('silver', 400),
+        'nitro_mine': ('nitro', 600),
+        'sulfur_mine': ('sulfur', 900),
+        'titanium_mine': ('titanium', 60)
+    }
+    POPULATION_PER_FARM = 10000     # Each farm adds 10,000 population
+    SOLDIERS_PER_BASE = 5000        # Each base produces 5000 soldiers per cycle
+    REFINERY_CAPACITY = 500         # Oil converted to fuel per refinery per cycle
+
     def __init__(self, database):
         self.db = database
+        self.cycle_length = timedelta(hours=Config.BOT_CONFIG['income_cycle_hours'])
+
+        # Per-cycle income of each player, adjusted by the database as buildings change
+        self.rates = IncomeRates(self.building_yields(), self.REFINERY_CAPACITY)
+        database.set_income_rates(self.rates)
+
+        # Income accrues per player and is settled whenever their state is read or changed
+        database.set_income_settler(self.settle_players)
+
+    @classmethod
+    def building_yields(cls):
+        """Money, population, soldiers and resources one building adds per cycle"""
+        yields = {}
+        for building_type, building_config in Config.BUILDINGS.items():
+            yields[building_type] = {
+                'money': building_config.get('income', 0),
+                'population': cls.POPULATION_PER_FARM if building_type == 'wheat_farm' else 0,
+                'soldiers': cls.SOLDIERS_PER_BASE if building_type == 'military_base' else 0,
+                'resources': {}
+            }
+        for building_type, (resource_type, production_amount) in cls.MINE_PRODUCTION.items():
+            building_yield = yields.setdefault(building_type, {'money': 0, 'population': 0, 'soldiers': 0, 'resources': {}})
+            building_yield['resources'][resource_type] = production_amount
+        return yields
+
+    def get_income_rate(self, user_id):
+        """Cached per-cycle income of a player"""
+        return self.rates.get(user_id, self.db.get_player_buildings)
 
     def calculate_income(self, user_id):
         """Calculate 6-hour income from buildings"""
-        buildings = self.db.get_player_buildings(user_id)
-        total_income = 0
-
-        for building_type, count in buildings.items():
-            if building_type in Config.BUILDINGS and count > 0:
-                building_config = Config.BUILDINGS[building_type]
-                building_income = building_config.get('income', 0)
-                total_income += building_income * count
-
-        return total_income
+        return self.get_income_rate(user_id)['money']
 
     def calculate_population_increase(self, user_id):
         """Calculate population increase from farms"""
-        buildings = self.db.get_player_buildings(user_id)
-        wheat_farms = buildings.get('wheat_farm', 0)
-
-        return wheat_farms * 10000  # Each farm adds 10,000 population
+        return self.get_income_rate(user_id)['population']
 
     def calculate_soldier_increase(self, user_id):
         """Calculate soldier increase from military bases"""
-        buildings = self.db.get_player_buildings(user_id)
-        military_bases = buildings.get('military_base', 0)
-        return military_bases * 5000  # Each base produces 5000 soldiers per cycle
-
-    def update_player_income(self, user_id, new_money, new_population, new_soldiers):
-        """Update player income data"""
-        with self.db.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                UPDATE players 
-                SET money = ?, population = ?, soldiers = ?
-                WHERE user_id = ?
-            ''', (new_money, new_population, new_soldiers, user_id))
-            conn.commit()
-
-    def distribute_mine_resources(self, user_id):
-        """Distribute resources from mines"""
-        buildings = self.db.get_player_buildings(user_id)
-
-        resource_production = {
-            'iron_mine': ('iron', 1000),
-            'copper_mine': ('copper', 800),
-            'oil_mine': ('oil', 600),
-            'gas_mine': ('gas', 700),
-            'aluminum_mine': ('aluminum', 500),
-            'gold_mine': ('gold', 200),
-            'uranium_mine': ('uranium', 18),
-            'lithium_mine': ('lithium', 300),
-            'coal_mine': ('coal', 1200),
-            'silver_mine': ('silver', 400),
-            'nitro_mine': ('nitro', 600),
-            'sulfur_mine': ('sulfur', 900),
-            'titanium_mine': ('titanium', 60)
-        }
-
-        for building_type, (resource_type, production_amount) in resource_production.items():
-            mine_count = buildings.get(building_type, 0)
-            if mine_count > 0:
-                total_production = production_amount * mine_count
-                self.db.add_resources(user_id, resource_type, total_production)
-
-        # Convert oil to fuel in refineries
-        refineries = buildings.get('refinery', 0)
-        if refineries > 0:
-            player_resources = self.db.get_player_resources(user_id)
-            oil_available = player_resources.get('oil', 0)
-
-            # Each refinery can process 500 oil to fuel per cycle
-            max_processing = refineries * 500
-            oil_to_process = min(oil_available, max_processing)
-
-            if oil_to_process > 0:
-                # Convert oil to fuel (1:1 ratio)
-                self.db.consume_resources(user_id, {'oil': oil_to_process})
-                self.db.add_resources(user_id, 'fuel', oil_to_process)
+        return self.get_income_rate(user_id)['soldiers']
+
+    def settle_players(self, user_ids=None, now=None):
+        """Credit every whole income cycle since each player's last settlement
+
+        user_ids=None is the sweep: only players with at least one due cycle are read.
+        Returns the number of players credited.
+        """
+        now = (now or datetime.now()).replace(microsecond=0)
+        due_before = now - self.cycle_length if user_ids is None else None
+
+        settlements = []
+        seen = set()
+        for snapshot in self.db.get_income_snapshot(user_ids, due_before):
+            user_id = snapshot['user_id']
+            seen.add(user_id)
+            settled_at = as_datetime(snapshot['last_settled_at'])
+            if settled_at is None:
+                settlements.append((user_id, None, now, 0, 0, 0, {}))
+                continue
+
+            cycles = int((now - settled_at) / self.cycle_length)
+            if cycles <= 0:
+                self.db.note_next_settlement(user_id, settled_at + self.cycle_length)
+                continue
+
+            # The anchor moves by whole cycles so the partial cycle keeps accruing
+            new_settled_at = settled_at + cycles * self.cycle_length
+            # Buildings are only read for players whose rate changed since it was cached
+            deltas = self.rates.accrue(self.get_income_rate(user_id), snapshot['current_oil'], cycles)
+            settlements.append((user_id, settled_at, new_settled_at, deltas['money'],
+                                deltas['population'], deltas['soldiers'], deltas['resources']))
+
+        # Ids without a player are not looked up again this cycle (create_player resets them)
+        for user_id in set(user_ids or ()) - seen:
+            self.db.note_next_settlement(user_id, now + self.cycle_length)
+
+        if not settlements:
+            return 0
+
+        credited = self.db.apply_income_settlements(settlements)
+        for user_id, _, new_settled_at, *_ in settlements:
+            self.db.note_next_settlement(user_id, new_settled_at + self.cycle_length)
+
+        if credited:
+            logger.info(f"Settled income for {len(credited)} players")
+        return len(credited)
+
+    def run_income_cycle(self):
+        """Sweep: settle players whose income has not been touched by a read or write"""
+        return {'players': self.settle_players()}
 
     def get_income_report(self, user_id):
         """Get detailed income report"""
@@ -1,5 +1,6 @@
 import logging
 from config import Config
+from power_model import PowerModel
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
@@ -7,16 +8,18 @@ logger = logging.getLogger(__name__)
 class GameLogic:
     def __init__(self, database):
         self.db = database
+        self.power = PowerModel(database.WEAPON_COLUMNS, Config)
 
     def get_player_stats(self, user_id):
         """Get comprehensive player statistics"""
-        player = self.db.get_player(user_id)
-        if not player:
+        state = self.db.get_player_state(user_id)
+        if not state:
             return None
 
-        resources = self.db.get_player_resources(user_id)
-        buildings = self.db.get_player_buildings(user_id)
-        weapons = self.db.get_player_weapons(user_id)
+        player = state['player']
+        resources = state['resources']
+        buildings = state['buildings']
+        weapons = state['weapons']
 
         return {
             'user_id': user_id,
@@ -48,16 +51,10 @@ class GameLogic:
                 'message': f"پول کافی ندارید! نیاز: ${total_cost:,}, موجودی: ${player['money']:,}"
             }
 
-        # Deduct money and add building
+        # Deduct money and add building in one transaction
+        if not self.db.apply_delta(user_id, money=-total_cost, buildings={building_type: quantity}):
+            return {'success': False, 'message': 'پول کافی ندارید! موجودی شما تغییر کرده است، دوباره تلاش کنید.'}
         new_money = player['money'] - total_cost
-        self.db.update_player_money(user_id, new_money)
-
-        # Add building to database
-        buildings = self.db.get_player_buildings(user_id)
-        if buildings is None:
-            buildings = {}
-        current_count = buildings.get(building_type, 0)
-        self.db.set_player_building(user_id, building_type, current_count + quantity)
 
         # Check if first build for news
         is_first_build = self.db.check_first_build(user_id, building_type)
@@ -79,9 +76,11 @@ class GameLogic:
             available_weapons = list(Config.WEAPONS.keys())[:10]  # Show first 10 weapons for debugging
             return {'success': False, 'message': f'نوع سلاح نامعتبر: {weapon_type}\nسلاح‌های موجود: {", ".join(available_weapons)}'}
 
-        player = self.db.get_player(user_id)
-        if not player:
+        # One state load serves every check below
+        state = self.db.get_player_state(user_id)
+        if not state:
             return {'success': False, 'message': 'بازیکن یافت نشد!'}
+        player = state['player']
 
         weapon_config = Config.WEAPONS[weapon_type]
 
@@ -95,7 +94,7 @@ class GameLogic:
         # Check building requirements
         building_requirements = weapon_config.get('requirements', [])
         if building_requirements:
-            buildings = self.db.get_player_buildings(user_id)
+            buildings = state['buildings']
             for requirement in building_requirements:
                 if buildings.get(requirement, 0) == 0:
                     req_name = Config.BUILDINGS.get(requirement, {}).get('name', requirement)
@@ -120,7 +119,7 @@ class GameLogic:
 
         # Check weapon requirements
         if weapon_requirements:
-            current_weapons = self.db.get_player_weapons(user_id)
+            current_weapons = state['weapons']
             for req_weapon, req_amount in weapon_requirements.items():
                 current_amount = current_weapons.get(req_weapon, 0)
                 if current_amount < req_amount:
@@ -132,7 +131,7 @@ class GameLogic:
 
         # Check resource requirements
         if resource_requirements:
-            current_resources = self.db.get_player_resources(user_id)
+            current_resources = state['resources']
             for resource, req_amount in resource_requirements.items():
                 current_amount = current_resources.get(resource, 0)
                 if current_amount < req_amount:
@@ -142,31 +141,21 @@ class GameLogic:
                         'message': f'منبع کافی نیست! نیاز: {req_amount} {resource_name}, موجود: {current_amount}'
                     }
 
-        # Consume required resources
-        if resource_requirements:
-            for resource, amount in resource_requirements.items():
-                self.db.consume_resources(user_id, {resource: amount})
+        # Consume money, resources and required weapons and add the product in one transaction
+        weapon_deltas = {req_weapon: -amount for req_weapon, amount in weapon_requirements.items()}
+        weapon_deltas[weapon_type] = weapon_deltas.get(weapon_type, 0) + quantity
 
-        # Consume required weapons
-        if weapon_requirements:
-            for req_weapon, amount in weapon_requirements.items():
-                current_count = self.db.get_weapon_count(user_id, req_weapon)
-                new_count = current_count - amount
-                self.db.update_weapon_count(user_id, req_weapon, new_count)
+        applied = self.db.apply_delta(
+            user_id,
+            money=-total_cost,
+            resources={resource: -amount for resource, amount in resource_requirements.items()},
+            weapons=weapon_deltas
+        )
+        if not applied:
+            return {'success': False, 'message': 'موجودی شما در همین لحظه تغییر کرد! دوباره تلاش کنید.'}
 
-        # Deduct money
         new_money = player['money'] - total_cost
-        self.db.update_player_money(user_id, new_money)
-
-        # Add produced weapons
-        logger.info(f"Adding {quantity} {weapon_type} to user {user_id}")
-        weapons_before = self.db.get_player_weapons(user_id)
-        logger.info(f"Weapons before: {weapon_type}={weapons_before.get(weapon_type, 0)}")
-        
-        self.db.add_weapon(user_id, weapon_type, quantity)
-        
-        weapons_after = self.db.get_player_weapons(user_id)
-        logger.info(f"Weapons after: {weapon_type}={weapons_after.get(weapon_type, 0)}")
+        logger.info(f"Produced {quantity} {weapon_type} for user {user_id}")
 
         return {
             'success': True,
@@ -178,15 +167,7 @@ class GameLogic:
 
     def calculate_military_power(self, user_id):
         """Calculate total military power"""
-        weapons = self.db.get_player_weapons(user_id)
-        total_power = 0
-
-        for weapon_type, count in weapons.items():
-            if weapon_type in Config.WEAPONS:
-                weapon_power = Config.WEAPONS[weapon_type]['power']
-                total_power += weapon_power * count
-
-        return total_power
+        return self.power.military_power(self.db.get_player_weapons(user_id))
 
     def calculate_defense_power(self, user_id):
         """Calculate total defense power"""
@@ -348,14 +329,15 @@ class GameLogic:
 
     def get_country_ranking(self):
         """Get ranking of all countries by power"""
-        players = self.db.get_all_players()
+        state = self.db.load_player_state()
+        powers = self.power.powers({uid: s['weapons'] for uid, s in state.items()})
         rankings = []
 
-        for player in players:
-            military_power = self.calculate_military_power(player['user_id'])
+        for uid, player_state in state.items():
+            player = player_state['player']
             rankings.append({
                 'country_name': player['country_name'],
-                'military_power': military_power,
+                'military_power': powers[uid]['military'],
                 'population': player['population'],
                 'money': player['money']
             })
@@ -0,0 +1,181 @@
+"""
+DragonRP Income Rates
+Per-player income per cycle, kept up to date incrementally as buildings change
+"""
+
+import itertools
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class IncomeRates:
+    """Cached {'money', 'population', 'soldiers', 'resources', 'refineries'} per player
+
+    Buildings changes either adjust a cached rate by the yield of the added or
+    removed buildings, or mark it dirty so the next read recomputes it from the
+    buildings row. A rate read from a row that may already include an in-flight
+    change is never adjusted, only recomputed. Changes are remembered only while a
+    read that started before them may still be in flight: once more than
+    max_changes are held, older ones are forgotten.
+    """
+
+    def __init__(self, building_yields, refinery_capacity, max_changes=10000):
+        # building -> {'money': .., 'population': .., 'soldiers': .., 'resources': {resource: amount}}
+        self.building_yields = building_yields
+        self.refinery_capacity = refinery_capacity
+        self._rates = {}         # user_id -> (rate, sequence when its buildings read finished)
+        self._last_change = {}   # user_id -> sequence when its latest buildings change began
+        self._reading = set()    # sequences at which the buildings reads in flight started
+        self.max_changes = max_changes
+        self._sequence = itertools.count(1)
+        self._cleared = 0
+        self._lock = threading.Lock()
+        self.recomputed = 0
+
+    @staticmethod
+    def empty():
+        return {'money': 0, 'population': 0, 'soldiers': 0, 'resources': {}, 'refineries': 0}
+
+    def compute(self, buildings):
+        """Rate from a full buildings row"""
+        rate = self.empty()
+        for building_type, count in buildings.items():
+            if self._yields(building_type) and count and count > 0:
+                self._add_yield(rate, building_type, count)
+        return rate
+
+    def _yields(self, building_type):
+        return building_type in self.building_yields or building_type == 'refinery'
+
+    def _add_yield(self, rate, building_type, count):
+        if building_type == 'refinery':
+            rate['refineries'] += count
+        building_yield = self.building_yields.get(building_type)
+        if not building_yield:
+            return
+        rate['money'] += building_yield['money'] * count
+        rate['population'] += building_yield['population'] * count
+        rate['soldiers'] += building_yield['soldiers'] * count
+        for resource, amount in building_yield['resources'].items():
+            rate['resources'][resource] = rate['resources'].get(resource, 0) + amount * count
+
+    @staticmethod
+    def _copy(rate):
+        return dict(rate, resources=dict(rate['resources']))
+
+    def get(self, user_id, load_buildings):
+        """Copy of the cached rate, recomputed from load_buildings(user_id) when missing or dirty"""
+        with self._lock:
+            cached = self._rates.get(user_id)
+            if cached is not None:
+                return self._copy(cached[0])
+            read_started = next(self._sequence)
+            self._reading.add(read_started)
+
+        rate = None
+        try:
+            rate = self.compute(load_buildings(user_id) or {})
+            self.recomputed += 1
+        finally:
+            with self._lock:
+                self._reading.discard(read_started)
+                # A change that began during the read may or may not be in the row
+                if rate is not None and max(self._last_change.get(user_id, 0), self._cleared) < read_started:
+                    self._rates[user_id] = (rate, next(self._sequence))
+        return self._copy(rate)
+
+    def begin_change(self, user_id):
+        """Call before writing buildings; returns the token for adjust()"""
+        with self._lock:
+            token = next(self._sequence)
+            self._last_change[user_id] = token
+            self._prune()
+            return token
+
+    def adjust(self, user_id, changes, token):
+        """Apply {building: count delta} to a rate that was read before the change began"""
+        with self._lock:
+            cached = self._rates.get(user_id)
+            if cached is None:
+                return
+            rate, read_finished = cached
+            if read_finished > token or self._last_change.get(user_id) != token:
+                # The cached rate may already include this change
+                del self._rates[user_id]
+                return
+            for building_type, delta in changes.items():
+                if self._yields(building_type):
+                    self._add_yield(rate, building_type, delta)
+            # Resource keys that dropped to zero are removed so the rate matches compute()
+            rate['resources'] = {resource: amount for resource, amount in rate['resources'].items() if amount}
+
+    def mark_dirty(self, user_id):
+        """Recompute this player's rate on next use (reads already in flight are not cached)"""
+        with self._lock:
+            self._rates.pop(user_id, None)
+            self._last_change[user_id] = next(self._sequence)
+            self._prune()
+
+    def clear(self):
+        """Recompute every rate on next use (bulk building writes, resets)"""
+        with self._lock:
+            self._rates.clear()
+            self._last_change.clear()
+            self._cleared = next(self._sequence)
+
+    def _prune(self):
+        """Forget changes older than every read in flight once more than max_changes are held
+
+        Such a change cannot race any read. adjust() for a forgotten change drops
+        the cached rate instead of adjusting it.
+        """
+        if len(self._last_change) <= self.max_changes:
+            return
+        oldest_read = min(self._reading, default=None)
+        if oldest_read is None:
+            self._last_change.clear()
+        else:
+            self._last_change = {user_id: sequence for user_id, sequence in self._last_change.items()
+                                 if sequence > oldest_read}
+
+    def cycle(self, rate, current_oil=0):
+        """One cycle of deltas; refineries convert stored and freshly mined oil to fuel (1:1)"""
+        resources = dict(rate['resources'])
+        if rate['refineries'] > 0:
+            oil_available = current_oil + resources.get('oil', 0)
+            oil_to_process = min(oil_available, rate['refineries'] * self.refinery_capacity)
+            if oil_to_process > 0:
+                resources['oil'] = resources.get('oil', 0) - oil_to_process
+                resources['fuel'] = resources.get('fuel', 0) + oil_to_process
+
+        return {
+            'money': rate['money'],
+            'population': rate['population'],
+            'soldiers': rate['soldiers'],
+            'resources': resources
+        }
+
+    def accrue(self, rate, current_oil, cycles):
+        """Deltas for several whole cycles"""
+        if not rate['refineries']:
+            # Without refineries every cycle is identical
+            return {
+                'money': rate['money'] * cycles,
+                'population': rate['population'] * cycles,
+                'soldiers': rate['soldiers'] * cycles,
+                'resources': {resource: amount * cycles for resource, amount in rate['resources'].items()}
+            }
+
+        # Refinery output depends on the oil left over from the previous cycle
+        total = {'money': 0, 'population': 0, 'soldiers': 0, 'resources': {}}
+        oil = current_oil
+        for _ in range(cycles):
+            deltas = self.cycle(rate, oil)
+            for key in ('money', 'population', 'soldiers'):
+                total[key] += deltas[key]
+            for resource, amount in deltas['resources'].items():
+                total['resources'][resource] = total['resources'].get(resource, 0) + amount
+            oil += deltas['resources'].get('oil', 0)
+        return total
@@ -1,10 +1,95 @@
+from collections import OrderedDict
+from functools import wraps
+
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from config import Config
 
+
+def static_keyboard(method):
+    """Build a keyboard that only depends on Config once and reuse it"""
+    name = method.__name__
+
+    @wraps(method)
+    def wrapper(self):
+        markup = self._static.get(name)
+        if markup is None:
+            markup = self._static[name] = method(self)
+        return markup
+    wrapper.is_static = True
+    return wrapper
+
+
+def memoized_keyboard(key):
+    """Keep keyboards in the LRU under key(*args), which must cover everything the markup shows"""
+    def decorator(method):
+        name = method.__name__
+
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            cache_key = (name, key(*args, **kwargs))
+            markup = self._memo.get(cache_key)
+            if markup is not None:
+                self._memo.move_to_end(cache_key)
+                self.hits += 1
+                return markup
+
+            self.misses += 1
+            markup = self._memo[cache_key] = method(self, *args, **kwargs)
+            while len(self._memo) > self.cache_size:
+                self._memo.popitem(last=False)
+            return markup
+        return wrapper
+    return decorator
+
+
+def _weapon_selection_key(target_id, attack_type, available_weapons, selected_weapons=None):
+    # In dict order: the keyboard lists the first eight weapons
+    return target_id, attack_type, tuple(available_weapons.items())
+
+
+def _players_key(players):
+    return tuple((player['user_id'], player.get('country_code'), player['country_name']) for player in players)
+
+
 class Keyboards:
-    def __init__(self):
-        pass
+    """Inline keyboards; markups are immutable, so built ones are shared between requests
+
+    Keyboards that only depend on Config are built once at startup. Parameterized
+    and per-player keyboards live in an LRU keyed on what they render (the target
+    list, the weapon counts), so a change in a player's state is simply a new key.
+    """
+
+    def __init__(self, cache_size=512):
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._static = {}
+        self._memo = OrderedDict()
+        self.warm()
+
+    def warm(self):
+        """Build the static menus and the weapon category pages"""
+        for name, attribute in vars(type(self)).items():
+            if getattr(attribute, 'is_static', False):
+                getattr(self, name)()
+        for category in {weapon.get('category') for weapon in Config.WEAPONS.values()}:
+            if category:
+                self.weapon_category_keyboard(category)
+        self.main_menu_keyboard(False)
+        self.main_menu_keyboard(True)
+
+    def cache_stats(self):
+        """Hit/miss counters for the parameterized keyboards"""
+        total = self.hits + self.misses
+        return {
+            'static': len(self._static),
+            'memoized': len(self._memo),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits / total) if total else 0.0
+        }
 
+    @static_keyboard
     def country_selection_keyboard(self):
         """Create country selection keyboard"""
         keyboard = []
@@ -24,6 +109,7 @@ class Keyboards:
 
         return InlineKeyboardMarkup(keyboard)
 
+    @memoized_keyboard(lambda is_admin=False: bool(is_admin))
     def main_menu_keyboard(self, is_admin=False):
         """Create main menu keyboard"""
         keyboard = [
@@ -47,6 +133,7 @@ class Keyboards:
 
         return InlineKeyboardMarkup(keyboard)
 
+    @static_keyboard
     def economy_menu_keyboard(self):
         """Create economy menu keyboard"""
         keyboard = [
@@ -60,6 +147,7 @@ class Keyboards:
         ]
         return InlineKeyboardMarkup(keyboard)
 
+    @static_keyboard
     def buildings_menu_keyboard(self):
         """Create buildings menu keyboard"""
         keyboard = [
@@ -104,6 +192,7 @@ class Keyboards:
         ]
         return InlineKeyboardMarkup(keyboard)
 
+    @static_keyboard
     def military_menu_keyboard(self):
         """Create military menu keyboard"""
         keyboard = [
@@ -121,6 +210,7 @@ class Keyboards:
         ]
         return InlineKeyboardMarkup(keyboard)
 
+    @static_keyboard
     def weapons_menu_keyboard(self):
         """Create weapons production menu keyboard"""
         keyboard = [
@@ -146,6 +236,7 @@ class Keyboards:
         ]
         return InlineKeyboardMarkup(keyboard)
 
+    @memoized_keyboard(lambda category: category)
     def weapon_category_keyboard(self, category):
         """Create keyboard for specific weapon category"""
         keyboard = []
@@ -175,6 +266,7 @@ class Keyboards:
 
         return InlineKeyboardMarkup(keyboard)
 
+    @memoized_keyboard(lambda user_id: None)
     def diplomacy_menu_keyboard(self, user_id):
         """Create diplomacy menu keyboard"""
         keyboard = [
@@ -199,6 +291,7 @@ class Keyboards:
         ]
         return InlineKeyboardMarkup(keyboard)
 
+    @memoized_keyboard(lambda has_alliance=False: bool(has_alliance))
     def alliance_menu_keyboard(self, has_alliance=False):
         """Create alliance menu keyboard"""
         if has_alliance:
@@ -228,6 +321,7 @@ class Keyboards:
 
         return InlineKeyboardMarkup(keyboard)
 
+    @static_keyboard
     def marketplace_menu_keyboard(self):
         """Create marketplace menu keyboard"""
         keyboard = [
@@ -245,6 +339,7 @@ class Keyboards:
         ]
         return InlineKeyboardMarkup(keyboard)
 
+    @static_keyboard
     def market_categories_keyboard(self):
         """Create market categories keyboard"""
         keyboard = [
@@ -258,6 +353,7 @@ class Keyboards:
         ]
         return InlineKeyboardMarkup(keyboard)
 
+    @memoized_keyboard(_players_key)
     def attack_targets_keyboard(self, available_targets):
         """Create attack targets keyboard"""
         keyboard = []
@@ -273,6 +369,7 @@ class Keyboards:
         keyboard.append([InlineKeyboardButton("🔙 بازگشت", callback_data="diplomacy")])
         return InlineKeyboardMarkup(keyboard)
 
+    @memoized_keyboard(lambda target_id: target_id)
     def attack_type_selection_keyboard(self, target_id):
         """Create attack type selection keyboard"""
         keyboard = [
@@ -295,6 +392,7 @@ class Keyboards:
         ]
         return InlineKeyboardMarkup(keyboard)
 
+    @memoized_keyboard(_weapon_selection_key)
     def weapon_selection_keyboard(self, target_id, attack_type, available_weapons, selected_weapons=None):
         """Create keyboard for weapon selection in attack"""
         if selected_weapons is None:
@@ -393,6 +491,7 @@ class Keyboards:
         keyboard.append([InlineKeyboardButton("🔙 بازگشت", callback_data="send_resources")])
         return InlineKeyboardMarkup(keyboard)
 
+    @static_keyboard
     def back_to_main_keyboard(self):
         """Back to main menu keyboard"""
         keyboard = [
@@ -400,6 +499,7 @@ class Keyboards:
         ]
         return InlineKeyboardMarkup(keyboard)
 
+    @static_keyboard
     def back_to_military_keyboard(self):
         """Back to military menu keyboard"""
         keyboard = [
@@ -407,6 +507,7 @@ class Keyboards:
         ]
         return InlineKeyboardMarkup(keyboard)
 
+    @static_keyboard
     def back_to_diplomacy_keyboard(self):
         """Back to diplomacy keyboard"""
         keyboard = [[InlineKeyboardButton("🔙 بازگشت", callback_data="diplomacy")]]
@@ -427,6 +528,7 @@ class Keyboards:
         keyboard.append([InlineKeyboardButton("🔙 انصراف", callback_data="intercept_convoys")])
         return InlineKeyboardMarkup(keyboard)
 
+    @static_keyboard
     def admin_panel_keyboard(self):
         """Create admin panel keyboard"""
         keyboard = [
@@ -446,6 +548,9 @@ class Keyboards:
                 InlineKeyboardButton("🎁 هدیه به کشورها", callback_data="admin_give_items"),
                 InlineKeyboardButton("⚖️ جریمه بازیکنان", callback_data="admin_penalties")
             ],
+            [
+                InlineKeyboardButton("🐢 آمار کوئری‌ها", callback_data="admin_query_stats")
+            ],
             [
                 InlineKeyboardButton("🔙 منوی اصلی", callback_data="main_menu")
             ]
@@ -484,6 +589,7 @@ class Keyboards:
         ]
         return InlineKeyboardMarkup(keyboard)
 
+    @static_keyboard
     def admin_give_items_keyboard(self):
         """Create admin give items keyboard"""
         keyboard = [
@@ -529,6 +635,7 @@ class Keyboards:
         ]
         return InlineKeyboardMarkup(keyboard)
 
+    @static_keyboard
     def admin_give_resources_keyboard(self):
         """Create keyboard for giving resources"""
         keyboard = [
@@ -561,6 +668,7 @@ class Keyboards:
         ]
         return InlineKeyboardMarkup(keyboard)
 
+    @static_keyboard
     def admin_give_weapons_keyboard(self):
         """Create keyboard for admin weapon gifting"""
         keyboard = []
@@ -598,6 +706,7 @@ class Keyboards:
 
         return InlineKeyboardMarkup(keyboard)
 
+    @static_keyboard
     def admin_give_money_keyboard(self):
         """Create keyboard for admin money gifting"""
         keyboard = []
@@ -650,6 +759,7 @@ class Keyboards:
         ]
         return InlineKeyboardMarkup(keyboard)
 
+    @memoized_keyboard(lambda item_type, item_name: (item_type, item_name))
     def quantity_selection_keyboard(self, item_type, item_name):
         """کیبورد انتخاب تعداد برای ساخت سلاح یا ساختمان"""
         keyboard = [
@@ -724,6 +834,7 @@ class Keyboards:
         keyboard.append([InlineKeyboardButton("🔙 بازگشت", callback_data="alliance_menu")])
         return InlineKeyboardMarkup(keyboard)
 
+    @static_keyboard
     def admin_penalties_keyboard(self):
         """Create admin penalties keyboard"""
         keyboard = [
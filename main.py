@@ -1,25 +1,33 @@
 import logging
 import asyncio
+import functools
 import os
+from concurrent.futures import ThreadPoolExecutor
 from telegram import Update, Bot, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
+from deadline_scheduler import DeadlineScheduler
+from callback_router import CallbackRouter, ACTION, ADMIN
 import datetime
 
 # Updated database imports
 from database import Database
+from async_database import AsyncDatabase
 from game_logic import GameLogic
 from keyboards import Keyboards
 from admin import AdminPanel
 from economy import Economy
 from news import NewsChannel
+from news_outbox import NewsOutbox
 from combat import CombatSystem
 from countries import CountryManager
 from config import Config
 from convoy import ConvoySystem
 from alliance import AllianceSystem
 from marketplace import Marketplace
+from view_cache import ViewCache
 
 # Configure logging
 logging.basicConfig(
@@ -37,7 +45,7 @@ class DragonRPBot:
         
         self.game_logic = GameLogic(self.db)
         self.keyboards = Keyboards()
-        self.admin = AdminPanel(self.db)
+        self.admin = AdminPanel(self.db, self.keyboards)
         self.economy = Economy(self.db)
         self.combat = CombatSystem(self.db)
         self.countries = CountryManager(self.db)
@@ -47,6 +55,57 @@ class DragonRPBot:
         self.marketplace = Marketplace(self.db)
         self.scheduler = AsyncIOScheduler()
 
+        # Rendered screens reused until the player's state changes; unchanged edits are skipped
+        self.views = ViewCache(**Config.VIEW_CACHE_CONFIG)
+
+        # News written with game changes is posted from the outbox table, surviving restarts
+        self.outbox = NewsOutbox(self.db, self.news, run_blocking=self.run_blocking, **Config.NEWS_OUTBOX_CONFIG)
+
+        # Attack and convoy arrivals fire from a deadline heap instead of per-minute polling
+        self.deadlines = DeadlineScheduler()
+        self.combat.set_deadline_scheduler(self.deadlines)
+        self.convoy.set_deadline_scheduler(self.deadlines)
+
+        # callback_data -> handler table (exact keys and longest prefix)
+        self.router = self.build_callback_router()
+
+        # Build the distance/range tables up front instead of on the first attack menu
+        Config.distance_index()
+
+        # Blocking database work runs here so the polling loop stays responsive
+        self.db_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('DB_EXECUTOR_WORKERS', Config.DATABASE_CONFIG['executor_workers'])),
+            thread_name_prefix='dragonrp-db'
+        )
+        # Async handlers await queries on this instead (executor fallback without aiomysql/aiosqlite)
+        self.adb = AsyncDatabase(
+            self.db,
+            run_blocking=self.run_blocking,
+            pool_size=int(os.getenv('DB_ASYNC_POOL_SIZE', Config.DATABASE_CONFIG['async_pool_size']))
+        )
+
+    async def run_blocking(self, func, *args, **kwargs):
+        """Run a blocking database/game call on the executor and await its result"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.db_executor, functools.partial(func, *args, **kwargs))
+
+    async def show_view(self, query, view, renderer):
+        """Edit the message to the player's cached render of view (renderer(user_id) -> (text, markup))"""
+        user_id = query.from_user.id
+        # Both settle due income and read the database, so they run off the event loop
+        version = await self.run_blocking(self.db.state_version, user_id)
+        rendered = self.views.get(user_id, view, version)
+        if rendered is None:
+            rendered = await self.run_blocking(renderer, user_id)
+            self.views.put(user_id, view, version, rendered)
+        text, keyboard = rendered
+        await self.views.edit(query, text, keyboard)
+
+    async def queue_news(self, event, payload, dedup_key):
+        """Write a news event to the outbox and wake the flusher"""
+        await self.run_blocking(self.db.queue_news, event, payload, dedup_key)
+        self.outbox.notify()
+
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /start command"""
         user_id = update.effective_user.id
@@ -84,6 +143,108 @@ class DragonRPBot:
         keyboard = self.keyboards.country_selection_keyboard()
         await update.message.reply_text(welcome_text, reply_markup=keyboard)
 
+    def build_callback_router(self):
+        """Register every callback_data key and prefix the keyboards produce"""
+        router = CallbackRouter(is_admin=self.admin.is_admin)
+        menus = {
+            "main_menu": self.show_main_menu_callback,
+            "economy": self.show_economy_menu,
+            "military": self.show_military_menu,
+            "diplomacy": self.show_diplomacy_menu,
+            "resources": self.show_resources_menu,
+            "buildings": self.show_buildings_menu,
+            "weapons": self.show_weapons_menu,
+            "weapon_production": self.show_weapons_menu,
+            "select_attack_target": self.show_attack_targets,
+            "attack_menu": self.show_attack_targets,
+            "send_resources": self.show_send_resources_menu,
+            "official_statement": self.handle_official_statement,
+            "income_report": self.show_income_report,
+            "defense_status": self.show_defense_status,
+            "military_power": self.show_military_power,
+            "intercept_convoys": self.show_convoy_interception_menu,
+            "alliances": self.show_alliance_menu,
+            "alliance_create": self.handle_alliance_action,
+            "alliance_invite": self.handle_alliance_invite,
+            "alliance_members": self.handle_alliance_action,
+            "alliance_invitations": self.handle_alliance_action,
+            "marketplace": self.show_marketplace_menu
+        }
+        for key, handler in menus.items():
+            router.exact(key, handler)
+        # propose_peace has no handler yet and falls through to the unhandled-callback reply
+        router.exact("alliance_leave", self.handle_alliance_leave, rate_class=ACTION, read_only=False)
+
+        view_prefixes = {
+            "weapon_cat_": self.show_weapon_category,
+            "select_building_": self.show_building_quantity_selection,
+            "select_target_": self.show_attack_type_selection,
+            "attack_type_": self.show_weapon_selection_for_attack,
+            "send_to_": self.handle_resource_transfer_transport_select,
+            "transfer_": self.handle_transport_selection,
+            "use_transport_": self.handle_transport_selection,
+            "convoy_escort_": self.handle_convoy_escort,
+            "sell_cat_": self.handle_sell_category,
+            "manual_transfer_": self.handle_manual_transfer,
+            "manual_sell_": self.handle_manual_sell,
+            "invite_": self.handle_alliance_invite
+        }
+        for prefix, handler in view_prefixes.items():
+            router.prefix(prefix, handler)
+
+        action_prefixes = {
+            "select_country_": self.handle_country_selection,
+            "build_": self.handle_building_construction,
+            "quantity_": self.handle_quantity_selection,
+            "execute_attack_": self.handle_attack_execution,
+            "convoy_": self.handle_convoy_action,
+            "confirm_convoy_": self.handle_convoy_confirmation,
+            "market_": self.handle_marketplace_action,
+            "buy_": self.handle_marketplace_purchase,
+            "remove_": self.handle_remove_listing,
+            "confirm_sell_": self.handle_confirm_sell
+        }
+        for prefix, handler in action_prefixes.items():
+            router.prefix(prefix, handler, rate_class=ACTION, read_only=False)
+
+        # select_weapon_<weapon> opens the quantity picker; produce_<weapon> builds one
+        # unless the weapon key itself contains "_" (then it also opens the picker)
+        router.prefix("produce_", self.handle_weapon_callback, rate_class=ACTION, read_only=False)
+        router.prefix("select_weapon_", self.handle_weapon_callback)
+
+        router.prefix("alliance_invite_", self.process_alliance_invitation, parse=lambda target: (int(target),),
+                      rate_class=ACTION, read_only=False)
+        # Alliance buttons without a handler of their own are ignored
+        router.prefix("alliance_", self.ignore_callback)
+        router.prefix("accept_inv_", self.handle_invitation_response, parse=lambda _: ("accept",),
+                      rate_class=ACTION, read_only=False)
+        router.prefix("reject_inv_", self.handle_invitation_response, parse=lambda _: ("reject",),
+                      rate_class=ACTION, read_only=False)
+
+        # These handlers take the whole callback_data
+        def with_data(prefix):
+            return lambda suffix: (prefix + suffix,)
+
+        for prefix in ("sell_resource_", "sell_weapon_"):
+            router.prefix(prefix, self.handle_sell_item_dialog, parse=with_data(prefix))
+
+        router.prefix("admin_give_cat_", self.show_admin_give_category, admin_only=True, rate_class=ADMIN)
+        router.prefix("admin_", self.admin.handle_admin_action, admin_only=True, rate_class=ADMIN, read_only=False)
+        for prefix in ("penalty_money_", "penalty_resources_", "penalty_weapons_"):
+            router.prefix(prefix, self.admin.handle_penalty_action, parse=with_data(prefix), admin_only=True,
+                          rate_class=ADMIN, read_only=False)
+        return router
+
+    async def handle_weapon_callback(self, query, context):
+        """produce_/select_weapon_ buttons: quantity picker or single production"""
+        if query.data.count("_") > 1:  # select_weapon_rifle format
+            await self.show_weapon_quantity_selection(query, context)
+        else:  # produce_rifle format
+            await self.handle_weapon_production(query, context)
+
+    async def ignore_callback(self, query, context):
+        """Buttons that intentionally do nothing"""
+
     async def handle_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle all callback queries"""
         query = update.callback_query
@@ -93,127 +254,17 @@ class DragonRPBot:
         except Exception as e:
             logger.warning(f"Failed to answer callback query: {e}")
 
-        user_id = query.from_user.id
         data = query.data
 
         try:
-            if data.startswith("select_country_"):
-                await self.handle_country_selection(query, context)
-            elif data == "main_menu":
-                await self.show_main_menu_callback(query, context)
-            elif data == "economy":
-                await self.show_economy_menu(query, context)
-            elif data == "military":
-                await self.show_military_menu(query, context)
-            elif data == "diplomacy":
-                await self.show_diplomacy_menu(query, context)
-            elif data == "resources":
-                await self.show_resources_menu(query, context)
-            elif data == "buildings":
-                await self.show_buildings_menu(query, context)
-            elif data == "weapons" or data == "weapon_production":
-                await self.show_weapons_menu(query, context)
-            elif data.startswith("weapon_cat_"):
-                await self.show_weapon_category(query, context)
-            elif data.startswith("build_"):
-                await self.handle_building_construction(query, context)
-            elif data.startswith("produce_") or data.startswith("select_weapon_"):
-                # Check if it's quantity selection or direct production
-                if data.count("_") > 1:  # select_weapon_rifle format
-                    await self.show_weapon_quantity_selection(query, context)
-                else:  # produce_rifle format
-                    await self.handle_weapon_production(query, context)
-            elif data.startswith("select_building_"):
-                await self.show_building_quantity_selection(query, context)
-            elif data.startswith("quantity_"):
-                await self.handle_quantity_selection(query, context)
-            elif data == "select_attack_target":
-                await self.show_attack_targets(query, context)
-            elif data == "attack_menu":
-                await self.show_attack_targets(query, context)
-            elif data.startswith("select_target_"):
-                await self.show_attack_type_selection(query, context)
-            elif data.startswith("attack_type_"):
-                await self.show_weapon_selection_for_attack(query, context)
-            elif data.startswith("execute_attack_"):
-                await self.handle_attack_execution(query, context)
-            elif data == "send_resources":
-                await self.show_send_resources_menu(query, context)
-            elif data == "official_statement":
-                await self.handle_official_statement(query, context)
-            elif data == "income_report":
-                await self.show_income_report(query, context)
-            elif data == "defense_status":
-                await self.show_defense_status(query, context)
-            elif data == "military_power":
-                await self.show_military_power(query, context)
-            elif data == "propose_peace":
-                await self.propose_peace(query, context)
-            elif data == "intercept_convoys":
-                await self.show_convoy_interception_menu(query, context)
-            elif data.startswith("send_to_"):
-                await self.handle_resource_transfer_transport_select(query, context)
-            elif data.startswith("transfer_"):
-                await self.handle_transport_selection(query, context)
-            elif data.startswith("use_transport_"):
-                await self.handle_transport_selection(query, context)
-            elif data.startswith("convoy_"):
-                if data.startswith("convoy_escort_"):
-                    await self.handle_convoy_escort(query, context)
-                else:
-                    await self.handle_convoy_action(query, context)
-            elif data.startswith("confirm_convoy_"):
-                await self.handle_convoy_confirmation(query, context)
-            elif data == "alliances":
-                await self.show_alliance_menu(query, context)
-            elif data.startswith("alliance_"):
-                if data == "alliance_create":
-                    await self.handle_alliance_create(query, context)
-                elif data == "alliance_invite":
-                    await self.handle_alliance_invite(query, context)
-                elif data.startswith("alliance_invite_"):
-                    target_id = int(data.replace("alliance_invite_", ""))
-                    await self.process_alliance_invitation(query, context, target_id)
-                elif data == "alliance_members":
-                    await self.handle_alliance_members(query, context)
-                elif data == "alliance_invitations":
-                    await self.handle_alliance_invitations(query, context)
-                elif data == "alliance_leave":
-                    await self.handle_alliance_leave(query, context)
-            elif data == "marketplace":
-                await self.show_marketplace_menu(query, context)
-            elif data.startswith("market_"):
-                await self.handle_marketplace_action(query, context)
-            elif data.startswith("sell_resource_") or data.startswith("sell_weapon_"):
-                await self.handle_sell_item_dialog(query, context, data)
-            elif data.startswith("invite_"):
-                await self.handle_alliance_invite(query, context)
-            elif data.startswith("accept_inv_"):
-                await self.handle_invitation_response(query, context, "accept")
-            elif data.startswith("reject_inv_"):
-                await self.handle_invitation_response(query, context, "reject")
-            elif data.startswith("buy_"):
-                await self.handle_marketplace_purchase(query, context)
-            elif data.startswith("sell_cat_"):
-                await self.handle_sell_category(query, context)
-            elif data.startswith("remove_"):
-                await self.handle_remove_listing(query, context)
-            elif data.startswith("confirm_sell_"):
-                await self.handle_confirm_sell(query, context)
-            elif data.startswith("manual_transfer_"):
-                await self.handle_manual_transfer(query, context)
-            elif data.startswith("manual_sell_"):
-                await self.handle_manual_sell(query, context)
-            elif data.startswith("admin_give_cat_"):
-                await self.show_admin_give_category(query, context)
-            elif data.startswith("penalty_money_") or data.startswith("penalty_resources_") or data.startswith("penalty_weapons_"):
-                await self.admin.handle_penalty_action(query, context, data)
-            elif data.startswith("admin_"):
-                await self.admin.handle_admin_action(query, context)
-            else:
+            if not await self.router.dispatch(query, context):
                 logger.warning(f"Unhandled callback query: {query.data}")
                 await query.edit_message_text("❌ دستور نامعتبر است!")
-
+        except BadRequest as e:
+            # A repeated press re-rendering the same screen is not an error
+            if 'not modified' not in str(e).lower():
+                logger.error(f"Error handling callback {data}: {e}")
+                await query.edit_message_text("❌ خطایی رخ داد. لطفاً دوباره تلاش کنید.")
         except Exception as e:
             logger.error(f"Error handling callback {data}: {e}")
             await query.edit_message_text("❌ خطایی رخ داد. لطفاً دوباره تلاش کنید.")
@@ -252,15 +303,11 @@ class DragonRPBot:
     async def show_main_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Show main menu after /start"""
         user_id = update.effective_user.id
-        player = self.db.get_player(user_id)
-
-        if not player:
-            await update.message.reply_text("❌ ابتدا باید کشور خود را انتخاب کنید. /start")
-            return
 
+        # One bulk state load instead of a get_player plus four separate reads
         stats = self.game_logic.get_player_stats(user_id)
         if not stats:
-            await update.message.reply_text("❌ خطا در دریافت اطلاعات بازیکن")
+            await update.message.reply_text("❌ ابتدا باید کشور خود را انتخاب کنید. /start")
             return
 
         menu_text = f"""🏛 {stats['country_name']} - پنل مدیریت
@@ -290,17 +337,13 @@ class DragonRPBot:
 
     async def show_main_menu_callback(self, query, context):
         """Show main menu from callback"""
-        user_id = query.from_user.id
-        player = self.db.get_player(user_id)
-
-        if not player:
-            await query.edit_message_text("❌ ابتدا باید کشور خود را انتخاب کنید. /start")
-            return
+        await self.show_view(query, 'main_menu', self.render_main_menu)
 
+    def render_main_menu(self, user_id):
+        """Main menu text and keyboard"""
         stats = self.game_logic.get_player_stats(user_id)
         if not stats:
-            await query.edit_message_text("❌ خطا در دریافت اطلاعات بازیکن")
-            return
+            return "❌ ابتدا باید کشور خود را انتخاب کنید. /start", None
 
         menu_text = f"""🏛 {stats['country_name']} - پنل مدیریت
 
@@ -324,12 +367,14 @@ class DragonRPBot:
 انتخاب کنید:"""
 
         is_admin = self.admin.is_admin(user_id)
-        keyboard = self.keyboards.main_menu_keyboard(is_admin)
-        await query.edit_message_text(menu_text, reply_markup=keyboard)
+        return menu_text, self.keyboards.main_menu_keyboard(is_admin)
 
     async def show_economy_menu(self, query, context):
         """Show economy management menu"""
-        user_id = query.from_user.id
+        await self.show_view(query, 'economy', self.render_economy_menu)
+
+    def render_economy_menu(self, user_id):
+        """Economy menu text and keyboard"""
         player = self.db.get_player(user_id)
 
         buildings = self.db.get_player_buildings(user_id)
@@ -358,8 +403,7 @@ class DragonRPBot:
 🪖 پادگان: {buildings.get('military_base', 0)}
 🏘 مسکن: {buildings.get('housing', 0)}"""
 
-        keyboard = self.keyboards.economy_menu_keyboard()
-        await query.edit_message_text(menu_text, reply_markup=keyboard)
+        return menu_text, self.keyboards.economy_menu_keyboard()
 
     async def show_buildings_menu(self, query, context):
         """Show building construction menu"""
@@ -401,7 +445,7 @@ class DragonRPBot:
         user_id = query.from_user.id
         building_type = query.data.replace("build_", "")
 
-        result = self.game_logic.build_structure(user_id, building_type)
+        result = await self.run_blocking(self.game_logic.build_structure, user_id, building_type)
 
         # Add back button
         from telegram import InlineKeyboardButton, InlineKeyboardMarkup
@@ -425,8 +469,13 @@ class DragonRPBot:
     async def show_military_menu(self, query, context):
         """Show military management menu"""
         user_id = query.from_user.id
-        player = self.db.get_player(user_id)
-        weapons = self.db.get_player_weapons(user_id)
+        state = self.db.get_player_state(user_id)
+        if not state:
+            await query.edit_message_text("❌ ابتدا باید کشور خود را انتخاب کنید. /start")
+            return
+
+        player = state['player']
+        weapons = state['weapons']
         logger.info(f"Military menu for user {user_id}: rifle={weapons.get('rifle', 0)}, weapons={weapons}")
 
         # Count total weapons for summary
@@ -606,7 +655,7 @@ class DragonRPBot:
             return
 
         weapon_config = Config.WEAPONS[weapon_type]
-        result = self.game_logic.produce_weapon(user_id, weapon_type, 1)
+        result = await self.run_blocking(self.game_logic.produce_weapon, user_id, weapon_type, 1)
 
         if result['success']:
             weapon_name = weapon_config.get('name', weapon_type)
@@ -692,7 +741,7 @@ class DragonRPBot:
         item_name = "_".join(data_parts[2:-1])  # everything between type and amount
 
         if item_type == "weapon":
-            result = self.game_logic.produce_weapon(user_id, item_name, quantity)
+            result = await self.run_blocking(self.game_logic.produce_weapon, user_id, item_name, quantity)
 
             if result['success']:
                 await query.edit_message_text(
@@ -707,7 +756,7 @@ class DragonRPBot:
                 await query.edit_message_text(f"❌ {result['message']}")
 
         elif item_type == "building":
-            result = self.game_logic.build_structure(user_id, item_name, quantity)
+            result = await self.run_blocking(self.game_logic.build_structure, user_id, item_name, quantity)
 
             if result['success']:
                 await query.edit_message_text(
@@ -747,31 +796,35 @@ class DragonRPBot:
         keyboard = self.keyboards.diplomacy_menu_keyboard(user_id)
         await query.edit_message_text(menu_text, reply_markup=keyboard)
 
-    async def show_attack_targets(self, query, context):
-        """Show available attack targets based on distance and available weapons"""
-        user_id = query.from_user.id
-        player = self.db.get_player(user_id)
-        weapons = self.db.get_player_weapons(user_id)
+    def _find_attack_targets(self, user_id, state, countries):
+        """Attackable countries among countries for a player with this state"""
+        player = state['player']
+        weapons = state['weapons']
         attacker_country = player['country_code']
 
-        # Get all countries
-        all_countries = self.db.get_all_countries()
+        # Weapons the player owns, intersected with what reaches each target
+        distance_index = Config.distance_index()
+        owned = distance_index.owned_weapons(weapons)
+
         available_targets = []
+        for target in countries:
+            if target['user_id'] == user_id:  # Can't attack yourself
+                continue
 
-        for target in all_countries:
-            if target['user_id'] != user_id:  # Can't attack yourself
-                target_country = target['country_code']
+            target_country = target['country_code']
+            usable = owned & distance_index.weapons_in_range(attacker_country, target_country)
+            if usable:
+                target['distance_type'] = distance_index.distance_type(attacker_country, target_country)
+                target['available_weapons_count'] = len(usable)
+                available_targets.append(target)
 
-                # Check what weapons can attack this target
-                available_weapons = Config.get_available_weapons_for_attack(
-                    attacker_country, target_country, weapons
-                )
+        return player, available_targets
 
-                if available_weapons:
-                    distance_type = Config.get_country_distance_type(attacker_country, target_country)
-                    target['distance_type'] = distance_type
-                    target['available_weapons_count'] = len(available_weapons)
-                    available_targets.append(target)
+    async def show_attack_targets(self, query, context):
+        """Show available attack targets based on distance and available weapons"""
+        user_id = query.from_user.id
+        state, countries = await asyncio.gather(self.adb.get_player_state(user_id), self.adb.get_all_countries())
+        player, available_targets = self._find_attack_targets(user_id, state, countries)
 
         if not available_targets:
             await query.edit_message_text(
@@ -967,7 +1020,7 @@ class DragonRPBot:
             return
 
         # Execute attack
-        result = self.combat.schedule_delayed_attack(user_id, target_id, attack_type, conquest_mode)
+        result = await self.run_blocking(self.combat.schedule_delayed_attack, user_id, target_id, attack_type, conquest_mode)
 
         if not result['success']:
             await query.edit_message_text(f"❌ {result['message']}")
@@ -1585,7 +1638,10 @@ class DragonRPBot:
 
     async def show_defense_status(self, query, context):
         """Show defense status"""
-        user_id = query.from_user.id
+        await self.show_view(query, 'defense_status', self.render_defense_status)
+
+    def render_defense_status(self, user_id):
+        """Defense status text and keyboard"""
         player = self.db.get_player(user_id)
         weapons = self.db.get_player_weapons(user_id)
 
@@ -1606,12 +1662,14 @@ class DragonRPBot:
 
 💡 سیستم‌های دفاعی از کشور شما در برابر حملات محافظت می‌کنند."""
 
-        keyboard = self.keyboards.back_to_military_keyboard()
-        await query.edit_message_text(defense_text, reply_markup=keyboard)
+        return defense_text, self.keyboards.back_to_military_keyboard()
 
     async def show_military_power(self, query, context):
         """Show military power calculation"""
-        user_id = query.from_user.id
+        await self.show_view(query, 'military_power', self.render_military_power)
+
+    def render_military_power(self, user_id):
+        """Military power text and keyboard"""
         player = self.db.get_player(user_id)
         weapons = self.db.get_player_weapons(user_id)
 
@@ -1631,8 +1689,7 @@ class DragonRPBot:
 🛡 پدافند THAAD: {weapons.get('thaad_defense', 0)}
 🛡 پدافند S-400: {weapons.get('s400_defense', 0)}"""
 
-        keyboard = self.keyboards.back_to_military_keyboard()
-        await query.edit_message_text(power_text, reply_markup=keyboard)
+        return power_text, self.keyboards.back_to_military_keyboard()
 
     async def show_alliance_invite_menu(self, query, context):
         """Show alliance invite menu"""
@@ -1743,9 +1800,10 @@ class DragonRPBot:
     async def show_market_listings(self, query, context, category):
         """Show market listings for specific category"""
         user_id = query.from_user.id
-        player = self.db.get_player(user_id)
-
-        listings = self.marketplace.get_listings_by_category(category)
+        player, listings = await asyncio.gather(
+            self.adb.get_player(user_id),
+            self.adb.fetch_all(Marketplace.LISTINGS_BY_CATEGORY_SQL, (category,))
+        )
 
         if not listings:
             await query.edit_message_text(
@@ -2028,16 +2086,17 @@ class DragonRPBot:
 
     async def show_income_report(self, query, context):
         """Show detailed income report"""
-        user_id = query.from_user.id
+        await self.show_view(query, 'income_report', self.render_income_report)
+
+    def render_income_report(self, user_id):
+        """Income report text and keyboard"""
         player = self.db.get_player(user_id)
 
         if not player:
-            await query.edit_message_text("❌ بازیکن یافت نشد!")
-            return
+            return "❌ بازیکن یافت نشد!", None
 
         report = self.economy.get_income_report(user_id)
-        keyboard = self.keyboards.back_to_main_keyboard()
-        await query.edit_message_text(report, reply_markup=keyboard)
+        return report, self.keyboards.back_to_main_keyboard()
 
     async def show_convoy_interception_menu(self, query, context):
         """Show convoy interception menu"""
@@ -2079,19 +2138,16 @@ class DragonRPBot:
             listing_id = int(listing_id_str)
 
             # Check if listing exists
-            listing = self.marketplace.get_listing(listing_id)
+            listing = await self.adb.fetch_one(Marketplace.LISTING_SQL, (listing_id,))
             if not listing:
                 await query.edit_message_text("❌ کالا یافت نشد!")
                 return
 
-            result = self.marketplace.purchase_item(user_id, listing_id, 1)
+            result = await self.run_blocking(self.marketplace.purchase_item, user_id, listing_id, 1)
 
-            if result['success'] and result.get('is_first_purchase', False):
-                # Send convoy news only for first purchases
-                try:
-                    await self.news.send_marketplace_purchase(result)
-                except:
-                    pass  # Don't fail purchase if news fails
+            if result.get('is_first_purchase', False):
+                # First purchases queued their news with the purchase
+                self.outbox.notify()
 
             # Add back button
             from telegram import InlineKeyboardButton, InlineKeyboardMarkup
@@ -2566,7 +2622,8 @@ oil 300
 📝 متن بیانیه:
 {statement_text}"""
 
-            await self.news.send_text_message(statement_message)
+            await self.queue_news('text', {'message': statement_message},
+                                  f"statement:{user_id}:{update.message.message_id}")
 
             is_admin = self.admin.is_admin(user_id)
             await update.message.reply_text(
@@ -2620,126 +2677,76 @@ oil 300
 
 
     async def income_cycle(self):
-        """6-hour automated income cycle"""
-        logger.info("Starting income cycle...")
-
-        players = self.db.get_all_players()
-        for player in players:
-            try:
-                # Calculate and distribute income
-                income = self.economy.calculate_income(player['user_id'])
-                new_money = player['money'] + income
-
-                # Update population from farms
-                population_increase = self.economy.calculate_population_increase(player['user_id'])
-                new_population = player['population'] + population_increase
-
-                # Convert population to soldiers from military bases
-                soldier_increase = self.economy.calculate_soldier_increase(player['user_id'])
-                new_soldiers = player['soldiers'] + soldier_increase
-
-                # Update database
-                self.db.update_player_income(
-                    player['user_id'],
-                    new_money,
-                    new_population,
-                    new_soldiers
-                )
-
-                # Distribute mine resources
-                self.economy.distribute_mine_resources(player['user_id'])
-
-                logger.info(f"Income distributed to {player['country_name']}: ${income}")
-
-            except Exception as e:
-                logger.error(f"Error in income cycle for player {player['user_id']}: {e}")
-
-        # Send global news about income cycle
-        await self.news.send_income_cycle_complete()
-        logger.info("Income cycle completed")
-
-    async def process_pending_attacks(self):
-        """Process pending attacks that are due"""
+        """Income sweep for players whose due cycles no read or write has settled yet"""
         try:
-            results = self.combat.process_pending_attacks()
-
-            for result in results:
-                # Send news about completed attacks
-                attacker = self.db.get_player(result['attacker_id'])
-                defender = self.db.get_player(result['defender_id'])
-
-                if result['result']['success']:
-                    await self.news.send_war_news(
-                        attacker['country_name'],
-                        defender['country_name'],
-                        result['result']
-                    )
-
+            # Income accrues per player; only players with a due cycle are touched here
+            summary = await self.run_blocking(self.economy.run_income_cycle)
+            if summary['players']:
+                logger.info(f"Income sweep settled {summary['players']} players")
         except Exception as e:
-            logger.error(f"Error processing pending attacks: {e}")
+            logger.error(f"Error in income sweep: {e}")
 
-    async def process_convoy_arrivals(self):
-        """Process convoy arrivals that are due"""
-        try:
-            results = self.convoy.process_convoy_arrivals()
+    async def process_pending_attacks(self):
+        """Process pending attacks that are due (war news is queued with each battle)
 
-            for result in results:
-                # Send news about convoy delivery
-                convoy = self.db.get_convoy(result['convoy_id'])
-                if convoy:
-                    sender = self.db.get_player(convoy['sender_id'])
-                    receiver = self.db.get_player(convoy['receiver_id'])
+        Errors propagate to the deadline scheduler, which logs them and fires again with backoff.
+        """
+        results = await self.run_blocking(self.combat.process_pending_attacks)
+        if results:
+            self.outbox.notify()
 
-                    if result['success']:
-                        message = f"📦 محموله از {sender['country_name']} به {receiver['country_name']} تحویل شد!"
-                        await self.news.send_convoy_news(message, None, result.get('resources', {}))
-                    else:
-                        message = f"💀 محموله از {sender['country_name']} به {receiver['country_name']} دزدیده شد!"
-                        await self.news.send_convoy_news(message, None, result.get('resources_lost', {}))
+    async def process_convoy_arrivals(self):
+        """Process convoy arrivals that are due (their news is queued with each delivery)
 
-        except Exception as e:
-            logger.error(f"Error processing convoy arrivals: {e}")
+        Errors propagate to the deadline scheduler, which logs them and fires again with backoff.
+        """
+        results = await self.run_blocking(self.convoy.process_convoy_arrivals)
+        if results:
+            self.outbox.notify()
 
     def setup_scheduler(self):
         """Setup the automated scheduler"""
-        # 6-hour income cycle
+        # Income sweep for inactive players (active ones settle when their state is read)
         self.scheduler.add_job(
             func=self.income_cycle,
-            trigger=IntervalTrigger(hours=6),
+            trigger=IntervalTrigger(minutes=Config.BOT_CONFIG['income_sweep_minutes']),
             id='income_cycle',
-            name='6-hour income cycle',
+            name='Income sweep',
             replace_existing=True
         )
 
-        # Process pending attacks every minute
-        self.scheduler.add_job(
-            func=self.process_pending_attacks,
-            trigger=IntervalTrigger(minutes=1),
-            id='pending_attacks',
-            name='Process pending attacks',
-            replace_existing=True
-        )
+        # Pending attacks and convoy arrivals run when their deadline comes due (retried when they fail)
+        self.deadlines.register('attack', lambda attack_ids: self.process_pending_attacks())
+        self.deadlines.register('convoy', lambda convoy_ids: self.process_convoy_arrivals())
 
-        # Process convoy arrivals every minute
-        self.scheduler.add_job(
-            func=self.process_convoy_arrivals,
-            trigger=IntervalTrigger(minutes=1),
-            id='convoy_arrivals',
-            name='Process convoy arrivals',
-            replace_existing=True
-        )
+        logger.info("Scheduler configured - income sweep, pending attacks, and convoy arrivals active")
 
-        logger.info("Scheduler configured - 6-hour income cycle, pending attacks, and convoy arrivals active")
+    def _load_deadlines(self):
+        """Queue every attack and convoy still on its way (blocking)"""
+        return self.combat.schedule_traveling_attacks(), self.convoy.schedule_convoys_in_transit()
 
     async def start_scheduler(self):
         """Start the scheduler within async context"""
         self.scheduler.start()
-        logger.info("Scheduler started")
+
+        attacks, convoys = await self.run_blocking(self._load_deadlines)
+        await self.deadlines.start()
+        logger.info(f"Scheduler started ({attacks} attacks and {convoys} convoys in flight)")
 
     async def post_init(self, application):
         """Post initialization callback"""
+        await self.adb.start()
+        await self.outbox.start()
         await self.start_scheduler()
 
+    async def post_shutdown(self, application):
+        """Release the DB executor and pooled connections"""
+        await self.deadlines.stop()
+        await self.outbox.stop()
+        await self.adb.close()
+        self.db_executor.shutdown(wait=True)
+        self.db.close_pools()
+
     async def show_admin_give_category(self, query, context):
         """Show admin give category"""
         user_id = query.from_user.id
@@ -2782,6 +2789,67 @@ oil 300
 
         await query.edit_message_text(menu_text, reply_markup=keyboard)
 
+    def _give_item_to_all_players(self, item_type, amount):
+        """Give an item to every player (blocking, runs on the executor)"""
+        players = self.db.get_all_players()
+        success_count = 0
+        error_count = 0
+
+        if item_type == "money":
+            for player in players:
+                try:
+                    result = self.admin.give_money_to_player(player['user_id'], amount)
+                    if result['success']:
+                        success_count += 1
+                except Exception as e:
+                    logger.error(f"Error giving money to {player['country_name']}: {e}")
+
+            return {'players': len(players), 'success_count': success_count, 'error_count': error_count}
+
+        # Weapons go to every player in one batched upsert
+        weapon_map = {
+            'rifle': 'rifle',
+            'tank': 'tank',
+            'fighter': 'fighter_jet',
+            'jet': 'fighter_jet',
+            'drone': 'drone',
+            'simple': 'bomb',
+            'bomb': 'bomb',
+            'nuclear': 'nuclear_bomb',
+            'ballistic': 'missile',
+            'missile': 'missile',
+            'f22': 'F-22'
+        }
+        if item_type in weapon_map:
+            user_ids = [player['user_id'] for player in players]
+            if self.db.add_weapons_to_players(user_ids, {weapon_map[item_type]: amount}):
+                success_count = len(user_ids)
+            else:
+                error_count = len(user_ids)
+            return {'players': len(players), 'success_count': success_count, 'error_count': error_count}
+
+        # Give resources to all players
+        for player in players:
+            try:
+                result = None
+
+                # Check if it's a resource
+                if item_type in ['iron', 'copper', 'oil', 'aluminum', 'gold', 'uranium', 'lithium', 'coal', 'nitro', 'sulfur', 'titanium']:
+                    result = self.admin.give_resources_to_player(player['user_id'], item_type, amount)
+                    if result['success']:
+                        success_count += 1
+
+                else:
+                    logger.error(f"Unknown item type: {item_type}")
+                    error_count += 1
+                    continue
+
+            except Exception as e:
+                logger.error(f"Error giving {item_type} to {player['country_name']}: {e}")
+                error_count += 1
+
+        return {'players': len(players), 'success_count': success_count, 'error_count': error_count}
+
     async def handle_admin_give_item(self, query, context):
         """Handle admin giving items"""
         user_id = query.from_user.id
@@ -2807,22 +2875,16 @@ oil 300
             await query.edit_message_text("❌ مقدار نامعتبر!")
             return
 
-        # Handle money gifting
-        if item_type == "money":
-            players = self.db.get_all_players()
-            if not players:
-                await query.edit_message_text("❌ هیچ بازیکنی وجود ندارد!")
-                return
+        gift = await self.run_blocking(self._give_item_to_all_players, item_type, amount)
+        if gift['players'] == 0:
+            await query.edit_message_text("❌ هیچ بازیکنی وجود ندارد!")
+            return
 
-            success_count = 0
-            for player in players:
-                try:
-                    result = self.admin.give_money_to_player(player['user_id'], amount)
-                    if result['success']:
-                        success_count += 1
-                except Exception as e:
-                    logger.error(f"Error giving money to {player['country_name']}: {e}")
+        success_count = gift['success_count']
+        error_count = gift['error_count']
 
+        # Handle money gifting
+        if item_type == "money":
             await query.edit_message_text(
                 f"✅ پول با موفقیت به {success_count} کشور هدیه داده شد!\n\n"
                 f"💰 مقدار: {amount:,}",
@@ -2830,55 +2892,6 @@ oil 300
             )
             return
 
-
-        # Give to all players for resources and weapons
-        players = self.db.get_all_players()
-        if not players:
-            await query.edit_message_text("❌ هیچ بازیکنی وجود ندارد!")
-            return
-
-        success_count = 0
-        error_count = 0
-
-        for player in players:
-            try:
-                result = None
-
-                # Check if it's a resource
-                if item_type in ['iron', 'copper', 'oil', 'aluminum', 'gold', 'uranium', 'lithium', 'coal', 'nitro', 'sulfur', 'titanium']:
-                    result = self.admin.give_resources_to_player(player['user_id'], item_type, amount)
-                    if result['success']:
-                        success_count += 1
-
-                # Check if it's a weapon
-                elif item_type in ['rifle', 'tank', 'fighter', 'jet', 'drone', 'simple', 'bomb', 'nuclear', 'ballistic', 'missile', 'f22']:
-                    weapon_map = {
-                        'rifle': 'rifle',
-                        'tank': 'tank',
-                        'fighter': 'fighter_jet',
-                        'jet': 'fighter_jet',
-                        'drone': 'drone',
-                        'simple': 'bomb',
-                        'bomb': 'bomb',
-                        'nuclear': 'nuclear_bomb',
-                        'ballistic': 'missile',
-                        'missile': 'missile',
-                        'f22': 'F-22'
-                    }
-                    weapon_name = weapon_map.get(item_type, item_type)
-                    result = self.admin.give_weapons_to_player(player['user_id'], weapon_name, amount)
-                    if result['success']:
-                        success_count += 1
-
-                else:
-                    logger.error(f"Unknown item type: {item_type}")
-                    error_count += 1
-                    continue
-
-            except Exception as e:
-                logger.error(f"Error giving {item_type} to {player['country_name']}: {e}")
-                error_count += 1
-
         # Create result message
         if success_count > 0:
             result_text = f"✅ آیتم با موفقیت به {success_count} کشور هدیه داده شد!\n\n"
@@ -2910,7 +2923,14 @@ oil 300
         self.news.set_bot(bot)
 
         # Setup application
-        application = Application.builder().token(self.token).post_init(self.post_init).build()
+        application = (
+            Application.builder()
+            .token(self.token)
+            .concurrent_updates(Config.BOT_CONFIG['concurrent_updates'])
+            .post_init(self.post_init)
+            .post_shutdown(self.post_shutdown)
+            .build()
+        )
 
         # Add handlers
         application.add_handler(CommandHandler("start", self.start))
@@ -2,6 +2,7 @@ import logging
 from datetime import datetime
 import json
 from config import Config
+from database import DeltaRejected
 
 logger = logging.getLogger(__name__)
 
@@ -11,51 +12,8 @@ class Marketplace:
         self.setup_marketplace_tables()
 
     def setup_marketplace_tables(self):
-        """Setup marketplace tables"""
-        with self.db.get_connection() as conn:
-            if self.db.use_mysql:
-                cursor = conn.cursor(dictionary=True)
-            else:
-                cursor = conn.cursor()
-
-            # Use appropriate syntax based on database type
-            auto_increment = "AUTO_INCREMENT" if self.db.use_mysql else "AUTOINCREMENT"
-            id_type = "INT" if self.db.use_mysql else "INTEGER"
-
-            # Market listings table
-            cursor.execute(f'''
-                CREATE TABLE IF NOT EXISTS market_listings (
-                    id {id_type} PRIMARY KEY {auto_increment},
-                    seller_id INTEGER NOT NULL,
-                    item_type TEXT NOT NULL,
-                    item_category TEXT NOT NULL,
-                    quantity INTEGER NOT NULL,
-                    price_per_unit INTEGER NOT NULL,
-                    total_price INTEGER NOT NULL,
-                    security_level INTEGER DEFAULT 50,
-                    status TEXT DEFAULT 'active',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-
-            # Market transactions table
-            cursor.execute(f'''
-                CREATE TABLE IF NOT EXISTS market_transactions (
-                    id {id_type} PRIMARY KEY {auto_increment},
-                    listing_id INTEGER NOT NULL,
-                    buyer_id INTEGER NOT NULL,
-                    seller_id INTEGER NOT NULL,
-                    item_type TEXT NOT NULL,
-                    quantity INTEGER NOT NULL,
-                    total_paid INTEGER NOT NULL,
-                    status TEXT DEFAULT 'pending',
-                    transaction_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    delivery_date TIMESTAMP NULL
-                )
-            ''')
-
-            conn.commit()
-            cursor.close()
+        """Make sure the marketplace tables exist (they are created by the schema migrations)"""
+        self.db.initialize()
 
     def create_listing(self, seller_id, item_type, item_category, quantity, price_per_unit):
         """Create new market listing"""
@@ -71,16 +29,11 @@ class Marketplace:
         if not self.remove_from_inventory(seller_id, item_category, item_type, quantity):
             return {'success': False, 'message': 'خطا در کسر موجودی!'}
 
-        with self.db.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO market_listings 
-                (seller_id, item_type, item_category, quantity, price_per_unit, total_price, security_level)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (seller_id, item_type, item_category, quantity, price_per_unit, total_price, security_level))
-
-            listing_id = cursor.lastrowid
-            conn.commit()
+        listing_id = self.db.insert('''
+            INSERT INTO market_listings 
+            (seller_id, item_type, item_category, quantity, price_per_unit, total_price, security_level)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (seller_id, item_type, item_category, quantity, price_per_unit, total_price, security_level))
 
         return {
             'success': True,
@@ -99,7 +52,7 @@ class Marketplace:
         if listing['seller_id'] == buyer_id:
             return {'success': False, 'message': 'نمی‌توانید از خودتان خرید کنید!'}
 
-        if quantity_to_buy > listing['quantity']:
+        if quantity_to_buy <= 0 or quantity_to_buy > listing['quantity']:
             return {'success': False, 'message': 'موجودی کافی نیست!'}
 
         total_cost = quantity_to_buy * listing['price_per_unit']
@@ -108,41 +61,47 @@ class Marketplace:
         if buyer['money'] < total_cost:
             return {'success': False, 'message': 'پول کافی ندارید!'}
 
-        # Process transaction
-        with self.db.get_connection() as conn:
-            cursor = conn.cursor()
-
-            # Create transaction record
-            cursor.execute('''
-                INSERT INTO market_transactions 
-                (listing_id, buyer_id, seller_id, item_type, quantity, total_paid)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (listing_id, buyer_id, listing['seller_id'], listing['item_type'], 
-                  quantity_to_buy, total_cost))
-
-            transaction_id = cursor.lastrowid
-
-            # Deduct money from buyer
-            self.db.update_player_money(buyer_id, buyer['money'] - total_cost)
-
-            # Add money to seller
-            seller = self.db.get_player(listing['seller_id'])
-            self.db.update_player_money(listing['seller_id'], seller['money'] + total_cost)
-
-            # Update listing quantity
-            remaining_quantity = listing['quantity'] - quantity_to_buy
-            if remaining_quantity <= 0:
-                cursor.execute('UPDATE market_listings SET status = "sold_out" WHERE id = ?', (listing_id,))
-            else:
-                cursor.execute('UPDATE market_listings SET quantity = ? WHERE id = ?', 
-                              (remaining_quantity, listing_id))
-
-            conn.commit()
+        seller = self.db.get_player(listing['seller_id'])
 
-        # Check if this is first purchase for news
-        is_first_purchase = self.db.check_first_purchase(buyer_id, listing['item_type'])
-        if is_first_purchase:
-            self.db.record_first_purchase(buyer_id, listing['item_type'])
+        # Process transaction: stock, record, payment and news commit together
+        deltas = {
+            buyer_id: {'money': -total_cost},
+            listing['seller_id']: {'money': total_cost}
+        }
+        stock_taken = False
+        try:
+            with self.db.transaction() as conn:
+                # Guarded relative update: a concurrent buyer may have taken the stock since the read
+                if self.db.execute(self.TAKE_STOCK_SQL, (quantity_to_buy, quantity_to_buy, listing_id,
+                                                         quantity_to_buy), conn=conn) != 1:
+                    raise DeltaRejected(f"listing {listing_id} no longer has {quantity_to_buy} left")
+                stock_taken = True
+
+                # Create transaction record
+                transaction_id = self.db.insert('''
+                    INSERT INTO market_transactions 
+                    (listing_id, buyer_id, seller_id, item_type, quantity, total_paid)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (listing_id, buyer_id, listing['seller_id'], listing['item_type'],
+                      quantity_to_buy, total_cost), conn=conn)
+
+                # Move money from buyer to seller
+                self.db.apply_deltas(deltas, conn=conn)
+
+                # The first purchase of an item type makes the news
+                is_first_purchase = self.db.record_first_purchase(buyer_id, listing['item_type'], conn=conn)
+                if is_first_purchase:
+                    self.db.queue_news('marketplace_purchase', {
+                        'buyer_country': buyer['country_name'],
+                        'seller_country': seller['country_name'] if seller else None
+                    }, f"purchase:{transaction_id}", conn=conn)
+        except DeltaRejected:
+            if not stock_taken:
+                return {'success': False, 'message': 'موجودی کافی نیست!'}
+            return {'success': False, 'message': 'پول کافی ندارید!'}
+        finally:
+            # Readers between the UPDATEs and the commit may have cached old rows
+            self.db.invalidate_players(deltas)
 
         # Add items to buyer (will be delivered based on security)
         delivery_success = self.process_delivery(buyer_id, listing, quantity_to_buy, transaction_id)
@@ -177,14 +136,11 @@ class Marketplace:
             self.add_to_inventory(buyer_id, listing['item_category'], listing['item_type'], quantity)
 
             # Update transaction status
-            with self.db.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    UPDATE market_transactions 
-                    SET status = "delivered", delivery_date = CURRENT_TIMESTAMP 
-                    WHERE id = ?
-                ''', (transaction_id,))
-                conn.commit()
+            self.db.execute('''
+                UPDATE market_transactions 
+                SET status = 'delivered', delivery_date = CURRENT_TIMESTAMP 
+                WHERE id = ?
+            ''', (transaction_id,))
 
             return {'success': True, 'message': '✅ کالا با موفقیت تحویل شد!'}
         else:
@@ -193,17 +149,13 @@ class Marketplace:
             listing_price = quantity * listing['price_per_unit']
             refund_amount = listing_price // 2
 
-            buyer = self.db.get_player(buyer_id)
-            self.db.update_player_money(buyer_id, buyer['money'] + refund_amount)
+            self.db.apply_delta(buyer_id, money=refund_amount)
 
-            with self.db.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    UPDATE market_transactions 
-                    SET status = "failed" 
-                    WHERE id = ?
-                ''', (transaction_id,))
-                conn.commit()
+            self.db.execute('''
+                UPDATE market_transactions 
+                SET status = 'failed' 
+                WHERE id = ?
+            ''', (transaction_id,))
 
             return {'success': False, 'message': f'❌ محموله در راه دزدیده شد! ${refund_amount:,} بازپرداخت شد.'}
 
@@ -224,34 +176,14 @@ class Marketplace:
 
     def get_buyer_transactions(self, buyer_id, limit=10):
         """Get recent transactions for a buyer"""
-        with self.db.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT mt.*, p.country_name as seller_country
-                FROM market_transactions mt
-                JOIN players p ON mt.seller_id = p.user_id
-                WHERE mt.buyer_id = ?
-                ORDER BY mt.transaction_date DESC
-                LIMIT ?
-            ''', (buyer_id, limit))
-
-            transactions = []
-            for row in cursor.fetchall():
-                transactions.append({
-                    'id': row[0],
-                    'listing_id': row[1],
-                    'buyer_id': row[2],
-                    'seller_id': row[3],
-                    'item_type': row[4],
-                    'quantity': row[5],
-                    'total_paid': row[6],
-                    'status': row[7],
-                    'transaction_date': row[8],
-                    'delivery_date': row[9],
-                    'seller_country': row[10]
-                })
-
-            return transactions
+        return self.db.fetch_all('''
+            SELECT mt.*, p.country_name as seller_country
+            FROM market_transactions mt
+            JOIN players p ON mt.seller_id = p.user_id
+            WHERE mt.buyer_id = ?
+            ORDER BY mt.transaction_date DESC
+            LIMIT ?
+        ''', (buyer_id, limit))
 
     def verify_seller_inventory(self, seller_id, category, item_type, quantity):
         """Verify seller has required inventory"""
@@ -317,51 +249,54 @@ class Marketplace:
             player = self.db.get_player(buyer_id)
             self.db.update_player_money(buyer_id, player['money'] + quantity)
 
+    LISTING_SQL = 'SELECT * FROM market_listings WHERE id = ?'
+    # status is assigned first: MySQL evaluates SET left to right, so it still sees the old quantity
+    TAKE_STOCK_SQL = '''
+        UPDATE market_listings
+        SET status = CASE WHEN quantity <= ? THEN 'sold_out' ELSE status END,
+            quantity = quantity - ?
+        WHERE id = ? AND status = 'active' AND quantity >= ?
+    '''
+    LISTINGS_BY_CATEGORY_SQL = '''
+        SELECT ml.*, p.country_name as seller_country
+        FROM market_listings ml
+        JOIN players p ON ml.seller_id = p.user_id
+        WHERE ml.item_category = ? AND ml.status = 'active'
+        ORDER BY ml.created_at DESC
+    '''
+
     def get_listing(self, listing_id):
         """Get listing details"""
-        with self.db.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT * FROM market_listings WHERE id = ?', (listing_id,))
-            result = cursor.fetchone()
-            return dict(result) if result else None
+        return self.db.fetch_one(self.LISTING_SQL, (listing_id,))
 
     def get_active_listings(self, category=None, limit=20):
         """Get active market listings"""
-        with self.db.get_connection() as conn:
-            cursor = conn.cursor()
-
-            if category:
-                cursor.execute('''
-                    SELECT ml.*, p.country_name as seller_country
-                    FROM market_listings ml
-                    JOIN players p ON ml.seller_id = p.user_id
-                    WHERE ml.status = "active" AND ml.item_category = ?
-                    ORDER BY ml.created_at DESC
-                    LIMIT ?
-                ''', (category, limit))
-            else:
-                cursor.execute('''
-                    SELECT ml.*, p.country_name as seller_country
-                    FROM market_listings ml
-                    JOIN players p ON ml.seller_id = p.user_id
-                    WHERE ml.status = "active"
-                    ORDER BY ml.created_at DESC
-                    LIMIT ?
-                ''', (limit,))
-
-            return [dict(row) for row in cursor.fetchall()]
+        if category:
+            return self.db.fetch_all('''
+                SELECT ml.*, p.country_name as seller_country
+                FROM market_listings ml
+                JOIN players p ON ml.seller_id = p.user_id
+                WHERE ml.status = 'active' AND ml.item_category = ?
+                ORDER BY ml.created_at DESC
+                LIMIT ?
+            ''', (category, limit))
+
+        return self.db.fetch_all('''
+            SELECT ml.*, p.country_name as seller_country
+            FROM market_listings ml
+            JOIN players p ON ml.seller_id = p.user_id
+            WHERE ml.status = 'active'
+            ORDER BY ml.created_at DESC
+            LIMIT ?
+        ''', (limit,))
 
     def get_player_listings(self, seller_id):
         """Get player's listings"""
-        with self.db.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT * FROM market_listings 
-                WHERE seller_id = ? AND status IN ("active", "sold_out")
-                ORDER BY created_at DESC
-            ''', (seller_id,))
-
-            return [dict(row) for row in cursor.fetchall()]
+        return self.db.fetch_all('''
+            SELECT * FROM market_listings 
+            WHERE seller_id = ? AND status IN ('active', 'sold_out')
+            ORDER BY created_at DESC
+        ''', (seller_id,))
 
     def cancel_listing(self, seller_id, listing_id):
         """Cancel a listing and return items"""
@@ -373,15 +308,17 @@ class Marketplace:
         if listing['status'] != 'active':
             return {'success': False, 'message': 'این آگهی قابل لغو نیست!'}
 
+        # Cancel only the stock that was read: a purchase since then changes the quantity
+        cancelled = self.db.execute('''
+            UPDATE market_listings SET status = 'cancelled'
+            WHERE id = ? AND status = 'active' AND quantity = ?
+        ''', (listing_id, listing['quantity']))
+        if cancelled != 1:
+            return {'success': False, 'message': 'این آگهی قابل لغو نیست!'}
+
         # Return items to seller
         self.add_to_inventory(seller_id, listing['item_category'], listing['item_type'], listing['quantity'])
 
-        # Update listing status
-        with self.db.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('UPDATE market_listings SET status = "cancelled" WHERE id = ?', (listing_id,))
-            conn.commit()
-
         return {'success': True, 'message': 'آگهی لغو شد و اقلام بازگردانده شد.'}
 
     def delete_listing(self, seller_id, listing_id):
@@ -395,23 +332,11 @@ class Marketplace:
         if listing['status'] == 'active':
              return {'success': False, 'message': 'آگهی فعال را نمی‌توان حذف کرد!'}
 
-        with self.db.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('DELETE FROM market_listings WHERE id = ?', (listing_id,))
-            conn.commit()
+        self.db.execute('DELETE FROM market_listings WHERE id = ?', (listing_id,))
 
         return {'success': True, 'message': 'آگهی با موفقیت حذف شد.'}
 
     def get_listings_by_category(self, category):
         """Get marketplace listings by category"""
-        with self.db.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT ml.*, p.country_name as seller_country
-                FROM market_listings ml
-                JOIN players p ON ml.seller_id = p.user_id
-                WHERE ml.item_category = ? AND ml.status = 'active'
-                ORDER BY ml.created_at DESC
-            ''', (category,))
-            results = cursor.fetchall()
-            return [dict(row) for row in results]
+        return self.db.fetch_all(self.LISTINGS_BY_CATEGORY_SQL, (category,))
+
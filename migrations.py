@@ -0,0 +1,430 @@
+"""
+DragonRP Schema Migrations
+Versioned, idempotent schema changes recorded in the schema_version table
+"""
+
+import logging
+import sqlite3
+from datetime import datetime
+
+import mysql.connector
+
+logger = logging.getLogger(__name__)
+
+# Table layouts in portable SQL; {id_type} is BIGINT on MySQL and INTEGER on SQLite
+TABLES = {
+    'players': '''
+        CREATE TABLE IF NOT EXISTS players (
+            user_id {id_type} PRIMARY KEY,
+            username TEXT NOT NULL,
+            country_code VARCHAR(8) UNIQUE NOT NULL,
+            country_name TEXT NOT NULL,
+            money INTEGER DEFAULT 900000,
+            population INTEGER DEFAULT 1000000,
+            soldiers INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''',
+    'wars': '''
+        CREATE TABLE IF NOT EXISTS wars (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            attacker_id {id_type} NOT NULL,
+            defender_id {id_type} NOT NULL,
+            attack_power {id_type} NOT NULL,
+            defense_power {id_type} NOT NULL,
+            result VARCHAR(50) NOT NULL,
+            damage_dealt {id_type} DEFAULT 0,
+            resources_stolen TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''',
+    'convoys': '''
+        CREATE TABLE IF NOT EXISTS convoys (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sender_id {id_type} NOT NULL,
+            receiver_id {id_type} NOT NULL,
+            resources TEXT NOT NULL,
+            departure_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            arrival_time DATETIME NOT NULL,
+            status VARCHAR(32) DEFAULT 'in_transit',
+            security_level INTEGER DEFAULT 50,
+            thief_id {id_type} NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''',
+    'alliances': '''
+        CREATE TABLE IF NOT EXISTS alliances (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name VARCHAR(100) NOT NULL UNIQUE,
+            leader_id {id_type} NOT NULL,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''',
+    'alliance_members': '''
+        CREATE TABLE IF NOT EXISTS alliance_members (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            alliance_id {id_type} NOT NULL,
+            user_id {id_type} NOT NULL,
+            role VARCHAR(32) DEFAULT 'member',
+            joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''',
+    'alliance_invitations': '''
+        CREATE TABLE IF NOT EXISTS alliance_invitations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            alliance_id {id_type} NOT NULL,
+            inviter_id {id_type} NOT NULL,
+            invitee_id {id_type} NOT NULL,
+            status VARCHAR(32) DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''',
+    'pending_attacks': '''
+        CREATE TABLE IF NOT EXISTS pending_attacks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            attacker_id {id_type} NOT NULL,
+            defender_id {id_type} NOT NULL,
+            attack_type VARCHAR(32) DEFAULT 'mixed',
+            conquest_mode INTEGER DEFAULT 0,
+            travel_time INTEGER NOT NULL,
+            departure_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            attack_time DATETIME NOT NULL,
+            status VARCHAR(32) DEFAULT 'traveling'
+        )
+    ''',
+    'admin_logs': '''
+        CREATE TABLE IF NOT EXISTS admin_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            admin_id {id_type} NOT NULL,
+            action TEXT NOT NULL,
+            target_id {id_type},
+            details TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''',
+    'marketplace_listings': '''
+        CREATE TABLE IF NOT EXISTS marketplace_listings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            seller_id {id_type} NOT NULL,
+            item_name TEXT NOT NULL,
+            item_type TEXT NOT NULL,
+            item_id TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            price INTEGER NOT NULL,
+            status VARCHAR(32) DEFAULT 'active',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''',
+    'market_listings': '''
+        CREATE TABLE IF NOT EXISTS market_listings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            seller_id {id_type} NOT NULL,
+            item_type VARCHAR(64) NOT NULL,
+            item_category VARCHAR(32) NOT NULL,
+            quantity INTEGER NOT NULL,
+            price_per_unit INTEGER NOT NULL,
+            total_price INTEGER NOT NULL,
+            security_level INTEGER DEFAULT 50,
+            status VARCHAR(32) DEFAULT 'active',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''',
+    'market_transactions': '''
+        CREATE TABLE IF NOT EXISTS market_transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            listing_id {id_type} NOT NULL,
+            buyer_id {id_type} NOT NULL,
+            seller_id {id_type} NOT NULL,
+            item_type VARCHAR(64) NOT NULL,
+            quantity INTEGER NOT NULL,
+            total_paid INTEGER NOT NULL,
+            status VARCHAR(32) DEFAULT 'pending',
+            transaction_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            delivery_date TIMESTAMP NULL
+        )
+    ''',
+    'purchase_tracking': '''
+        CREATE TABLE IF NOT EXISTS purchase_tracking (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            buyer_id {id_type} NOT NULL,
+            item_type VARCHAR(64) NOT NULL,
+            first_purchase_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (buyer_id, item_type)
+        )
+    ''',
+    'build_tracking': '''
+        CREATE TABLE IF NOT EXISTS build_tracking (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            builder_id {id_type} NOT NULL,
+            item_type VARCHAR(64) NOT NULL,
+            first_build_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (builder_id, item_type)
+        )
+    ''',
+    'banned_users': '''
+        CREATE TABLE IF NOT EXISTS banned_users (
+            user_id {id_type} PRIMARY KEY,
+            username TEXT,
+            banned_by {id_type},
+            ban_reason TEXT,
+            banned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    '''
+}
+
+# (table, column) pairs holding user ids, widened to BIGINT on older MySQL schemas
+USER_ID_COLUMNS = [
+    ('players', 'user_id'), ('resources', 'user_id'), ('buildings', 'user_id'),
+    ('weapons', 'user_id'), ('banned_users', 'user_id'),
+    ('wars', 'attacker_id'), ('wars', 'defender_id'),
+    ('convoys', 'sender_id'), ('convoys', 'receiver_id'),
+    ('pending_attacks', 'attacker_id'), ('pending_attacks', 'defender_id'),
+    ('alliance_members', 'user_id'), ('alliance_invitations', 'invitee_id'),
+    ('market_listings', 'seller_id'), ('market_transactions', 'buyer_id'),
+    ('market_transactions', 'seller_id')
+]
+
+# Columns renamed since the first releases: (table, old name, new name)
+RENAMED_COLUMNS = [
+    ('alliance_members', 'player_id', 'user_id')
+]
+
+# Columns added to existing tables since the first releases
+ADDED_COLUMNS = [
+    ('convoys', 'thief_id', '{id_type} NULL')
+]
+
+# MySQL cannot index TEXT without a prefix length, so keyed text columns become VARCHAR
+KEYED_TEXT_COLUMNS = [
+    ('players', 'country_code', 'VARCHAR(8) NOT NULL'),
+    ('pending_attacks', 'status', "VARCHAR(32) DEFAULT 'traveling'"),
+    ('convoys', 'status', "VARCHAR(32) DEFAULT 'in_transit'"),
+    ('market_listings', 'status', "VARCHAR(32) DEFAULT 'active'"),
+    ('market_listings', 'item_category', 'VARCHAR(32) NOT NULL'),
+    ('alliance_invitations', 'status', "VARCHAR(32) DEFAULT 'pending'"),
+    ('purchase_tracking', 'item_type', 'VARCHAR(64) NOT NULL'),
+    ('build_tracking', 'item_type', 'VARCHAR(64) NOT NULL')
+]
+
+# name -> (table, columns) for the queries run by the scheduler jobs and menus
+INDEXES = {
+    'idx_pending_attacks_due': ('pending_attacks', ('status', 'attack_time')),
+    'idx_pending_attacks_attacker': ('pending_attacks', ('attacker_id', 'status')),
+    'idx_convoys_arrival': ('convoys', ('status', 'arrival_time')),
+    'idx_market_listings_browse': ('market_listings', ('status', 'item_category', 'created_at')),
+    'idx_market_listings_seller': ('market_listings', ('seller_id', 'status')),
+    'idx_market_transactions_buyer': ('market_transactions', ('buyer_id',)),
+    'idx_alliance_members_user': ('alliance_members', ('user_id',)),
+    'idx_alliance_members_alliance': ('alliance_members', ('alliance_id',)),
+    'idx_alliance_invitations_invitee': ('alliance_invitations', ('invitee_id', 'status'))
+}
+
+
+def create_tables(runner):
+    """Baseline layout of every game table"""
+    db = runner.db
+    counters = {
+        'resources': db.RESOURCE_TYPES,
+        'buildings': db.BUILDING_TYPES,
+        'weapons': db.WEAPON_COLUMNS
+    }
+    for table, columns in counters.items():
+        runner.execute('CREATE TABLE IF NOT EXISTS {table} (user_id {{id_type}} PRIMARY KEY, {columns})'.format(
+            table=table, columns=', '.join(f'{column} INTEGER DEFAULT 0' for column in columns)
+        ))
+
+    for table, ddl in TABLES.items():
+        if table == 'alliance_invitations' and runner.table_exists(table) \
+                and 'invitee_id' not in runner.column_names(table):
+            # Early builds created an invitations layout that no code path could write to
+            runner.execute('DROP TABLE alliance_invitations')
+        runner.execute(ddl)
+
+
+def upgrade_legacy_columns(runner):
+    """Rename and add the columns older databases are missing"""
+    for table, old, new in RENAMED_COLUMNS:
+        columns = runner.column_names(table)
+        if old in columns and new not in columns:
+            logger.info(f"Renaming {table}.{old} to {new}")
+            runner.execute(f'ALTER TABLE {table} RENAME COLUMN {old} TO {new}')
+
+    db = runner.db
+    added = list(ADDED_COLUMNS)
+    for table, counters in (('resources', db.RESOURCE_TYPES), ('buildings', db.BUILDING_TYPES),
+                            ('weapons', db.WEAPON_COLUMNS)):
+        added.extend((table, column, 'INTEGER DEFAULT 0') for column in counters)
+
+    existing = {}
+    for table, column, definition in added:
+        if table not in existing:
+            existing[table] = runner.column_names(table)
+        if column not in existing[table]:
+            logger.info(f"Adding missing column {table}.{column}")
+            runner.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+            existing[table].add(column)
+
+
+def fix_column_types(runner):
+    """BIGINT user ids, indexable VARCHAR keys and DATETIME arrival columns"""
+    if runner.is_mysql:
+        for table, column in USER_ID_COLUMNS:
+            runner.ensure_column_type(table, column, 'bigint', 'BIGINT NOT NULL')
+        for table, column, definition in KEYED_TEXT_COLUMNS:
+            runner.ensure_column_type(table, column, 'varchar', definition)
+        runner.ensure_column_type('pending_attacks', 'attack_time', 'datetime', 'DATETIME NOT NULL')
+        runner.ensure_column_type('convoys', 'arrival_time', 'datetime', 'DATETIME NOT NULL')
+    else:
+        # isoformat() strings ('2024-01-01T10:00:00') sort after same-day 'YYYY-MM-DD HH:MM:SS' values
+        for table, column in (('pending_attacks', 'attack_time'), ('convoys', 'arrival_time')):
+            runner.execute(f"UPDATE {table} SET {column} = REPLACE({column}, 'T', ' ') WHERE {column} LIKE '%T%'")
+
+
+def create_indexes(runner):
+    """Composite indexes for the hot query paths"""
+    for name, (table, columns) in INDEXES.items():
+        runner.create_index(name, table, columns)
+
+
+def add_income_accrual(runner):
+    """players.last_settled_at anchors lazily settled income cycles"""
+    if 'last_settled_at' not in runner.column_names('players'):
+        runner.execute('ALTER TABLE players ADD COLUMN last_settled_at DATETIME NULL')
+    # Existing players start accruing from the upgrade
+    runner.db.execute('UPDATE players SET last_settled_at = ? WHERE last_settled_at IS NULL',
+                      (datetime.now().replace(microsecond=0),), conn=runner.conn)
+    runner.create_index('idx_players_settled', 'players', ('last_settled_at',))
+
+
+def add_news_outbox(runner):
+    """news_outbox holds channel posts written with the game change that produced them"""
+    runner.execute('''
+        CREATE TABLE IF NOT EXISTS news_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            dedup_key VARCHAR(191) NOT NULL UNIQUE,
+            event VARCHAR(32) NOT NULL,
+            payload TEXT NOT NULL,
+            created_at DATETIME NOT NULL,
+            offered_at DATETIME NULL,
+            sent_at DATETIME NULL
+        )
+    ''')
+    runner.create_index('idx_news_outbox_pending', 'news_outbox', ('sent_at', 'id'))
+
+
+def add_news_failures(runner):
+    """news_outbox.failed_at marks posts Telegram rejected, so they are not offered again"""
+    if 'failed_at' not in runner.column_names('news_outbox'):
+        runner.execute('ALTER TABLE news_outbox ADD COLUMN failed_at DATETIME NULL')
+
+
+# (version, description, step) in application order; steps must be safe to re-run
+MIGRATIONS = [
+    (1, 'baseline tables', create_tables),
+    (2, 'legacy columns', upgrade_legacy_columns),
+    (3, 'column types', fix_column_types),
+    (4, 'hot path indexes', create_indexes),
+    (5, 'income accrual', add_income_accrual),
+    (6, 'news outbox', add_news_outbox),
+    (7, 'news failures', add_news_failures)
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+class MigrationRunner:
+    """Applies pending migrations and records each one in schema_version"""
+
+    def __init__(self, database):
+        self.db = database
+        self.conn = None
+
+    @property
+    def is_mysql(self):
+        return self.db.use_mysql
+
+    def run(self):
+        """Bring the schema up to SCHEMA_VERSION, returning the version reached"""
+        with self.db.get_connection() as conn:
+            self.conn = conn
+            try:
+                # An up-to-date database costs this one SELECT; the table is only created when it fails
+                try:
+                    version = self.current_version()
+                except (sqlite3.OperationalError, mysql.connector.ProgrammingError):
+                    self.execute('''
+                        CREATE TABLE IF NOT EXISTS schema_version (
+                            version INTEGER PRIMARY KEY,
+                            description VARCHAR(255) NOT NULL,
+                            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                        )
+                    ''')
+                    version = self.current_version()
+                if version >= SCHEMA_VERSION:
+                    return version
+
+                for number, description, step in MIGRATIONS:
+                    if number <= version:
+                        continue
+                    logger.info(f"Applying schema migration {number}: {description}")
+                    step(self)
+                    self.db.execute('INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                                    (number, description), conn=conn)
+                    conn.commit()
+                    version = number
+
+                logger.info(f"Database schema at version {version}")
+                return version
+            finally:
+                self.conn = None
+
+    def current_version(self):
+        """Highest applied migration, 0 for a fresh or pre-migration database"""
+        row = self.db.fetch_one('SELECT MAX(version) AS version FROM schema_version', conn=self.conn)
+        return (row['version'] or 0) if row else 0
+
+    def execute(self, sql):
+        """Run one DDL statement with the backend id type filled in"""
+        self.db.execute(sql.replace('{id_type}', 'BIGINT' if self.is_mysql else 'INTEGER'), conn=self.conn)
+
+    def table_exists(self, table):
+        if self.is_mysql:
+            sql = '''SELECT 1 AS found FROM information_schema.tables
+                     WHERE table_schema = DATABASE() AND table_name = ?'''
+        else:
+            sql = "SELECT 1 AS found FROM sqlite_master WHERE type = 'table' AND name = ?"
+        return self.db.fetch_one(sql, (table,), conn=self.conn) is not None
+
+    def column_names(self, table):
+        if self.is_mysql:
+            rows = self.db.fetch_all('''
+                SELECT column_name AS name FROM information_schema.columns
+                WHERE table_schema = DATABASE() AND table_name = ?
+            ''', (table,), conn=self.conn)
+        else:
+            rows = self.db.fetch_all(f'PRAGMA table_info({self.db.dialect.quote(table)})', conn=self.conn)
+        return {row['name'] for row in rows}
+
+    def ensure_column_type(self, table, column, data_type, definition):
+        """MySQL only: MODIFY a column whose type differs from data_type"""
+        row = self.db.fetch_one('''
+            SELECT data_type AS data_type FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = ? AND column_name = ?
+        ''', (table, column), conn=self.conn)
+        if row and row['data_type'].lower() != data_type:
+            logger.info(f"Changing {table}.{column} from {row['data_type']} to {definition}")
+            self.db.execute(f'ALTER TABLE {table} MODIFY {column} {definition}', conn=self.conn)
+
+    def create_index(self, name, table, columns):
+        """CREATE INDEX unless an index of that name already exists on the table"""
+        if self.is_mysql:
+            sql = '''SELECT 1 AS found FROM information_schema.statistics
+                     WHERE table_schema = DATABASE() AND table_name = ? AND index_name = ?'''
+            params = (table, name)
+        else:
+            sql = "SELECT 1 AS found FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND name = ?"
+            params = (table, name)
+        if self.db.fetch_one(sql, params, conn=self.conn) is None:
+            self.db.execute(f'CREATE INDEX {name} ON {table} ({", ".join(columns)})', conn=self.conn)
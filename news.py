@@ -2,9 +2,9 @@ import logging
 import asyncio
 import random
 from telegram import Bot
-from telegram.error import TelegramError
 from config import Config
 from datetime import datetime
+from news_dispatcher import NewsDispatcher
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +13,10 @@ class NewsChannel:
         self.channel_id = Config.BOT_CONFIG['news_channel']
         self.bot = None
 
+        # Posts are queued and sent within Telegram's flood limits; convoy bursts become digests
+        self.dispatcher = NewsDispatcher(**Config.NEWS_CONFIG)
+        self.dispatcher.register_digest('convoy', self.format_convoy_digest)
+
         # Message templates for variety
         self.player_joined_templates = [
             "🎮 بازیکن جدید!\n\n{flag} <b>{country}</b> توسط {username} تصرف شد!\n\nجمعیت اولیه: 1,000,000 نفر\nسرمایه اولیه: $100,000\n\nخوش آمدید به جنگ جهانی! 🌍",
@@ -74,25 +78,50 @@ class NewsChannel:
     def set_bot(self, bot):
         """Set bot instance"""
         self.bot = bot
+        self.dispatcher.set_bot(bot)
 
-    async def send_news(self, message):
-        """Send news to channel"""
-        if not self.bot:
-            logger.error("Bot not set for news channel")
-            return False
+    async def start(self):
+        """Start sending queued news"""
+        await self.dispatcher.start()
 
-        try:
-            await self.bot.send_message(chat_id=self.channel_id, text=message, parse_mode='HTML')
-            logger.info(f"📢 News sent to {self.channel_id}: {message[:50]}...")
-            return True
-        except TelegramError as e:
-            logger.error(f"Failed to send news to channel: {e}")
+    async def stop(self):
+        """Send what is still queued and stop"""
+        await self.dispatcher.stop()
+
+    async def send_news(self, message, priority=NewsDispatcher.NORMAL, coalesce=None, keyboard=None, on_sent=None,
+                        on_failed=None):
+        """Queue news for the channel (returns without waiting for Telegram)"""
+        send_kwargs = {'parse_mode': 'HTML'}
+        if keyboard:
+            send_kwargs['reply_markup'] = keyboard
+        return self.dispatcher.enqueue(self.channel_id, message, priority, coalesce, on_sent, on_failed, **send_kwargs)
+
+    async def send_event(self, event, payload, on_sent=None, on_failed=None):
+        """Post a news_outbox event; False for an event type this channel does not know"""
+        if event == 'war':
+            await self.send_war_news(payload['attacker_country'], payload['defender_country'], payload['result'],
+                                     on_sent=on_sent, on_failed=on_failed)
+        elif event == 'convoy':
+            await self.send_convoy_news(payload['message'], None, payload.get('cargo'), on_sent=on_sent,
+                                        on_failed=on_failed)
+        elif event == 'marketplace_purchase':
+            await self.send_marketplace_purchase(payload, on_sent=on_sent, on_failed=on_failed)
+        elif event == 'text':
+            await self.send_text_message(payload['message'], on_sent=on_sent, on_failed=on_failed)
+        else:
             return False
+        return True
+
+    def format_convoy_digest(self, messages):
+        """One convoy post, or several delivered in the same minute"""
+        if len(messages) == 1:
+            return f"🚛 انتقال منابع\n\n{messages[0]}"
+        return f"🚛 انتقال منابع ({len(messages)} محموله)\n\n" + "\n\n───────────────\n\n".join(messages)
 
-    async def send_convoy_news(self, message, keyboard=None, cargo_details=None):
+    async def send_convoy_news(self, message, keyboard=None, cargo_details=None, on_sent=None, on_failed=None):
         """Send convoy news with optional keyboard and detailed cargo info"""
         try:
-            full_message = f"🚛 انتقال منابع\n\n{message}"
+            full_message = message
 
             if cargo_details:
                 full_message += "\n\n📦 جزئیات محموله:"
@@ -107,20 +136,11 @@ class NewsChannel:
                         full_message += f"\n{resource_emoji} {resource_name}: {amount:,}"
 
             if keyboard:
-                await self.bot.send_message(
-                    chat_id=self.channel_id,
-                    text=full_message,
-                    parse_mode='HTML',
-                    reply_markup=keyboard
-                )
+                # Posts with buttons are never merged
+                await self.send_news(self.format_convoy_digest([full_message]), keyboard=keyboard, on_sent=on_sent,
+                                     on_failed=on_failed)
             else:
-                await self.bot.send_message(
-                    chat_id=self.channel_id,
-                    text=full_message,
-                    parse_mode='HTML'
-                )
-
-            logger.info(f"📢 Convoy news sent to {self.channel_id}: 🚛 انتقال منابع...")
+                await self.send_news(full_message, coalesce='convoy', on_sent=on_sent, on_failed=on_failed)
         except Exception as e:
             logger.error(f"Failed to send convoy news: {e}")
 
@@ -222,7 +242,7 @@ class NewsChannel:
                 message += f"\n{resource_emoji} {resource_name}: {amount:,}"
 
         message += "\n\n───────────────"
-        await self.send_news(message)
+        await self.send_news(message, NewsDispatcher.URGENT)
 
     async def send_official_statement(self, country_name, statement, with_penalty_button=False):
         """Send official statement to news channel"""
@@ -356,29 +376,31 @@ class NewsChannel:
 
         await self.send_news(message)
 
-    async def send_text_message(self, message):
+    async def send_text_message(self, message, priority=NewsDispatcher.NORMAL, on_sent=None, on_failed=None):
         """Send a text message to the news channel"""
         message += "\n\n───────────────"
-        await self.send_news(message)
+        await self.send_news(message, priority, on_sent=on_sent, on_failed=on_failed)
 
-    async def send_marketplace_purchase(self, result):
+    async def send_message_with_keyboard(self, message, keyboard):
+        """Send a text message with inline buttons to the news channel"""
+        message += "\n\n───────────────"
+        await self.send_news(message, keyboard=keyboard)
+
+    async def send_marketplace_purchase(self, result, on_sent=None, on_failed=None):
         """Send marketplace purchase news"""
         try:
-            if not self.bot:
-                return
-
             purchase_text = f"""🛒 خرید از فروشگاه
 
-{result.get('buyer_country', 'کشور خریدار')} کالایی را از {result.get('seller_country', 'کشور فروشنده')} خریداری کرد.
+{result.get('buyer_country') or 'کشور خریدار'} کالایی را از {result.get('seller_country') or 'کشور فروشنده'} خریداری کرد.
 
 🚚 محموله در حال ارسال است..."""
 
-            await self.bot.send_message(chat_id=self.channel_id, text=purchase_text)
+            self.dispatcher.enqueue(self.channel_id, purchase_text, on_sent=on_sent, on_failed=on_failed)
 
         except Exception as e:
             logger.error(f"Error sending marketplace news: {e}")
 
-    async def send_war_news(self, attacker_country, defender_country, result):
+    async def send_war_news(self, attacker_country, defender_country, result, on_sent=None, on_failed=None):
         """Send war news to channel"""
         if result['success']:
             if result.get('conquest_mode'):
@@ -439,7 +461,7 @@ class NewsChannel:
                         weapon_name = weapon_config.get('name', loss_type)
                         message += f"\n• {weapon_name}: {amount:,}"
 
-        await self.send_text_message(message)
+        await self.send_text_message(message, NewsDispatcher.URGENT, on_sent, on_failed)
 
     async def send_official_statement(self, country_name, statement, with_penalty_button=False):
         """Send official statement to news channel"""
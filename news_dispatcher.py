@@ -0,0 +1,278 @@
+"""
+DragonRP News Dispatcher
+Rate-limited outbound queue for channel posts; bursts are merged into digests
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from datetime import timedelta
+
+from telegram.error import BadRequest, NetworkError, RetryAfter, TelegramError
+
+logger = logging.getLogger(__name__)
+
+MAX_MESSAGE_LENGTH = 4096
+
+
+class TokenBucket:
+    """rate tokens per second, at most capacity banked"""
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self):
+        """Seconds until a token is available (0 when one is)"""
+        now = self.clock()
+        self._refill(now)
+        wait = max(0.0, self.blocked_until - now)
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return wait
+
+    def take(self):
+        self._refill(self.clock())
+        self.tokens -= 1
+
+    def pause(self, seconds):
+        """Hold every send for seconds (Telegram asked us to retry later)"""
+        now = self.clock()
+        self._refill(now)
+        self.tokens = 0
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+
+class NewsDispatcher:
+    """Bounded priority queue drained by one task within Telegram's flood limits
+
+    enqueue() never waits: callers post and return while the dispatcher paces
+    the sends, backs off on RetryAfter and folds coalesced posts into digests.
+    """
+
+    URGENT = 0   # war results
+    NORMAL = 1   # regular news
+    DIGEST = 2   # merged bursts
+
+    def __init__(self, bot=None, queue_size=500, global_rate=25, chat_rate=20, chat_burst=3,
+                 digest_window=60, max_retries=5, clock=time.monotonic):
+        self.bot = bot
+        self.queue_size = queue_size
+        self.chat_rate = chat_rate / 60    # Telegram caps groups and channels per minute
+        self.chat_burst = chat_burst
+        self.digest_window = digest_window
+        self.max_retries = max_retries
+        self.clock = clock
+        self.global_bucket = TokenBucket(global_rate, global_rate, clock)
+        self._chat_buckets = {}
+        self._queue = []            # (priority, sequence, chat_id, text, send_kwargs, attempts, (on_sent, on_failed) pairs)
+        self._sequence = itertools.count()
+        self._digests = {}          # (chat_id, key) -> ([(text, callbacks)], send_kwargs, timer) until the window closes
+        self._formatters = {}
+        self._wakeup = None
+        self._task = None
+        self.sent = 0
+        self.dropped = 0
+
+    def set_bot(self, bot):
+        """Set bot instance"""
+        self.bot = bot
+
+    def register_digest(self, key, formatter):
+        """formatter(texts) renders the posts coalesced under key as one message"""
+        self._formatters[key] = formatter
+
+    @property
+    def pending(self):
+        """Posts queued or waiting in a digest"""
+        return len(self._queue) + sum(len(posts) for posts, _, _ in self._digests.values())
+
+    def enqueue(self, chat_id, text, priority=NORMAL, coalesce=None, on_sent=None, on_failed=None, **send_kwargs):
+        """Queue a post; coalesce names the digest it may be merged into
+
+        on_sent() is called once Telegram has accepted the message carrying the post,
+        on_failed() once Telegram rejected it or its retries ran out. A post dropped
+        because the queue is full, or still queued at stop(), gets neither.
+        Returns False when the post was dropped because the queue is full.
+        """
+        callbacks = (on_sent, on_failed) if on_sent or on_failed else None
+        if coalesce is not None:
+            return self._add_to_digest(chat_id, coalesce, text, callbacks, send_kwargs)
+        return self._push((priority, next(self._sequence), chat_id, text, send_kwargs, 0,
+                           (callbacks,) if callbacks else ()))
+
+    def _push(self, item):
+        if len(self._queue) >= self.queue_size:
+            # Drop the least urgent, newest post (possibly this one)
+            lowest = max(self._queue)
+            if item >= lowest:
+                self.dropped += 1
+                logger.warning(f"News queue full, dropped post for {item[2]}")
+                return False
+            self._queue.remove(lowest)
+            heapq.heapify(self._queue)
+            self.dropped += 1
+            logger.warning(f"News queue full, dropped post for {lowest[2]}")
+
+        heapq.heappush(self._queue, item)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    def _add_to_digest(self, chat_id, key, text, callbacks, send_kwargs):
+        digest = self._digests.get((chat_id, key))
+        if digest is None:
+            timer = asyncio.get_running_loop().call_later(self.digest_window, self._flush_digest, chat_id, key)
+            digest = self._digests[(chat_id, key)] = ([], send_kwargs, timer)
+        digest[0].append((text, callbacks))
+        return True
+
+    def _flush_digest(self, chat_id, key):
+        """Close a digest window: queue its posts as few messages as fit"""
+        digest = self._digests.pop((chat_id, key), None)
+        if digest is None:
+            return
+        posts, send_kwargs, timer = digest
+        timer.cancel()
+        formatter = self._formatters.get(key, '\n\n'.join)
+
+        group, callbacks = [], []
+        for text, post_callbacks in posts:
+            if group and len(formatter(group + [text])) > MAX_MESSAGE_LENGTH:
+                self._push_digest(chat_id, formatter(group), send_kwargs, callbacks)
+                group, callbacks = [], []
+            group.append(text)
+            if post_callbacks:
+                callbacks.append(post_callbacks)
+        self._push_digest(chat_id, formatter(group), send_kwargs, callbacks)
+
+    def _push_digest(self, chat_id, text, send_kwargs, callbacks):
+        self._push((self.DIGEST, next(self._sequence), chat_id, text, send_kwargs, 0, tuple(callbacks)))
+
+    def flush_digests(self):
+        """Queue every open digest now (shutdown)"""
+        for chat_id, key in list(self._digests):
+            self._flush_digest(chat_id, key)
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst, self.clock)
+        return bucket
+
+    def _next_ready(self):
+        """(item, 0) for the most urgent post that may go now, else (None, seconds to wait)"""
+        global_wait = self.global_bucket.delay()
+        if global_wait > 0:
+            return None, global_wait
+
+        if self._chat_bucket(self._queue[0][2]).delay() == 0:
+            return heapq.heappop(self._queue), 0
+
+        # The most urgent post's chat is throttled; another chat may be free
+        wait = None
+        for item in sorted(self._queue):
+            chat_wait = self._chat_bucket(item[2]).delay()
+            if chat_wait == 0:
+                self._queue.remove(item)
+                heapq.heapify(self._queue)
+                return item, 0
+            wait = chat_wait if wait is None else min(wait, chat_wait)
+        return None, wait
+
+    async def start(self):
+        """Begin sending queued posts on the running event loop"""
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info(f"News dispatcher started with {self.pending} queued posts")
+
+    async def stop(self, drain_timeout=5):
+        """Send what is queued (digests included) for up to drain_timeout seconds, then stop"""
+        if self._task is None:
+            return
+        self.flush_digests()
+        deadline = self.clock() + drain_timeout
+        while self._queue and self.clock() < deadline:
+            await asyncio.sleep(0.1)
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._queue:
+            logger.warning(f"News dispatcher stopped with {len(self._queue)} unsent posts")
+
+    async def _run(self):
+        while True:
+            # Clear before reading the queue so an enqueue racing with us is not lost
+            self._wakeup.clear()
+            item, wait = self._next_ready() if self._queue else (None, None)
+            if item is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._send(item)
+
+    async def _send(self, item):
+        priority, sequence, chat_id, text, send_kwargs, attempts, callbacks = item
+        self.global_bucket.take()
+        self._chat_bucket(chat_id).take()
+        try:
+            await self.bot.send_message(chat_id=chat_id, text=text, **send_kwargs)
+            self.sent += 1
+            logger.info(f"📢 News sent to {chat_id}: {text[:50]}...")
+            for on_sent, _ in callbacks:
+                if on_sent:
+                    on_sent()
+            return
+        except RetryAfter as e:
+            retry_after = e.retry_after
+            if isinstance(retry_after, timedelta):
+                retry_after = retry_after.total_seconds()
+            logger.warning(f"Flood limit for {chat_id}, retrying in {retry_after}s")
+            self._chat_bucket(chat_id).pause(retry_after)
+        except BadRequest as e:
+            logger.error(f"News rejected by Telegram for {chat_id}: {e}")
+            self._fail(callbacks)
+            return
+        except NetworkError as e:
+            # Timeouts included; back off exponentially on this chat
+            logger.warning(f"Network error sending news to {chat_id}: {e}")
+            self._chat_bucket(chat_id).pause(2 ** attempts)
+        except TelegramError as e:
+            logger.error(f"Failed to send news to {chat_id}: {e}")
+            self._fail(callbacks)
+            return
+        except Exception as e:
+            logger.error(f"Error sending news to {chat_id}: {e}")
+            self._fail(callbacks)
+            return
+
+        if attempts + 1 >= self.max_retries:
+            self.dropped += 1
+            logger.error(f"Giving up on news for {chat_id} after {attempts + 1} attempts")
+            self._fail(callbacks)
+            return
+        # Retries keep their place ahead of newer posts of the same priority
+        self._push((priority, sequence, chat_id, text, send_kwargs, attempts + 1, callbacks))
+
+    def _fail(self, callbacks):
+        """The post will not be sent: tell its owners so they stop offering it"""
+        for _, on_failed in callbacks:
+            if on_failed:
+                on_failed()
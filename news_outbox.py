@@ -0,0 +1,122 @@
+"""
+DragonRP News Outbox
+Delivers news events committed to the news_outbox table through the news channel
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+
+class NewsOutbox:
+    """Background flusher: claim a batch of unsent rows, post them, record the acks
+
+    Delivery is at least once: a row is only marked sent after Telegram accepted
+    it, and rows offered but never acknowledged (queue full, shutdown, crash) are
+    offered again after redeliver_after seconds or on the next start. A row
+    Telegram rejected, or whose retries ran out, is marked failed and not offered
+    again.
+    """
+
+    def __init__(self, database, news, batch_size=50, flush_interval=3, redeliver_after=600,
+                 retention_days=7, run_blocking=asyncio.to_thread):
+        self.db = database
+        self.news = news
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.redeliver_after = timedelta(seconds=redeliver_after)
+        self.retention = timedelta(days=retention_days)
+        self.run_blocking = run_blocking
+        self._sent = []
+        self._failed = []
+        self._wakeup = None
+        self._task = None
+        self._last_purge = None
+
+    def notify(self):
+        """Flush now rather than at the next interval (call from the event loop)"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _acknowledge(self, news_id):
+        return lambda: self._sent.append(news_id)
+
+    def _reject(self, news_id):
+        return lambda: self._failed.append(news_id)
+
+    async def start(self):
+        """Start the news channel and the flusher"""
+        await self.news.start()
+        # Offers from a previous run were never acknowledged
+        released = await self.run_blocking(self.db.release_news_offers)
+        if released:
+            logger.info(f"Re-offering {released} undelivered news events")
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop flushing, let the channel drain and record what was delivered"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.news.stop()
+        await self._record_sent()
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing news outbox: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def flush(self):
+        """Record acknowledged rows and offer the next batch; returns the number offered"""
+        await self._record_sent()
+
+        now = datetime.now()
+        # Leave the rest in the table while the channel's queue is backed up
+        room = self.news.dispatcher.queue_size - self.news.dispatcher.pending
+        rows = []
+        if room > 0:
+            rows = await self.run_blocking(self.db.claim_pending_news, min(self.batch_size, room),
+                                           now - self.redeliver_after)
+        for row in rows:
+            if not await self.news.send_event(row['event'], row['payload'], self._acknowledge(row['id']),
+                                              self._reject(row['id'])):
+                logger.error(f"Unknown news event '{row['event']}' (outbox id {row['id']}), discarding")
+                self._sent.append(row['id'])
+
+        if self._last_purge is None or now - self._last_purge > timedelta(hours=1):
+            self._last_purge = now
+            await self.run_blocking(self.db.purge_sent_news, now - self.retention)
+        return len(rows)
+
+    async def _record_sent(self):
+        sent, self._sent = self._sent, []
+        if sent:
+            try:
+                await self.run_blocking(self.db.mark_news_sent, sent)
+            except Exception:
+                # Keep the acks for the next flush rather than posting these twice
+                self._sent.extend(sent)
+                raise
+
+        failed, self._failed = self._failed, []
+        if failed:
+            logger.warning(f"Giving up on {len(failed)} news events Telegram would not accept")
+            try:
+                await self.run_blocking(self.db.mark_news_failed, failed)
+            except Exception:
+                self._failed.extend(failed)
+                raise
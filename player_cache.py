@@ -0,0 +1,105 @@
+"""
+DragonRP Player State Cache
+In-process read-through cache for the players, resources, buildings and weapons rows
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class PlayerStateCache:
+    """Per-player row cache with TTL expiry, LRU eviction and write invalidation"""
+
+    TABLES = ('player', 'resources', 'buildings', 'weapons')
+
+    def __init__(self, max_players=1000, ttl=30):
+        self.max_players = max_players
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+        # user_id -> {table: (expires_at, row)}
+        self._entries = OrderedDict()
+        # user_id -> invalidation counter, guards against caching rows read before a write
+        self._generations = {}
+        self._global_generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, user_id, table):
+        """Return (found, row copy) for a cached row"""
+        with self._lock:
+            rows = self._entries.get(user_id)
+            cached = rows.get(table) if rows else None
+            if cached is None or cached[0] < time.monotonic():
+                self.misses += 1
+                return False, None
+
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            row = cached[1]
+
+        return True, self._copy(row)
+
+    def generation(self, user_id):
+        """Token taken before a DB read; put() drops the row if a write happened since"""
+        with self._lock:
+            return (self._global_generation, self._generations.get(user_id, 0))
+
+    def put(self, user_id, table, row, generation=None):
+        """Store a freshly loaded row"""
+        with self._lock:
+            current = (self._global_generation, self._generations.get(user_id, 0))
+            if generation is not None and generation != current:
+                return
+
+            rows = self._entries.get(user_id)
+            if rows is None:
+                rows = self._entries[user_id] = {}
+            rows[table] = (time.monotonic() + self.ttl, self._copy(row))
+            self._entries.move_to_end(user_id)
+
+            while len(self._entries) > self.max_players:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id, *tables):
+        """Drop cached rows for a player (all tables when none are given)"""
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            rows = self._entries.get(user_id)
+            if not rows:
+                return
+            if tables:
+                for table in tables:
+                    rows.pop(table, None)
+            else:
+                del self._entries[user_id]
+
+    def invalidate_many(self, user_ids, *tables):
+        """Drop cached rows for several players"""
+        for user_id in user_ids:
+            self.invalidate(user_id, *tables)
+
+    def clear(self):
+        """Drop everything (bulk writes, resets)"""
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+            self._global_generation += 1
+
+    def stats(self):
+        """Hit/miss counters for the admin panel"""
+        total = self.hits + self.misses
+        return {
+            'players': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits / total) if total else 0.0
+        }
+
+    @staticmethod
+    def _copy(row):
+        return dict(row) if row is not None else None
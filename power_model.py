@@ -0,0 +1,118 @@
+"""
+DragonRP Power Model
+Precompiled attack/defense/military weight vectors aligned to the weapons table
+"""
+
+import logging
+from operator import mul
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, plain lists work for 35 countries
+    np = None
+
+logger = logging.getLogger(__name__)
+
+
+class PowerModel:
+    """Weapon power as dot products of inventory vectors with per-column weights"""
+
+    def __init__(self, columns, config):
+        # Table columns first so a DB row maps straight onto the vector
+        self.columns = list(columns) + [w for w in config.WEAPONS if w not in set(columns)]
+        self._position = {column: i for i, column in enumerate(self.columns)}
+
+        combat = config.COMBAT_CONFIG
+        full_defense = set(combat['full_defense_weapons'])
+        non_attack = set(combat['non_attack_categories'])
+        defense_share = combat['base_defense_multiplier']
+
+        military, attack, defense, categories = [], [], [], []
+        for column in self.columns:
+            spec = config.WEAPONS.get(column) or {}
+            power = spec.get('power', 0)
+
+            military.append(power)
+            attack.append(0 if spec.get('category') in non_attack or column in full_defense else power)
+            defense.append(power if column in full_defense else power * defense_share)
+            categories.append(spec.get('category'))
+
+        self.military_weights = self._array(military)
+        self.attack_weights = self._array(attack)
+        self.defense_weights = self._array(defense, float)
+        self.category_masks = {
+            category: self._array([1 if c == category else 0 for c in categories])
+            for category in set(categories) if category
+        }
+
+        logger.info(f"Power model compiled for {len(self.columns)} weapon columns "
+                    f"({'numpy' if np is not None else 'lists'})")
+
+    @staticmethod
+    def _array(values, dtype=int):
+        if np is not None:
+            return np.array(values, dtype=np.float64 if dtype is float else np.int64)
+        return [dtype(v) for v in values]
+
+    def vector(self, weapons):
+        """Inventory dict -> count vector (negative and missing counts are zero)"""
+        counts = [0] * len(self.columns)
+        for weapon_type, count in weapons.items():
+            i = self._position.get(weapon_type)
+            if i is not None and count and count > 0:
+                counts[i] = count
+        return self._array(counts)
+
+    def matrix(self, inventories):
+        """List of inventory dicts -> one count row per inventory"""
+        rows = [self.vector(weapons) for weapons in inventories]
+        if np is not None:
+            return np.vstack(rows) if rows else np.zeros((0, len(self.columns)), dtype=np.int64)
+        return rows
+
+    @staticmethod
+    def _dot(counts, weights):
+        if np is not None:
+            return counts @ weights
+        return sum(map(mul, counts, weights))
+
+    def _scalar(self, counts, weights, cast):
+        return cast(self._dot(counts, weights))
+
+    def attack_power(self, weapons):
+        """Offensive power (transport and full-defense weapons excluded)"""
+        return self._scalar(self.vector(weapons), self.attack_weights, int)
+
+    def defense_power(self, weapons):
+        """Full power of defense systems plus a share of everything else"""
+        return self._scalar(self.vector(weapons), self.defense_weights, float)
+
+    def military_power(self, weapons):
+        """Total power of every weapon"""
+        return self._scalar(self.vector(weapons), self.military_weights, int)
+
+    def category_count(self, weapons, category):
+        """Number of units in a weapon category"""
+        mask = self.category_masks.get(category)
+        if mask is None:
+            return 0
+        return self._scalar(self.vector(weapons), mask, int)
+
+    def powers(self, inventories):
+        """{user_id: {'attack','defense','military'}} for many players at once"""
+        user_ids = list(inventories)
+        counts = self.matrix([inventories[uid] for uid in user_ids])
+
+        if np is not None:
+            attack = counts @ self.attack_weights
+            defense = counts @ self.defense_weights
+            military = counts @ self.military_weights
+        else:
+            attack = [self._dot(row, self.attack_weights) for row in counts]
+            defense = [self._dot(row, self.defense_weights) for row in counts]
+            military = [self._dot(row, self.military_weights) for row in counts]
+
+        return {
+            uid: {'attack': int(attack[i]), 'defense': float(defense[i]), 'military': int(military[i])}
+            for i, uid in enumerate(user_ids)
+        }
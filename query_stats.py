@@ -0,0 +1,187 @@
+"""
+DragonRP Query Stats
+Per-method and per-SQL statement timings, connection checkout times and a slow-query log
+"""
+
+import logging
+import math
+import re
+import threading
+from collections import deque
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+_SPACE = re.compile(r'\s+')
+# String and number literals; digits inside identifiers (f22, su57) have no word boundary before them
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+# IN (?, ?, ?) and multi-row VALUES lists of any length share one fingerprint
+_PLACEHOLDER_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+
+
+def fingerprint(sql):
+    """The statement with whitespace collapsed and literals replaced by ?"""
+    sql = _SPACE.sub(' ', sql).strip()
+    sql = _LITERALS.sub('?', sql)
+    return _PLACEHOLDER_LISTS.sub('(?+)', sql)
+
+
+def _percentile(ordered, fraction):
+    """Nearest-rank percentile of an ascending list"""
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+
+class _Series:
+    """Counters of one method, statement or the checkouts, with a window of recent latencies"""
+
+    __slots__ = ('count', 'total', 'rows', 'max', 'recent')
+
+    def __init__(self, samples):
+        self.count = 0
+        self.total = 0.0
+        self.rows = 0
+        self.max = 0.0
+        self.recent = deque(maxlen=samples)
+
+    def add(self, seconds, rows):
+        self.count += 1
+        self.total += seconds
+        self.rows += rows
+        if seconds > self.max:
+            self.max = seconds
+        self.recent.append(seconds)
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        self.rows += other.rows
+        self.max = max(self.max, other.max)
+        self.recent.extend(other.recent)
+
+    def summary(self):
+        ordered = sorted(self.recent)
+        return {
+            'count': self.count,
+            'total_ms': round(self.total * 1000, 3),
+            'mean_ms': round(self.total * 1000 / self.count, 3) if self.count else 0.0,
+            'p50_ms': round(_percentile(ordered, 0.50) * 1000, 3) if ordered else 0.0,
+            'p99_ms': round(_percentile(ordered, 0.99) * 1000, 3) if ordered else 0.0,
+            'max_ms': round(self.max * 1000, 3),
+            'rows': self.rows
+        }
+
+
+class QueryStats:
+    """Statement timings keyed by the calling method and by SQL fingerprint
+
+    Recording is a lock, a few counter updates and a deque append. The method is
+    keyed by its code object and the SQL text maps to its fingerprint through a
+    dict, so names and fingerprints are only worked out once. p50/p99 cover the
+    last `samples` statements of each key. Statements slower than slow_ms go to
+    a ring buffer of the last slow_log_size entries and are logged as warnings.
+    """
+
+    FINGERPRINT_CACHE_SIZE = 4096
+
+    def __init__(self, slow_ms=200, slow_log_size=100, samples=256):
+        self.slow_seconds = slow_ms / 1000
+        self.samples = samples
+        self.started_at = datetime.now()
+
+        # code object of the calling method -> _Series
+        self._methods = {}
+        # fingerprint -> _Series
+        self._statements = {}
+        # sql text -> fingerprint
+        self._fingerprints = {}
+        self._checkouts = _Series(samples)
+        self._slow = deque(maxlen=slow_log_size)
+        self._lock = threading.Lock()
+
+    def record(self, caller, sql, seconds, rows):
+        """Account one statement run from caller (a code object) that took seconds"""
+        statement = self._fingerprints.get(sql)
+        if statement is None:
+            if len(self._fingerprints) >= self.FINGERPRINT_CACHE_SIZE:
+                self._fingerprints.clear()
+            statement = self._fingerprints[sql] = fingerprint(sql)
+
+        with self._lock:
+            series = self._methods.get(caller)
+            if series is None:
+                series = self._methods[caller] = _Series(self.samples)
+            series.add(seconds, rows)
+
+            series = self._statements.get(statement)
+            if series is None:
+                series = self._statements[statement] = _Series(self.samples)
+            series.add(seconds, rows)
+
+            if seconds >= self.slow_seconds:
+                method = _method_name(caller)
+                self._slow.append({
+                    'at': datetime.now().isoformat(timespec='seconds'),
+                    'ms': round(seconds * 1000, 3),
+                    'method': method,
+                    'sql': statement,
+                    'rows': rows
+                })
+            else:
+                method = None
+
+        if method is not None:
+            logger.warning(f"Slow query ({seconds * 1000:.0f} ms) in {method}: {statement[:300]}")
+
+    def record_checkout(self, seconds):
+        """Account the wait for a pooled connection"""
+        with self._lock:
+            self._checkouts.add(seconds, 0)
+
+    @property
+    def statement_count(self):
+        """Statements recorded since the last reset"""
+        with self._lock:
+            return sum(series.count for series in self._statements.values())
+
+    def reset(self):
+        """Start counting afresh"""
+        with self._lock:
+            self._methods.clear()
+            self._statements.clear()
+            self._checkouts = _Series(self.samples)
+            self._slow.clear()
+            self.started_at = datetime.now()
+
+    def snapshot(self, limit=None, order_by='total_ms'):
+        """JSON-ready report; methods and statements sorted by order_by, the top limit of each"""
+        with self._lock:
+            methods = {}
+            for caller, series in self._methods.items():
+                # Methods of the same name (one per module) are reported together
+                name = _method_name(caller)
+                merged = methods.get(name)
+                if merged is None:
+                    merged = methods[name] = _Series(self.samples)
+                merged.merge(series)
+            methods = {name: series.summary() for name, series in methods.items()}
+            statements = {sql: series.summary() for sql, series in self._statements.items()}
+            checkouts = self._checkouts.summary()
+            slow = list(self._slow)
+
+        def ranked(entries, key):
+            rows = [dict(stats, **{key: name}) for name, stats in entries.items()]
+            rows.sort(key=lambda row: row[order_by], reverse=True)
+            return rows[:limit] if limit else rows
+
+        return {
+            'since': self.started_at.isoformat(timespec='seconds'),
+            'slow_ms': round(self.slow_seconds * 1000, 3),
+            'checkouts': checkouts,
+            'methods': ranked(methods, 'method'),
+            'statements': ranked(statements, 'sql'),
+            'slow_queries': slow
+        }
+
+
+def _method_name(code):
+    return getattr(code, 'co_qualname', code.co_name)
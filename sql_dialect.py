@@ -0,0 +1,117 @@
+"""
+DragonRP SQL Dialect
+Queries are written once in a portable form and compiled for MySQL or SQLite
+
+Portable form:
+- `?` placeholders
+- 'single quoted' string literals ("double quoted" ones are normalised too)
+- `backticks` for quoted identifiers
+- NOW(), GREATEST(), LEAST(), INSERT IGNORE
+- SELECT ... FOR UPDATE (dropped on SQLite, where BEGIN IMMEDIATE already holds the write lock)
+- upserts as `ON CONFLICT(key) DO UPDATE SET col = excluded.col` or `ON CONFLICT DO NOTHING`
+- `INTEGER PRIMARY KEY AUTOINCREMENT` for surrogate keys
+"""
+
+import re
+import threading
+
+# String literals are copied through untouched; everything else may be rewritten
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"")
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+_DO_NOTHING = re.compile(r'\s*\bON\s+CONFLICT\b\s*(?:\([^)]*\))?\s*DO\s+NOTHING\b', re.I)
+_INSERT_INTO = re.compile(r'\bINSERT\s+INTO\b', re.I)
+
+_MYSQL_RULES = [
+    (re.compile(r'\bON\s+CONFLICT\s*\([^)]*\)\s*DO\s+UPDATE\s+SET\b', re.I), 'ON DUPLICATE KEY UPDATE'),
+    (re.compile(r'\bexcluded\.(\w+)', re.I), r'VALUES(\1)'),
+    (re.compile(r'\bINTEGER\s+PRIMARY\s+KEY\s+AUTOINCREMENT\b', re.I), 'BIGINT PRIMARY KEY AUTO_INCREMENT'),
+    (re.compile(r'\bAUTOINCREMENT\b', re.I), 'AUTO_INCREMENT'),
+    (re.compile(r'\?'), '%s'),
+]
+
+_SQLITE_RULES = [
+    (re.compile(r'\bNOW\(\)', re.I), "datetime('now', 'localtime')"),
+    (re.compile(r'\bINSERT\s+IGNORE\b', re.I), 'INSERT OR IGNORE'),
+    (re.compile(r'\bGREATEST\(', re.I), 'MAX('),
+    (re.compile(r'\bLEAST\(', re.I), 'MIN('),
+    (re.compile(r'\bAUTO_INCREMENT\b', re.I), 'AUTOINCREMENT'),
+    (re.compile(r'\s+FOR\s+UPDATE\b', re.I), ''),
+]
+
+
+class SQLDialect:
+    """Compiles portable SQL for one backend and caches the result by statement text"""
+
+    def __init__(self, name, max_cached=2048):
+        if name not in ('mysql', 'sqlite'):
+            raise ValueError(f"Unknown SQL dialect: {name}")
+        self.name = name
+        self.placeholder = '%s' if name == 'mysql' else '?'
+        self.max_cached = max_cached
+        self._rules = _MYSQL_RULES if name == 'mysql' else _SQLITE_RULES
+        self._compiled = {}
+        self._lock = threading.Lock()
+
+    def compile(self, sql):
+        """Backend-specific text for a portable statement"""
+        compiled = self._compiled.get(sql)
+        if compiled is None:
+            compiled = self._compile(sql)
+            with self._lock:
+                if len(self._compiled) >= self.max_cached:
+                    self._compiled.clear()
+                self._compiled[sql] = compiled
+        return compiled
+
+    def _compile(self, sql):
+        if self.name == 'mysql' and _DO_NOTHING.search(sql):
+            # MySQL has no ON CONFLICT; DO NOTHING becomes INSERT IGNORE
+            sql = _INSERT_INTO.sub('INSERT IGNORE INTO', _DO_NOTHING.sub('', sql), count=1)
+
+        parts = []
+        position = 0
+        for match in _LITERALS.finditer(sql):
+            parts.append(self._rewrite(sql[position:match.start()]))
+            parts.append(self._literal(match.group()))
+            position = match.end()
+        parts.append(self._rewrite(sql[position:]))
+        return ''.join(parts)
+
+    def _rewrite(self, code):
+        for pattern, replacement in self._rules:
+            code = pattern.sub(replacement, code)
+        return code
+
+    @staticmethod
+    def _literal(text):
+        """Normalise a "double quoted" literal to 'single quoted' for both backends"""
+        if text[0] == '"':
+            return "'" + text[1:-1].replace('""', '"').replace("'", "''") + "'"
+        return text
+
+    @property
+    def cache_size(self):
+        """Number of compiled statements held"""
+        return len(self._compiled)
+
+    @staticmethod
+    def quote(identifier):
+        """Validate and quote a table or column name (backticks work on both backends)"""
+        if not _IDENTIFIER.match(identifier or ''):
+            raise ValueError(f"Invalid SQL identifier: {identifier!r}")
+        return f"`{identifier}`"
+
+    @staticmethod
+    def placeholders(count):
+        """Portable `?, ?, ...` list for IN clauses and VALUES"""
+        return ', '.join(['?'] * count)
+
+
+MYSQL = SQLDialect('mysql')
+SQLITE = SQLDialect('sqlite')
+
+
+def for_backend(use_mysql):
+    """Shared dialect instance for the active backend"""
+    return MYSQL if use_mysql else SQLITE
@@ -0,0 +1,159 @@
+"""
+DragonRP SQLite Engine
+Single-node SQLite backend: WAL journaling, tuned pragmas and one persistent connection per thread
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+
+from db_pool import ConnectionPool, PooledConnection
+
+logger = logging.getLogger(__name__)
+
+
+def is_busy_error(error):
+    """True for SQLITE_BUSY / SQLITE_LOCKED, which clear once the other writer commits"""
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in message or 'busy' in message)
+
+
+class _ThreadEntry:
+    """A thread's own connection and whether it is checked out"""
+
+    __slots__ = ('raw', 'thread_id', 'busy')
+
+    def __init__(self, raw, thread_id):
+        self.raw = raw
+        self.thread_id = thread_id
+        self.busy = False
+
+
+class SQLiteEngine:
+    """Hands each thread the same open connection on every checkout
+
+    WAL lets readers run alongside the single writer and turns most commits into
+    a sequential log append; synchronous=NORMAL only fsyncs at checkpoints. A
+    checkout made while the thread's connection is already in use (a nested
+    call without conn=) gets a separate connection from a small pool, so it
+    never commits or rolls back the caller's transaction.
+    """
+
+    def __init__(self, path, journal_mode='WAL', synchronous='NORMAL', cache_size_kb=16384,
+                 mmap_size_mb=64, busy_timeout=5.0, busy_retries=2, retry_backoff=0.05,
+                 statement_cache_size=256, **pool_settings):
+        self.path = path
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size_mb = mmap_size_mb
+        self.busy_timeout = busy_timeout
+        self.busy_retries = busy_retries
+        self.retry_backoff = retry_backoff
+        self.statement_cache_size = statement_cache_size
+        self.retries = 0
+
+        self._local = threading.local()
+        # thread ident -> entry, so dispose() can close every thread's connection
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._overflow = ConnectionPool(self.connect, reset=self.reset, name='sqlite-overflow', **pool_settings)
+
+    def connect(self):
+        """Open a connection with the engine's pragmas applied"""
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout,
+            check_same_thread=False,
+            cached_statements=self.statement_cache_size,
+            uri=self.path.startswith('file:')
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma in self.pragma_statements():
+            conn.execute(pragma)
+        return conn
+
+    def pragma_statements(self):
+        """PRAGMAs run on every new connection (also used by the async backend)"""
+        return [
+            f'PRAGMA journal_mode = {self.journal_mode}',
+            f'PRAGMA synchronous = {self.synchronous}',
+            # Negative cache_size is in KiB rather than pages
+            f'PRAGMA cache_size = {-int(self.cache_size_kb)}',
+            f'PRAGMA mmap_size = {int(self.mmap_size_mb) * 1024 * 1024}',
+            'PRAGMA temp_store = MEMORY'
+        ]
+
+    @staticmethod
+    def reset(conn):
+        """Roll back anything a caller left uncommitted"""
+        if conn.in_transaction:
+            conn.rollback()
+
+    def acquire(self):
+        """The calling thread's connection, or a pooled one when it is already in use"""
+        entry = getattr(self._local, 'entry', None)
+        if entry is None:
+            entry = self._local.entry = self._open_thread_entry()
+        if entry.busy:
+            return self._overflow.acquire()
+        entry.busy = True
+        return PooledConnection(self, entry)
+
+    def release(self, entry):
+        """Called when a checked-out thread connection is closed"""
+        try:
+            self.reset(entry.raw)
+        except Exception as e:
+            logger.warning(f"Reopening SQLite connection that failed reset: {e}")
+            self._close_entry(entry)
+            self._local.entry = None
+        finally:
+            entry.busy = False
+
+    def retry_busy(self, call, *args):
+        """call(*args), retried with backoff while another writer holds the lock past busy_timeout
+
+        Only safe for a statement that is its own transaction, or for BEGIN.
+        """
+        for attempt in range(self.busy_retries + 1):
+            try:
+                return call(*args)
+            except sqlite3.OperationalError as e:
+                if attempt == self.busy_retries or not is_busy_error(e):
+                    raise
+                self.retries += 1
+                logger.warning(f"SQLite busy, retrying ({attempt + 1}/{self.busy_retries}): {e}")
+                time.sleep(self.retry_backoff * 2 ** attempt)
+
+    def dispose(self):
+        """Close every thread's connection and the overflow pool (at shutdown)"""
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            self._close_entry(entry)
+        self._local = threading.local()
+        self._overflow.dispose()
+
+    def _open_thread_entry(self):
+        thread_id = threading.get_ident()
+        entry = _ThreadEntry(self.connect(), thread_id)
+        alive = {thread.ident for thread in threading.enumerate()}
+        with self._lock:
+            # Connections of threads that have exited are never checked out again
+            dead = [self._entries.pop(ident) for ident in list(self._entries) if ident not in alive]
+            self._entries[thread_id] = entry
+        for stale in dead:
+            self._close_entry(stale)
+        return entry
+
+    def _close_entry(self, entry):
+        with self._lock:
+            if self._entries.get(entry.thread_id) is entry:
+                del self._entries[entry.thread_id]
+        try:
+            entry.raw.close()
+        except Exception:
+            pass
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Test the async database API (native with aiosqlite, otherwise through the executor)"""
+
+import asyncio
+import os
+import tempfile
+import threading
+
+from async_database import AsyncDatabase
+from database import Database
+
+
+def make_database():
+    db = Database()
+    db.use_mysql = False
+    db.sqlite_db_path = os.path.join(tempfile.mkdtemp(), 'async.db')
+    db.initialize()
+    return db
+
+
+def test_queries_and_transactions():
+    """Reads, writes and transactions behave like the blocking API"""
+    print("=== TESTING ASYNC DATABASE ===")
+    db = make_database()
+    db.create_player(1, 'alice', 'IR')
+    db.create_player(2, 'bob', 'US')
+
+    async def scenario():
+        adb = AsyncDatabase(db, pool_size=2)
+        await adb.start()
+        print(f"Native driver: {adb.native}")
+        try:
+            countries = await adb.get_all_countries()
+            assert {country['user_id'] for country in countries} == {1, 2}
+
+            async with adb.transaction() as conn:
+                await adb.execute('UPDATE players SET money = money + ? WHERE user_id = ?', (500, 1), conn=conn)
+            try:
+                async with adb.transaction() as conn:
+                    await adb.execute('UPDATE players SET money = 0 WHERE user_id = ?', (1,), conn=conn)
+                    raise RuntimeError('roll back')
+            except RuntimeError:
+                pass
+
+            row = await adb.fetch_one('SELECT money FROM players WHERE user_id = ?', (1,))
+            assert row['money'] == db.fetch_one('SELECT money FROM players WHERE user_id = ?', (1,))['money']
+            return row['money']
+        finally:
+            await adb.close()
+
+    money = asyncio.run(scenario())
+    assert money > 0
+
+
+def test_player_reads_share_the_cache():
+    """Player rows come from the same state cache the blocking reads fill"""
+    db = make_database()
+    db.create_player(1, 'alice', 'IR')
+
+    async def scenario():
+        adb = AsyncDatabase(db, pool_size=1)
+        await adb.start()
+        try:
+            state = await adb.get_player_state(1)
+            assert state['player']['country_code'] == 'IR'
+            assert await adb.get_player_state(99) is None
+            db.apply_delta(1, money=250)
+            return (await adb.get_player(1))['money']
+        finally:
+            await adb.close()
+
+    assert asyncio.run(scenario()) == db.get_player(1)['money']
+
+
+def test_executor_transaction_stays_on_one_thread():
+    """Without a driver, a transaction's begin, statements and commit share one thread"""
+    db = make_database()
+    db.create_player(1, 'alice', 'IR')
+    threads = []
+    execute = db.execute
+
+    def recording_execute(sql, params=(), conn=None):
+        threads.append(threading.current_thread().name)
+        return execute(sql, params, conn)
+
+    db.execute = recording_execute
+
+    async def scenario():
+        adb = AsyncDatabase(db, pool_size=1)  # not started: the executor fallback
+        try:
+            for _ in range(3):
+                async with adb.transaction() as conn:
+                    for _ in range(5):
+                        await adb.execute('UPDATE players SET money = money + ? WHERE user_id = ?', (1, 1), conn=conn)
+            await adb.execute('UPDATE players SET money = money + ? WHERE user_id = ?', (1, 1))
+            return (await adb.fetch_one('SELECT money FROM players WHERE user_id = ?', (1,)))['money']
+        finally:
+            await adb.close()
+
+    before = db.get_player(1)['money']
+    assert asyncio.run(scenario()) == before + 16
+    print(f"Statement threads: {sorted(set(threads))}")
+    assert len(set(threads[:15])) == 1 and threads[0].startswith('db-transaction')
+    assert not threads[15].startswith('db-transaction')
+
+
+if __name__ == "__main__":
+    test_queries_and_transactions()
+    test_player_reads_share_the_cache()
+    test_executor_transaction_stays_on_one_thread()
+    print("✅ All async database tests passed")
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""Test the game benchmark harness on a small world"""
+
+import json
+import os
+import tempfile
+
+import bench_game
+
+
+def test_benchmark_reports_every_operation():
+    """Each hot path is measured, written as JSON and compared against a baseline"""
+    print("=== TESTING GAME BENCHMARK ===")
+    output = os.path.join(tempfile.mkdtemp(), 'bench.json')
+    assert bench_game.main(['--players', '35', '--iterations', '10', '--batch', '5', '--output', output]) == 0
+
+    with open(output) as f:
+        report = json.load(f)
+    operations = report['results']['35']['operations']
+    assert set(operations) == set(bench_game.operations(5))
+    for name, stats in operations.items():
+        print(f"{name}: p50 {stats['p50_ms']}ms, {stats['statements']} statements")
+        assert stats['p50_ms'] <= stats['p99_ms'] <= stats['max_ms']
+    assert operations['income_cycle']['statements'] > 0
+    assert operations['get_available_weapons_for_attack']['statements'] == 0
+
+    # A build that doubled every statement count is flagged
+    assert bench_game.compare(report['results'], report, 0.25) == []
+    baseline = json.loads(json.dumps(report))
+    for stats in report['results']['35']['operations'].values():
+        stats['statements'] *= 2
+    assert any('income_cycle statements' in line for line in bench_game.compare(report['results'], baseline, 0.25))
+
+
+if __name__ == "__main__":
+    test_benchmark_reports_every_operation()
+    print("✅ All game benchmark tests passed")
@@ -1,7 +1,7 @@
 
 import asyncio
 import logging
-from database import Database
+from memory_database import MemoryDatabase
 from admin import AdminPanel
 from game_logic import GameLogic
 from economy import Economy
@@ -20,7 +20,7 @@ logger = logging.getLogger(__name__)
 
 class BotTester:
     def __init__(self):
-        self.db = Database()
+        self.db = MemoryDatabase(initialize=False)
         self.admin = AdminPanel(self.db)
         self.game_logic = GameLogic(self.db)
         self.economy = Economy(self.db)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Test the table-driven callback router"""
+
+import asyncio
+from unittest import mock
+
+from callback_router import CallbackRouter, ACTION
+
+
+class FakeQuery:
+    def __init__(self, data, user_id=1):
+        self.data = data
+        self.from_user = type('User', (), {'id': user_id})()
+        self.edited = []
+
+    async def edit_message_text(self, text, **kwargs):
+        self.edited.append(text)
+
+
+def make_router(calls):
+    def handler(name):
+        async def handle(query, context, *args):
+            calls.append((name, args))
+        return handle
+
+    router = CallbackRouter(is_admin=lambda user_id: user_id == 99)
+    router.exact("marketplace", handler('menu'))
+    router.prefix("market_", handler('market'))
+    router.prefix("convoy_", handler('convoy'), rate_class=ACTION, read_only=False)
+    router.prefix("convoy_escort_", handler('escort'), parse=lambda convoy_id: (int(convoy_id),))
+    router.prefix("admin_", handler('admin'), admin_only=True)
+    return router
+
+
+def test_resolution():
+    """Exact keys beat prefixes and the longest prefix wins"""
+    print("=== TESTING CALLBACK ROUTER ===")
+    calls = []
+    router = make_router(calls)
+
+    async def scenario():
+        for data in ("marketplace", "market_sell", "convoy_steal_5", "convoy_escort_7"):
+            assert await router.dispatch(FakeQuery(data), None)
+        assert not await router.dispatch(FakeQuery("unknown"), None)
+        assert not await router.dispatch(FakeQuery("convoy"), None)
+
+    asyncio.run(scenario())
+    assert calls == [('menu', ()), ('market', ()), ('convoy', ()), ('escort', (7,))]
+    assert router.resolve("convoy_x")[0].read_only is False
+    assert router.stats["convoy_"].calls == 1
+
+
+def test_admin_only():
+    """Admin routes are refused before their handler runs"""
+    calls = []
+    router = make_router(calls)
+    query = FakeQuery("admin_reset")
+
+    asyncio.run(router.dispatch(query, None))
+    assert calls == [] and len(query.edited) == 1
+    asyncio.run(router.dispatch(FakeQuery("admin_reset", user_id=99), None))
+    assert calls == [('admin', ())]
+
+
+def test_bot_routes_exist():
+    """Every handler the bot registers is a real method"""
+    import main
+    from memory_database import MemoryDatabase
+
+    # Build the bot on a throwaway world so the checked-in dragonrp.db is never migrated
+    with mock.patch.object(main, 'Database', MemoryDatabase):
+        bot = main.DragonRPBot()
+    try:
+        assert bot.router.resolve("alliance_members")[0].handler == bot.handle_alliance_action
+        assert bot.router.resolve("propose_peace")[0] is None
+    finally:
+        bot.db.close()
+
+
+if __name__ == "__main__":
+    test_resolution()
+    test_admin_only()
+    test_bot_routes_exist()
+    print("✅ All callback router tests passed")
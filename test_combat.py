@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""Test that battles only move what the defender still holds when they commit"""
+
+import random
+
+from combat import CombatSystem
+from memory_database import MemoryDatabase
+
+
+def test_loot_is_capped_when_defender_state_moved():
+    """Resources spent between the battle and its commit are not credited to the attacker"""
+    print("=== TESTING BATTLE COMMIT ===")
+    db = MemoryDatabase()
+    try:
+        attacker_id, defender_id = db.seed_players(2, weapons={'rifle': 1000})
+        db.apply_delta(defender_id, soldiers=1000, resources={'iron': 1000, 'gold': 500},
+                       buildings={'iron_mine': 4})
+        combat = CombatSystem(db)
+        random.seed(3)
+
+        result = {'attack_power': 100, 'defense_power': 1, 'damage': 99, 'success': True,
+                  'attacker_country': 'a', 'defender_country': 'b', 'attacker_losses': {},
+                  'defender_losses': {}, 'stolen_resources': {}}
+        deltas = combat._apply_successful_attack(attacker_id, defender_id, 99, result, conquest_mode=True)
+        assert result['stolen_resources']['iron'] > 100
+
+        # The defender spends most of its iron and a mine before the battle commits
+        db.apply_delta(defender_id, resources={'iron': -900}, buildings={'iron_mine': -3})
+        combat._commit_battle(attacker_id, defender_id, deltas, result)
+
+        attacker = db.get_player_state(attacker_id)
+        defender = db.get_player_state(defender_id)
+        print(f"Stolen: {result['stolen_resources']}, conquered: {result['conquered_buildings']}")
+        assert result['stolen_resources']['iron'] == 100
+        assert attacker['resources']['iron'] == 100 and defender['resources']['iron'] == 0
+        assert attacker['resources']['gold'] + defender['resources']['gold'] == 500
+        assert result['conquered_buildings']['iron_mine'] == 1
+        assert attacker['buildings']['iron_mine'] == 1 and defender['buildings']['iron_mine'] == 0
+
+        logged = db.fetch_one('SELECT resources_stolen FROM wars WHERE attacker_id = ?', (attacker_id,))
+        assert '"iron": 100' in logged['resources_stolen']
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    test_loot_is_capped_when_defender_state_moved()
+    print("✅ All combat tests passed")
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Test the pooled connection manager"""
+
+import sqlite3
+import time
+
+from db_pool import ConnectionPool, PoolExhaustedError
+
+
+def make_pool(**kwargs):
+    """Pool of in-memory SQLite connections"""
+    opened = []
+
+    def factory():
+        conn = sqlite3.connect(':memory:', check_same_thread=False)
+        opened.append(conn)
+        return conn
+
+    settings = {'pool_size': 2, 'max_overflow': 1, 'timeout': 0.2}
+    settings.update(kwargs)
+    return ConnectionPool(factory, **settings), opened
+
+
+def test_connections_are_reused():
+    """Sequential checkouts should share one connection"""
+    print("=== TESTING CONNECTION REUSE ===")
+    pool, opened = make_pool()
+
+    for _ in range(10):
+        with pool.acquire() as conn:
+            conn.execute("SELECT 1")
+
+    print(f"Opened connections: {len(opened)}")
+    assert len(opened) == 1
+    assert pool.idle_count == 1
+
+
+def test_pool_limit_and_overflow():
+    """Pool grows to size + overflow and then times out"""
+    print("=== TESTING POOL LIMITS ===")
+    pool, opened = make_pool()
+
+    held = [pool.acquire() for _ in range(3)]
+    try:
+        pool.acquire()
+        assert False, "checkout beyond the limit should time out"
+    except PoolExhaustedError as e:
+        print(f"Exhausted as expected: {e}")
+
+    for conn in held:
+        conn.close()
+
+    # Overflow connection is closed, the rest stay idle
+    assert pool.size == 2
+    assert pool.idle_count == 2
+
+
+def test_stale_connections_are_recycled():
+    """Connections older than recycle age are replaced on checkout"""
+    print("=== TESTING STALE RECYCLING ===")
+    pool, opened = make_pool(recycle=0.01)
+
+    with pool.acquire() as conn:
+        conn.execute("SELECT 1")
+    time.sleep(0.02)
+    with pool.acquire() as conn:
+        conn.execute("SELECT 1")
+
+    assert len(opened) == 2
+    assert pool.size == 1
+
+
+def test_failed_health_check_reconnects():
+    """A connection failing its ping is swapped for a new one"""
+    print("=== TESTING HEALTH CHECK ===")
+    pool, opened = make_pool(ping_interval=0, ping=lambda conn: False)
+
+    with pool.acquire():
+        pass
+    with pool.acquire():
+        pass
+
+    assert len(opened) == 2
+
+
+def test_rollback_on_error():
+    """Uncommitted work is rolled back when the block raises"""
+    print("=== TESTING ROLLBACK ===")
+    pool, opened = make_pool(pool_size=1, max_overflow=0)
+
+    with pool.acquire() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+
+    try:
+        with pool.acquire() as conn:
+            conn.execute("INSERT INTO t VALUES (1)")
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+
+    with pool.acquire() as conn:
+        count = conn.execute("SELECT COUNT(*) FROM t").fetchone()[0]
+
+    assert count == 0
+
+
+if __name__ == "__main__":
+    test_connections_are_reused()
+    test_pool_limit_and_overflow()
+    test_stale_connections_are_recycled()
+    test_failed_health_check_reconnects()
+    test_rollback_on_error()
+    print("✅ All pool tests passed")
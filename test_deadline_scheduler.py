@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""Test the attack/convoy deadline scheduler"""
+
+import asyncio
+import threading
+from datetime import datetime, timedelta
+
+from deadline_scheduler import DeadlineScheduler, round_up_to_second
+
+
+def test_pop_due_order_and_cancel():
+    """Due keys come out grouped by kind; moved and cancelled deadlines are skipped"""
+    print("=== TESTING DEADLINE HEAP ===")
+    base = datetime(2024, 1, 1, 12, 0, 0)
+    deadlines = DeadlineScheduler(clock=lambda: base)
+
+    deadlines.schedule('attack', 1, base - timedelta(minutes=1))
+    deadlines.schedule('attack', 2, base + timedelta(minutes=5))
+    deadlines.schedule('convoy', 7, base - timedelta(seconds=30))
+    deadlines.schedule('convoy', 8, base - timedelta(seconds=10))
+    deadlines.cancel('convoy', 8)
+    # Moving a deadline later leaves the old heap entry stale
+    deadlines.schedule('attack', 3, base - timedelta(seconds=5))
+    deadlines.schedule('attack', 3, base + timedelta(minutes=1))
+
+    assert deadlines.pop_due() == {'attack': [1], 'convoy': [7]}
+    assert deadlines.pending == 2
+    assert deadlines.next_deadline() == base + timedelta(minutes=1)
+    assert deadlines.pop_due(base + timedelta(hours=1)) == {'attack': [3, 2]}
+    assert deadlines.next_deadline() is None
+
+
+def test_round_up_to_second():
+    """Fractional deadlines never fire before the stored DATETIME second"""
+    assert round_up_to_second(datetime(2024, 1, 1, 10, 0, 0, 1)) == datetime(2024, 1, 1, 10, 0, 1)
+    assert round_up_to_second(datetime(2024, 1, 1, 10, 0, 0)) == datetime(2024, 1, 1, 10, 0, 0)
+
+
+def test_fires_when_due():
+    """Handlers run for overdue deadlines and for ones pushed from another thread"""
+    print("=== TESTING DEADLINE FIRING ===")
+    fired = []
+
+    async def handler(keys):
+        fired.extend(keys)
+
+    async def scenario():
+        deadlines = DeadlineScheduler()
+        deadlines.register('attack', handler)
+        deadlines.schedule('attack', 1, datetime.now() - timedelta(seconds=1))
+        await deadlines.start()
+        await asyncio.sleep(0.05)
+
+        thread = threading.Thread(target=deadlines.schedule, args=('attack', 2, datetime.now() - timedelta(seconds=1)))
+        thread.start()
+        thread.join()
+        await asyncio.sleep(0.05)
+        await deadlines.stop()
+
+    asyncio.run(scenario())
+    assert fired == [1, 2]
+
+
+def test_failed_handler_is_retried():
+    """Keys of a handler that raised come due again, later after each failure"""
+    base = datetime(2024, 1, 1, 12, 0, 0)
+    now = [base]
+    deadlines = DeadlineScheduler(clock=lambda: now[0], retry_delay=5, max_retry_delay=8)
+    calls = []
+
+    async def flaky(keys):
+        calls.append(list(keys))
+        if len(calls) < 3:
+            raise RuntimeError('database is locked')
+
+    deadlines.register('attack', flaky)
+    deadlines.schedule('attack', 1, base)
+    asyncio.run(deadlines.fire_due())
+    assert deadlines.next_deadline() == base + timedelta(seconds=5)
+
+    now[0] = base + timedelta(seconds=5)
+    asyncio.run(deadlines.fire_due())
+    # 10s backoff is capped at max_retry_delay
+    assert deadlines.next_deadline() == now[0] + timedelta(seconds=8)
+
+    now[0] += timedelta(seconds=8)
+    asyncio.run(deadlines.fire_due())
+    assert calls == [[1], [1], [1]]
+    assert deadlines.next_deadline() is None
+
+
+if __name__ == "__main__":
+    test_pop_due_order_and_cancel()
+    test_round_up_to_second()
+    test_fires_when_due()
+    test_failed_handler_is_retried()
+    print("✅ All deadline scheduler tests passed")
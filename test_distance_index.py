@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""Test the precomputed distance and weapon range index"""
+
+from config import Config
+from distance_index import DistanceIndex, NEIGHBOR, REGIONAL, INTERCONTINENTAL
+
+
+def test_distance_matrix():
+    """Matrix covers every country and matches the neighbor/region tables"""
+    print("=== TESTING DISTANCE MATRIX ===")
+    index = DistanceIndex(Config)
+
+    assert len(index.matrix) == len(Config.COUNTRIES)
+    assert all(len(row) == len(Config.COUNTRIES) for row in index.matrix)
+
+    assert index.distance_class('IR', 'TR') == NEIGHBOR
+    assert index.distance_class('IR', 'SA') == REGIONAL
+    assert index.distance_class('IR', 'US') == INTERCONTINENTAL
+    # Countries outside every region count as the same region
+    assert index.distance_type('NG', 'KE') == 'regional'
+    # Codes missing from COUNTRIES fall back to the tables directly
+    assert index.distance_type('KP', 'CN') == 'regional'
+
+
+def test_available_weapons():
+    """Range checks, extender bonuses and player_weapons ordering"""
+    print("=== TESTING WEAPON REACH ===")
+    player_weapons = {'user_id': 1, 'trident2_nuclear': 5, 'rifle': 100, 'f35': 3, 'tank': 0}
+
+    assert Config.get_available_weapons_for_attack('IR', 'TR', player_weapons) == ['trident2_nuclear', 'rifle', 'f35']
+    assert Config.get_available_weapons_for_attack('IR', 'SA', player_weapons) == ['trident2_nuclear', 'f35']
+    assert Config.get_available_weapons_for_attack('IR', 'US', player_weapons) == ['trident2_nuclear']
+
+    # f35 (2800km) reaches intercontinental targets with a tanker (+300km)
+    assert Config.get_available_weapons_for_attack('IR', 'US', player_weapons, has_tanker=True) == ['trident2_nuclear', 'f35']
+
+
+if __name__ == "__main__":
+    test_distance_matrix()
+    test_available_weapons()
+    print("✅ All distance index tests passed")
@@ -36,9 +36,9 @@ def test_distance_system():
         available_weapons = Config.get_available_weapons_for_attack(country1, country2, player_weapons)
         print(f"   ⚔️ سلاح‌های قابل استفاده: {len(available_weapons)} نوع")
         
-        for weapon, count in available_weapons.items():
+        for weapon in available_weapons:
             weapon_name = Config.WEAPONS.get(weapon, {}).get('name', weapon)
-            print(f"      - {weapon_name}: {count}")
+            print(f"      - {weapon_name}: {player_weapons[weapon]}")
         
         print()
 
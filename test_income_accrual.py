@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""Test lazily settled income cycles"""
+
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+from database import Database
+from economy import Economy
+
+
+def make_economy():
+    db = Database()
+    db.use_mysql = False
+    db.sqlite_db_path = os.path.join(tempfile.mkdtemp(), 'accrual.db')
+    db.initialize()
+    return db, Economy(db)
+
+
+def test_settle_on_read():
+    """Reading a player credits every whole cycle since the last settlement"""
+    print("=== TESTING INCOME ACCRUAL ===")
+    db, economy = make_economy()
+    db.create_player(1, 'tester', 'IR')
+    db.update_building_count(1, 'iron_mine', 2)
+
+    anchor = (datetime.now() - economy.cycle_length * 2 - timedelta(minutes=30)).replace(microsecond=0)
+    db.execute('UPDATE players SET last_settled_at = ? WHERE user_id = ?', (anchor, 1))
+    db.cache.clear()
+    db._next_settlement.clear()
+
+    start_money = 900000
+    cycle = economy.rates.cycle(economy.rates.compute(db.get_player_buildings(1)))
+    player = db.get_player(1)
+
+    assert player['money'] == start_money + cycle['money'] * 2
+    assert db.get_player_resources(1)['iron'] == cycle['resources']['iron'] * 2
+    # The partial cycle keeps accruing from the advanced anchor
+    assert player['last_settled_at'] == str(anchor + economy.cycle_length * 2)
+    # Nothing more is due until the next cycle
+    assert economy.run_income_cycle() == {'players': 0}
+
+
+def test_settlement_is_credited_once():
+    """A settlement against a stale anchor is rejected"""
+    print("=== TESTING SETTLEMENT ANCHOR ===")
+    db, economy = make_economy()
+    db.create_player(1, 'tester', 'IR')
+    anchor = db.get_player(1)['last_settled_at']
+
+    settlement = (1, anchor, datetime.now().replace(microsecond=0) + economy.cycle_length, 100, 0, 0, {})
+    assert db.apply_income_settlements([settlement]) == [1]
+    assert db.apply_income_settlements([settlement]) == []
+
+
+if __name__ == "__main__":
+    test_settle_on_read()
+    test_settlement_is_credited_once()
+    print("✅ All income accrual tests passed")
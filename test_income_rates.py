@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""Test the cached per-player income rates"""
+
+import os
+import tempfile
+
+from database import Database
+from economy import Economy
+from income_rates import IncomeRates
+
+
+def make_economy():
+    db = Database()
+    db.use_mysql = False
+    db.sqlite_db_path = os.path.join(tempfile.mkdtemp(), 'rates.db')
+    db.initialize()
+    return db, Economy(db)
+
+
+def test_rates_follow_building_writes():
+    """Incremental adjustments match a rate recomputed from the buildings row"""
+    print("=== TESTING INCOME RATES ===")
+    db, economy = make_economy()
+    db.create_player(1, 'tester', 'IR')
+    db.create_player(2, 'rival', 'US')
+    economy.get_income_rate(1)
+    economy.get_income_rate(2)
+    recomputed = economy.rates.recomputed
+
+    db.add_building(1, 'iron_mine')
+    db.add_building(1, 'wheat_farm')
+    assert db.apply_delta(1, money=-1000, buildings={'refinery': 2, 'oil_mine': 3})
+    # A combat-style transfer between two players
+    assert db.apply_deltas({1: {'buildings': {'oil_mine': -1}}, 2: {'buildings': {'oil_mine': 1}}})
+    assert economy.rates.recomputed == recomputed
+
+    for user_id in (1, 2):
+        expected = economy.rates.compute(db.get_player_buildings(user_id))
+        assert economy.get_income_rate(user_id) == expected
+    assert economy.calculate_population_increase(1) == economy.POPULATION_PER_FARM
+    assert economy.rates.recomputed == recomputed
+
+
+def test_absolute_writes_mark_dirty():
+    """Setting a count outright recomputes the rate on next use"""
+    db, economy = make_economy()
+    db.create_player(1, 'tester', 'IR')
+    economy.get_income_rate(1)
+
+    db.update_building_count(1, 'military_base', 4)
+    assert economy.calculate_soldier_increase(1) == 4 * economy.SOLDIERS_PER_BASE
+    db.set_player_building(1, 'military_base', 1)
+    assert economy.calculate_soldier_increase(1) == economy.SOLDIERS_PER_BASE
+
+
+def test_read_racing_a_change_is_not_adjusted():
+    """A rate read after a change began may already include it, so it is dropped"""
+    db, economy = make_economy()
+    rates = economy.rates
+    token = rates.begin_change(1)
+    rate = rates.get(1, lambda user_id: {'iron_mine': 1})
+    rates.adjust(1, {'iron_mine': 1}, token)
+    assert rate['money'] == economy.building_yields()['iron_mine']['money']
+    # Recomputed rather than counted twice
+    assert rates.get(1, lambda user_id: {'iron_mine': 1})['resources'] == {'iron': 1000}
+
+
+def test_changes_are_bounded_and_rates_copied():
+    """Old changes are forgotten unless a read may race them, and callers cannot edit the cache"""
+    rates = IncomeRates(Economy.building_yields(), Economy.REFINERY_CAPACITY, max_changes=10)
+    for user_id in range(100):
+        rates.mark_dirty(user_id)
+    assert len(rates._last_change) <= 10
+
+    def racing_read(user_id):
+        # Player 1 changes while its row is read, then many other players change
+        rates.mark_dirty(1)
+        for other in range(100, 200):
+            rates.mark_dirty(other)
+        return {'iron_mine': 1}
+
+    rates.get(1, racing_read)
+    assert 1 not in rates._rates
+
+    rate = rates.get(1, lambda user_id: {'iron_mine': 1})
+    rate['money'] = 0
+    rate['resources']['iron'] = 0
+    assert rates.get(1, lambda user_id: {})['resources'] == {'iron': 1000}
+    assert rates.recomputed == 2
+
+
+if __name__ == "__main__":
+    test_rates_follow_building_writes()
+    test_absolute_writes_mark_dirty()
+    test_read_racing_a_change_is_not_adjusted()
+    test_changes_are_bounded_and_rates_copied()
+    print("✅ All income rate tests passed")
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""Test keyboard memoization"""
+
+from keyboards import Keyboards
+
+
+def test_static_keyboards_are_shared():
+    """Config-only keyboards are built at startup and reused"""
+    print("=== TESTING KEYBOARD CACHE ===")
+    keyboards = Keyboards()
+    assert keyboards.buildings_menu_keyboard() is keyboards.buildings_menu_keyboard()
+    assert keyboards.weapon_category_keyboard('basic') is keyboards.weapon_category_keyboard('basic')
+    assert keyboards.main_menu_keyboard(True) is not keyboards.main_menu_keyboard(False)
+    assert keyboards.main_menu_keyboard() is keyboards.main_menu_keyboard(is_admin=False)
+
+
+def test_player_keyboards_follow_state():
+    """Per-player keyboards are rebuilt when the weapons or targets they show change"""
+    keyboards = Keyboards(cache_size=2)
+    first = keyboards.weapon_selection_keyboard(7, 'normal', {'rifle': 10, 'tank': 2})
+    assert keyboards.weapon_selection_keyboard(7, 'normal', {'rifle': 10, 'tank': 2}) is first
+    changed = keyboards.weapon_selection_keyboard(7, 'normal', {'rifle': 9, 'tank': 2})
+    assert changed is not first
+    assert changed.inline_keyboard[0][0].text.endswith('(9)')
+
+    target = {'user_id': 7, 'country_code': 'IR', 'country_name': 'Iran'}
+    targets = keyboards.attack_targets_keyboard([target])
+    assert keyboards.attack_targets_keyboard([dict(target)]) is targets
+    # The LRU is bounded
+    assert keyboards.cache_stats()['memoized'] == 2
+
+
+if __name__ == "__main__":
+    test_static_keyboards_are_shared()
+    test_player_keyboards_follow_state()
+    print("✅ All keyboard tests passed")
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Test that marketplace purchases and cancellations never oversell a listing"""
+
+import os
+import tempfile
+import threading
+from unittest import mock
+
+from database import Database
+from marketplace import Marketplace
+from memory_database import MemoryDatabase
+
+
+def test_purchase_on_stale_listing_is_rejected():
+    """A buyer who read the listing before another purchase cannot take stock that is gone"""
+    print("=== TESTING MARKETPLACE STOCK ===")
+    db = MemoryDatabase()
+    try:
+        seller_id, first_id, second_id = db.seed_players(3, money=10000, resources={'iron': 100})
+        market = Marketplace(db)
+        listing_id = market.create_listing(seller_id, 'iron', 'resource', 10, 5)['listing_id']
+        stale = market.get_listing(listing_id)
+
+        assert market.purchase_item(first_id, listing_id, 8)['success']
+        with mock.patch.object(market, 'get_listing', return_value=stale):
+            result = market.purchase_item(second_id, listing_id, 5)
+        print(f"Second purchase: {result['message']}")
+        assert not result['success']
+
+        listing = market.get_listing(listing_id)
+        assert listing['quantity'] == 2 and listing['status'] == 'active'
+        assert db.get_player(second_id)['money'] == 10000
+        assert db.fetch_one('SELECT COUNT(*) AS n FROM market_transactions')['n'] == 1
+
+        assert market.purchase_item(second_id, listing_id, 2)['success']
+        assert market.get_listing(listing_id)['status'] == 'sold_out'
+        assert db.get_player(seller_id)['money'] == 10000 + 50
+    finally:
+        db.close()
+
+
+def test_cancel_after_purchase_returns_nothing():
+    """A cancellation based on a stale read does not hand back stock that was sold"""
+    db = MemoryDatabase()
+    try:
+        seller_id, buyer_id = db.seed_players(2, money=10000, resources={'iron': 100})
+        market = Marketplace(db)
+        listing_id = market.create_listing(seller_id, 'iron', 'resource', 10, 5)['listing_id']
+        stale = market.get_listing(listing_id)
+
+        assert market.purchase_item(buyer_id, listing_id, 4)['success']
+        with mock.patch.object(market, 'get_listing', return_value=stale):
+            assert not market.cancel_listing(seller_id, listing_id)['success']
+        assert db.get_player_resources(seller_id)['iron'] == 90
+
+        assert market.cancel_listing(seller_id, listing_id)['success']
+        assert market.get_listing(listing_id)['status'] == 'cancelled'
+        assert not market.cancel_listing(seller_id, listing_id)['success']
+    finally:
+        db.close()
+
+
+def test_reader_during_purchase_does_not_keep_old_money():
+    """A player read while the purchase is uncommitted is not served from the cache afterwards"""
+    db = Database()
+    db.use_mysql = False
+    db.sqlite_db_path = os.path.join(tempfile.mkdtemp(), 'market.db')
+    db.initialize()
+    try:
+        db.create_player(1, 'seller', 'IR')
+        db.create_player(2, 'buyer', 'US')
+        db.apply_delta(1, resources={'iron': 100})
+        market = Marketplace(db)
+        listing_id = market.create_listing(1, 'iron', 'resource', 10, 5)['listing_id']
+        money_before = db.get_player(2)['money']
+
+        seen = []
+        record_first_purchase = db.record_first_purchase
+
+        def read_concurrently(*args, **kwargs):
+            # WAL: another thread still sees the committed, pre-purchase rows
+            reader = threading.Thread(target=lambda: seen.append(db.get_player(2)['money']))
+            reader.start()
+            reader.join()
+            return record_first_purchase(*args, **kwargs)
+
+        # Delivery succeeds: a failed one refunds the buyer, which would invalidate the row anyway
+        with mock.patch.object(db, 'record_first_purchase', read_concurrently), \
+                mock.patch('random.randint', return_value=1):
+            assert market.purchase_item(2, listing_id, 4)['success']
+
+        print(f"Money seen during the purchase: {seen}")
+        assert seen == [money_before]
+        assert db.get_player(2)['money'] == money_before - 20
+    finally:
+        db.close_pools()
+
+
+if __name__ == "__main__":
+    test_purchase_on_stale_listing_is_rejected()
+    test_cancel_after_purchase_returns_nothing()
+    test_reader_during_purchase_does_not_keep_old_money()
+    print("✅ All marketplace tests passed")
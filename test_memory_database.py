@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Test the in-memory database backend"""
+
+import threading
+
+from game_logic import GameLogic
+from memory_database import MemoryDatabase
+
+
+def test_game_runs_on_memory_database():
+    """Players, deltas and weapon production work as on SQLite"""
+    print("=== TESTING MEMORY DATABASE ===")
+    db = MemoryDatabase()
+    try:
+        assert db.create_player(1, 'alice', 'IR')
+        assert not db.create_player(2, 'bob', 'IR')
+        db.apply_delta(1, money=1000, resources={'iron': 50, 'copper': 20})
+        db.add_building(1, 'weapon_factory')
+
+        result = GameLogic(db).produce_weapon(1, 'rifle')
+        print(f"Produce rifle: {result['message']}")
+        assert result['success']
+        assert db.get_player_weapons(1)['rifle'] == 1
+    finally:
+        db.close()
+
+
+def test_seed_players():
+    """Seeding fills every state table and skips countries already taken"""
+    db = MemoryDatabase()
+    try:
+        db.create_player(1, 'alice', 'IR')
+        user_ids = db.seed_players(1000, start_id=100, money=5000,
+                                   resources={'iron': 20}, weapons={'rifle': 3})
+        assert len(user_ids) == 1000
+        assert len(db.get_all_countries()) == 1001
+        assert db.get_player(100)['country_code'] != 'IR'
+        state = db.get_player_state(user_ids[-1])
+        assert state['player']['money'] == 5000
+        assert state['resources']['iron'] == 20
+        assert state['weapons']['rifle'] == 3
+    finally:
+        db.close()
+
+
+def test_instances_are_isolated():
+    """Each instance is its own world, shared by all of its threads"""
+    first, second = MemoryDatabase(), MemoryDatabase()
+    try:
+        first.create_player(1, 'alice', 'IR')
+        assert second.get_player(1) is None
+
+        seen = []
+        thread = threading.Thread(target=lambda: seen.append(
+            first.fetch_one('SELECT username FROM players WHERE user_id = ?', (1,))))
+        thread.start()
+        thread.join()
+        assert seen[0]['username'] == 'alice'
+    finally:
+        first.close()
+        second.close()
+
+
+if __name__ == "__main__":
+    test_game_runs_on_memory_database()
+    test_seed_players()
+    test_instances_are_isolated()
+    print("✅ All memory database tests passed")
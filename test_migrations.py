@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""Test the versioned schema migrations"""
+
+import os
+import sqlite3
+import tempfile
+
+from database import Database
+from migrations import MigrationRunner, SCHEMA_VERSION, INDEXES
+from query_stats import QueryStats
+
+
+def make_database(path):
+    db = Database()
+    db.use_mysql = False
+    db.sqlite_db_path = path
+    return db
+
+
+def test_fresh_database():
+    """A fresh database reaches the latest version with every hot-path index"""
+    print("=== TESTING FRESH MIGRATION ===")
+    path = os.path.join(tempfile.mkdtemp(), 'fresh.db')
+    db = make_database(path)
+
+    assert MigrationRunner(db).run() == SCHEMA_VERSION
+    # Second run only reads the version
+    db.query_stats = QueryStats()
+    assert MigrationRunner(db).run() == SCHEMA_VERSION
+    assert db.query_stats.statement_count == 1
+
+    conn = sqlite3.connect(path)
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert set(INDEXES) <= indexes
+    assert conn.execute('SELECT COUNT(*) FROM schema_version').fetchone()[0] == SCHEMA_VERSION
+
+
+def test_legacy_database():
+    """Older layouts are upgraded in place without losing rows"""
+    print("=== TESTING LEGACY UPGRADE ===")
+    path = os.path.join(tempfile.mkdtemp(), 'legacy.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE alliance_members (alliance_id INTEGER, player_id INTEGER, role TEXT, joined_at TIMESTAMP)')
+    conn.execute("INSERT INTO alliance_members VALUES (1, 42, 'leader', '2024-01-01 00:00:00')")
+    conn.execute('''CREATE TABLE pending_attacks (id INTEGER PRIMARY KEY AUTOINCREMENT, attacker_id INTEGER,
+                    defender_id INTEGER, attack_type TEXT, travel_time INTEGER, departure_time TIMESTAMP,
+                    attack_time TIMESTAMP, status TEXT, conquest_mode INTEGER)''')
+    conn.execute("INSERT INTO pending_attacks (attacker_id, defender_id, travel_time, attack_time, status) "
+                 "VALUES (1, 2, 5, '2024-01-01T10:00:00', 'traveling')")
+    conn.commit()
+
+    db = make_database(path)
+    db.initialize()
+
+    assert conn.execute('SELECT user_id FROM alliance_members').fetchone()[0] == 42
+    assert conn.execute('SELECT attack_time FROM pending_attacks').fetchone()[0] == '2024-01-01 10:00:00'
+    assert len(db.get_pending_attacks_due()) == 1
+
+
+if __name__ == "__main__":
+    test_fresh_database()
+    test_legacy_database()
+    print("✅ All migration tests passed")
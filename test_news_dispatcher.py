@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Test the rate-limited news dispatcher"""
+
+import asyncio
+
+from telegram.error import BadRequest, NetworkError, RetryAfter
+
+from news_dispatcher import NewsDispatcher, TokenBucket
+
+
+class FakeBot:
+    def __init__(self, flood_once=False):
+        self.sent = []
+        self.flood_once = flood_once
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if self.flood_once:
+            self.flood_once = False
+            raise RetryAfter(0)
+        self.sent.append((chat_id, text))
+
+
+def test_token_bucket():
+    """A drained bucket refills at its rate and honours pauses"""
+    print("=== TESTING TOKEN BUCKET ===")
+    now = [0.0]
+    bucket = TokenBucket(rate=2, capacity=2, clock=lambda: now[0])
+    bucket.take()
+    bucket.take()
+    assert bucket.delay() == 0.5
+    now[0] = 0.5
+    assert bucket.delay() == 0
+    bucket.pause(3)
+    assert bucket.delay() == 3
+
+
+def test_priority_and_bound():
+    """Urgent posts jump the queue; a full queue drops the least urgent post"""
+    dispatcher = NewsDispatcher(queue_size=2)
+    assert dispatcher.enqueue('@news', 'normal')
+    assert dispatcher.enqueue('@news', 'digest', NewsDispatcher.DIGEST)
+    assert dispatcher.enqueue('@news', 'urgent', NewsDispatcher.URGENT)
+    assert not dispatcher.enqueue('@news', 'late digest', NewsDispatcher.DIGEST)
+    assert [item[3] for item in sorted(dispatcher._queue)] == ['urgent', 'normal']
+    assert dispatcher.dropped == 2
+
+
+def test_digest_and_retry():
+    """A burst is posted as one digest, resent after RetryAfter"""
+    print("=== TESTING NEWS DIGEST ===")
+    bot = FakeBot(flood_once=True)
+
+    async def scenario():
+        dispatcher = NewsDispatcher(bot, chat_rate=6000, digest_window=0.05)
+        dispatcher.register_digest('convoy', lambda texts: f"{len(texts)}: " + ' | '.join(texts))
+        await dispatcher.start()
+        for number in range(10):
+            assert dispatcher.enqueue('@news', f"convoy {number}", coalesce='convoy')
+        assert dispatcher.pending == 10
+        await asyncio.sleep(0.2)
+        await dispatcher.stop()
+
+    asyncio.run(scenario())
+    assert len(bot.sent) == 1
+    assert bot.sent[0][1].startswith('10: convoy 0 | convoy 1')
+
+
+def test_rejected_posts_report_failure():
+    """Rejected posts and posts out of retries call on_failed, never on_sent"""
+    outcomes = []
+
+    class RejectingBot:
+        async def send_message(self, chat_id, text, **kwargs):
+            if text == 'too long':
+                raise BadRequest("Message is too long")
+            raise NetworkError("timed out")
+
+    async def scenario():
+        dispatcher = NewsDispatcher(RejectingBot(), chat_rate=6000, max_retries=1)
+        await dispatcher.start()
+        for text in ('too long', 'offline'):
+            dispatcher.enqueue('@news', text, on_sent=lambda text=text: outcomes.append(('sent', text)),
+                               on_failed=lambda text=text: outcomes.append(('failed', text)))
+        await asyncio.sleep(0.1)
+        await dispatcher.stop()
+
+    asyncio.run(scenario())
+    assert sorted(outcomes) == [('failed', 'offline'), ('failed', 'too long')]
+
+
+if __name__ == "__main__":
+    test_token_bucket()
+    test_priority_and_bound()
+    test_digest_and_retry()
+    test_rejected_posts_report_failure()
+    print("✅ All news dispatcher tests passed")
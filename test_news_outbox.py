@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Test the durable news outbox"""
+
+import asyncio
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+from telegram.error import BadRequest
+
+from database import Database
+from news import NewsChannel
+from news_outbox import NewsOutbox
+
+
+class FakeBot:
+    def __init__(self, reject=None):
+        self.sent = []
+        self.reject = reject
+        self.attempts = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.attempts += 1
+        if self.reject and self.reject in text:
+            raise BadRequest("Chat not found")
+        self.sent.append(text)
+
+
+def make_database():
+    db = Database()
+    db.use_mysql = False
+    db.sqlite_db_path = os.path.join(tempfile.mkdtemp(), 'outbox.db')
+    db.initialize()
+    return db
+
+
+def test_dedup_and_claim():
+    """A dedup key is queued once; claimed rows are not offered again until they time out"""
+    print("=== TESTING NEWS OUTBOX ===")
+    db = make_database()
+    assert db.queue_news('text', {'message': 'hello'}, 'statement:1:1')
+    assert not db.queue_news('text', {'message': 'hello'}, 'statement:1:1')
+
+    now = datetime.now()
+    rows = db.claim_pending_news(10, now - timedelta(minutes=10))
+    assert [row['payload'] for row in rows] == [{'message': 'hello'}]
+    assert db.claim_pending_news(10, now - timedelta(minutes=10)) == []
+    # Unacknowledged offers come back after a restart
+    assert db.release_news_offers() == 1
+    assert len(db.claim_pending_news(10, now - timedelta(minutes=10))) == 1
+
+
+def test_flush_delivers_and_acknowledges():
+    """Flushed events reach the bot and are marked sent after the ack"""
+    db = make_database()
+    db.queue_news('text', {'message': 'statement'}, 'statement:1:2')
+    db.queue_news('convoy', {'message': 'convoy 1', 'cargo': {'money': 5}}, 'convoy:1')
+    bot = FakeBot()
+
+    async def scenario():
+        news = NewsChannel()
+        news.dispatcher.digest_window = 0.01
+        news.set_bot(bot)
+        outbox = NewsOutbox(db, news, flush_interval=0.05)
+        await outbox.start()
+        await asyncio.sleep(0.2)
+        await outbox.stop()
+
+    asyncio.run(scenario())
+    assert len(bot.sent) == 2
+    assert db.fetch_one('SELECT COUNT(*) AS unsent FROM news_outbox WHERE sent_at IS NULL')['unsent'] == 0
+
+
+def test_rejected_event_is_not_offered_again():
+    """A post Telegram rejects is marked failed instead of being re-offered forever"""
+    db = make_database()
+    db.queue_news('text', {'message': 'poison'}, 'statement:1:3')
+    db.queue_news('text', {'message': 'fine'}, 'statement:1:4')
+    bot = FakeBot(reject='poison')
+
+    async def scenario():
+        news = NewsChannel()
+        news.set_bot(bot)
+        # Every flush would re-offer an unacknowledged row
+        outbox = NewsOutbox(db, news, flush_interval=0.02, redeliver_after=0)
+        await outbox.start()
+        await asyncio.sleep(0.3)
+        await outbox.stop()
+
+    asyncio.run(scenario())
+    assert bot.attempts == 2 and len(bot.sent) == 1
+    row = db.fetch_one("SELECT sent_at, failed_at FROM news_outbox WHERE dedup_key = 'statement:1:3'")
+    assert row['sent_at'] is None and row['failed_at'] is not None
+    db.release_news_offers()
+    assert db.claim_pending_news(10, datetime.now() + timedelta(minutes=1)) == []
+    assert db.purge_sent_news(datetime.now() + timedelta(minutes=1)) == 2
+
+
+if __name__ == "__main__":
+    test_dedup_and_claim()
+    test_flush_delivers_and_acknowledges()
+    test_rejected_event_is_not_offered_again()
+    print("✅ All news outbox tests passed")
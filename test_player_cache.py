@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Test the per-player state cache"""
+
+import time
+
+from player_cache import PlayerStateCache
+
+
+def test_read_through_and_invalidation():
+    """Cached rows are served until a write invalidates them"""
+    print("=== TESTING CACHE INVALIDATION ===")
+    cache = PlayerStateCache(max_players=10, ttl=60)
+
+    assert cache.get(1, 'weapons') == (False, None)
+    cache.put(1, 'weapons', {'rifle': 5})
+    cache.put(1, 'resources', {'iron': 100})
+
+    found, row = cache.get(1, 'weapons')
+    assert found and row == {'rifle': 5}
+
+    # Callers get copies, so mutating them does not poison the cache
+    row['rifle'] = 999
+    assert cache.get(1, 'weapons')[1] == {'rifle': 5}
+
+    cache.invalidate(1, 'weapons')
+    assert cache.get(1, 'weapons') == (False, None)
+    assert cache.get(1, 'resources')[0]
+
+
+def test_stale_load_is_dropped():
+    """A row read before a write must not be cached after it"""
+    print("=== TESTING STALE LOAD GUARD ===")
+    cache = PlayerStateCache()
+
+    generation = cache.generation(1)
+    cache.invalidate(1, 'player')          # write lands while the read is in flight
+    cache.put(1, 'player', {'money': 10}, generation)
+
+    assert cache.get(1, 'player') == (False, None)
+
+
+def test_ttl_and_lru():
+    """Entries expire after the TTL and the oldest players are evicted"""
+    print("=== TESTING TTL AND LRU ===")
+    cache = PlayerStateCache(max_players=2, ttl=0.01)
+    cache.put(1, 'player', {'money': 1})
+    time.sleep(0.02)
+    assert cache.get(1, 'player') == (False, None)
+
+    cache = PlayerStateCache(max_players=2, ttl=60)
+    cache.put(1, 'player', {'money': 1})
+    cache.put(2, 'player', {'money': 2})
+    cache.get(1, 'player')                 # 1 becomes most recently used
+    cache.put(3, 'player', {'money': 3})
+
+    assert cache.get(2, 'player') == (False, None)
+    assert cache.get(1, 'player')[0]
+    assert cache.get(3, 'player')[0]
+
+
+if __name__ == "__main__":
+    test_read_through_and_invalidation()
+    test_stale_load_is_dropped()
+    test_ttl_and_lru()
+    print("✅ All cache tests passed")
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""Test the precompiled combat power model"""
+
+from config import Config
+from database import Database
+from power_model import PowerModel
+
+
+def test_single_player_power():
+    """Attack skips defense systems, defense gives them full weight"""
+    print("=== TESTING POWER MODEL ===")
+    model = PowerModel(Database.WEAPON_COLUMNS, Config)
+    weapons = {'user_id': 1, 'rifle': 10, 's400_defense': 2, 'tank': -3}
+
+    rifle = Config.WEAPONS['rifle']['power']
+    s400 = Config.WEAPONS['s400_defense']['power']
+    share = Config.COMBAT_CONFIG['base_defense_multiplier']
+
+    assert model.attack_power(weapons) == rifle * 10
+    assert model.military_power(weapons) == rifle * 10 + s400 * 2
+    assert abs(model.defense_power(weapons) - (s400 * 2 + rifle * 10 * share)) < 1e-6
+
+
+def test_all_players_power():
+    """Batch evaluation matches per-player evaluation"""
+    print("=== TESTING BATCH POWER ===")
+    model = PowerModel(Database.WEAPON_COLUMNS, Config)
+    inventories = {
+        1: {'rifle': 5, 'f22': 1},
+        2: {'iron_dome': 4, 'trident2_nuclear': 2},
+        3: {}
+    }
+
+    powers = model.powers(inventories)
+    for user_id, weapons in inventories.items():
+        assert powers[user_id]['attack'] == model.attack_power(weapons)
+        assert powers[user_id]['military'] == model.military_power(weapons)
+    assert powers[3] == {'attack': 0, 'defense': 0.0, 'military': 0}
+
+
+if __name__ == "__main__":
+    test_single_player_power()
+    test_all_players_power()
+    print("✅ All power model tests passed")
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""Test per-query instrumentation and the slow-query log"""
+
+import sys
+
+from memory_database import MemoryDatabase
+from query_stats import QueryStats, fingerprint
+
+
+def test_fingerprint():
+    """Literals and placeholder lists collapse; identifiers with digits survive"""
+    print("=== TESTING QUERY STATS ===")
+    assert fingerprint("SELECT f22 FROM weapons\n   WHERE user_id = 42 AND name = 'x''y'") == \
+        "SELECT f22 FROM weapons WHERE user_id = ? AND name = ?"
+    assert fingerprint('SELECT * FROM players WHERE user_id IN (?, ?, ?)') == \
+        fingerprint('SELECT * FROM players WHERE user_id IN (?,?)')
+
+
+def test_record_and_slow_log():
+    """Counts, percentiles and rows per key; only the last slow queries are kept"""
+    stats = QueryStats(slow_ms=10, slow_log_size=2, samples=100)
+    caller = sys._getframe().f_code
+    for ms in range(1, 101):
+        stats.record(caller, 'SELECT money FROM players WHERE user_id = ?', ms / 10000, 1)
+    for ms in (20, 30, 40):
+        stats.record(caller, 'UPDATE players SET money = 5 WHERE user_id = 1', ms / 1000, 1)
+
+    snapshot = stats.snapshot()
+    select = next(row for row in snapshot['statements'] if row['sql'].startswith('SELECT'))
+    assert select['count'] == 100 and select['rows'] == 100
+    assert select['p50_ms'] == 5.0 and select['p99_ms'] == 9.9
+    assert snapshot['methods'][0]['method'] == 'test_record_and_slow_log'
+    assert snapshot['methods'][0]['count'] == 103
+    assert [slow['ms'] for slow in snapshot['slow_queries']] == [30.0, 40.0]
+    assert snapshot['slow_queries'][0]['sql'] == 'UPDATE players SET money = ? WHERE user_id = ?'
+
+    stats.reset()
+    assert stats.statement_count == 0 and stats.snapshot()['slow_queries'] == []
+
+
+def test_database_methods_are_attributed():
+    """Database statements are credited to the method that issued them"""
+    db = MemoryDatabase()
+    try:
+        db.create_player(1, 'alice', 'IR')
+        db.query_stats.reset()
+        db.cache.clear()
+        db.get_player_weapons(1)
+        db.get_all_countries()
+
+        methods = {row['method']: row for row in db.query_stats.snapshot()['methods']}
+        print(f"Methods: {sorted(methods)}")
+        assert methods['Database._fetch_player_weapons']['rows'] == 1
+        assert methods['Database.get_all_countries']['count'] == 1
+        assert db.query_stats.snapshot()['checkouts']['count'] >= 2
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    test_fingerprint()
+    test_record_and_slow_log()
+    test_database_methods_are_attributed()
+    print("✅ All query stats tests passed")
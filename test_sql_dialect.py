@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""Test portable SQL compilation for MySQL and SQLite"""
+
+from sql_dialect import MYSQL, SQLITE, SQLDialect
+
+
+def test_placeholders_and_literals():
+    """Placeholders are rewritten outside string literals only"""
+    print("=== TESTING SQL DIALECT ===")
+    sql = "SELECT * FROM t WHERE a = ? AND b = 'why?' AND c = \"it's\""
+
+    assert MYSQL.compile(sql) == "SELECT * FROM t WHERE a = %s AND b = 'why?' AND c = 'it''s'"
+    assert SQLITE.compile(sql) == "SELECT * FROM t WHERE a = ? AND b = 'why?' AND c = 'it''s'"
+
+
+def test_upserts_and_functions():
+    """Upserts, NOW() and GREATEST() map onto each backend"""
+    print("=== TESTING DIALECT REWRITES ===")
+    upsert = "INSERT INTO weapons (user_id, rifle) VALUES (?, ?) ON CONFLICT(user_id) DO UPDATE SET rifle = excluded.rifle"
+    assert MYSQL.compile(upsert) == \
+        "INSERT INTO weapons (user_id, rifle) VALUES (%s, %s) ON DUPLICATE KEY UPDATE rifle = VALUES(rifle)"
+    assert SQLITE.compile(upsert) == upsert
+
+    ignore = "INSERT INTO t (a, b) VALUES (?, 'x') ON CONFLICT DO NOTHING"
+    assert MYSQL.compile(ignore) == "INSERT IGNORE INTO t (a, b) VALUES (%s, 'x')"
+    assert SQLITE.compile("INSERT IGNORE INTO t (a) VALUES (?)") == "INSERT OR IGNORE INTO t (a) VALUES (?)"
+
+    assert SQLITE.compile("UPDATE t SET a = GREATEST(a - ?, 0), b = NOW()") == \
+        "UPDATE t SET a = MAX(a - ?, 0), b = datetime('now', 'localtime')"
+
+    locking = "SELECT * FROM resources WHERE user_id = ? FOR UPDATE"
+    assert MYSQL.compile(locking) == "SELECT * FROM resources WHERE user_id = %s FOR UPDATE"
+    assert SQLITE.compile(locking) == "SELECT * FROM resources WHERE user_id = ?"
+
+
+def test_compile_cache():
+    """Compiled statements are cached and the cache is bounded"""
+    print("=== TESTING COMPILE CACHE ===")
+    dialect = SQLDialect('mysql', max_cached=2)
+    dialect.compile("SELECT ?")
+    dialect.compile("SELECT ?")
+    assert dialect.cache_size == 1
+    dialect.compile("SELECT ?, ?")
+    dialect.compile("SELECT ?, ?, ?")
+    assert dialect.cache_size <= 2
+
+    assert SQLDialect.quote('rifle') == '`rifle`'
+    try:
+        SQLDialect.quote('rifle; DROP TABLE players')
+        assert False, "invalid identifier accepted"
+    except ValueError:
+        pass
+
+
+if __name__ == "__main__":
+    test_placeholders_and_literals()
+    test_upserts_and_functions()
+    test_compile_cache()
+    print("✅ All SQL dialect tests passed")
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""Test the tuned SQLite engine"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+
+from sqlite_engine import SQLiteEngine
+
+
+def make_engine(**kwargs):
+    path = os.path.join(tempfile.mkdtemp(), 'engine.db')
+    engine = SQLiteEngine(path, pool_size=1, max_overflow=2, timeout=1, **kwargs)
+    with engine.acquire() as conn:
+        conn.execute('CREATE TABLE counters (id INTEGER PRIMARY KEY, value INTEGER)')
+        conn.execute('INSERT INTO counters (id, value) VALUES (1, 0)')
+    return engine
+
+
+def test_pragmas_and_thread_connection():
+    """WAL is on and each thread keeps reusing its own connection"""
+    print("=== TESTING SQLITE ENGINE ===")
+    engine = make_engine()
+    with engine.acquire() as conn:
+        first = conn.raw
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+    with engine.acquire() as conn:
+        assert conn.raw is first
+
+    seen = []
+    worker = threading.Thread(target=lambda: seen.append(engine.acquire().raw))
+    worker.start()
+    worker.join()
+    assert seen[0] is not first
+    engine.dispose()
+
+
+def test_nested_checkout_keeps_outer_transaction():
+    """A nested checkout uses another connection and cannot commit the caller's work"""
+    engine = make_engine()
+    with engine.acquire() as outer:
+        outer.execute('UPDATE counters SET value = 5 WHERE id = 1')
+        with engine.acquire() as inner:
+            assert inner.raw is not outer.raw
+            # WAL readers see the last committed value while the write is open
+            assert inner.execute('SELECT value FROM counters').fetchone()[0] == 0
+        assert outer.in_transaction
+        outer.rollback()
+    with engine.acquire() as conn:
+        assert conn.execute('SELECT value FROM counters').fetchone()[0] == 0
+
+
+def test_busy_retry():
+    """Lock errors are retried, anything else is raised at once"""
+    engine = make_engine(busy_retries=2, retry_backoff=0)
+    attempts = []
+
+    def locked_twice():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise sqlite3.OperationalError('database is locked')
+        return 'done'
+
+    assert engine.retry_busy(locked_twice) == 'done'
+    assert engine.retries == 2
+
+    try:
+        engine.retry_busy(lambda: (_ for _ in ()).throw(sqlite3.OperationalError('no such table: x')))
+        assert False, "expected OperationalError"
+    except sqlite3.OperationalError:
+        pass
+
+
+def test_concurrent_writers():
+    """Writers on several threads all land"""
+    engine = make_engine()
+
+    def add():
+        for _ in range(50):
+            with engine.acquire() as conn:
+                engine.retry_busy(conn.execute, 'BEGIN IMMEDIATE')
+                conn.execute('UPDATE counters SET value = value + 1 WHERE id = 1')
+
+    threads = [threading.Thread(target=add) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with engine.acquire() as conn:
+        assert conn.execute('SELECT value FROM counters').fetchone()[0] == 200
+
+
+if __name__ == "__main__":
+    test_pragmas_and_thread_connection()
+    test_nested_checkout_keeps_outer_transaction()
+    test_busy_retry()
+    test_concurrent_writers()
+    print("✅ All SQLite engine tests passed")
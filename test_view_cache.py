@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""Test the rendered-view cache and unchanged edit suppression"""
+
+import asyncio
+import threading
+from unittest import mock
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
+
+from view_cache import ViewCache
+
+
+class FakeQuery:
+    def __init__(self, text=None, reply_markup=None, not_modified=False, user_id=1):
+        self.from_user = type('User', (), {'id': user_id})()
+        self.message = type('Message', (), {'text': text, 'reply_markup': reply_markup})()
+        self.not_modified = not_modified
+        self.edits = []
+
+    async def edit_message_text(self, text, reply_markup=None):
+        if self.not_modified:
+            raise BadRequest("Message is not modified: specified new message content is identical")
+        self.edits.append(text)
+
+
+def markup():
+    return InlineKeyboardMarkup([[InlineKeyboardButton("🔙 بازگشت", callback_data="military")]])
+
+
+def test_render_follows_version():
+    """A render is reused until the state version changes"""
+    print("=== TESTING VIEW CACHE ===")
+    views = ViewCache()
+    renders = []
+
+    def renderer(user_id):
+        renders.append(user_id)
+        return f"power {len(renders)}", markup()
+
+    assert views.render(1, 'military_power', (0, 0), renderer)[0] == "power 1"
+    assert views.render(1, 'military_power', (0, 0), renderer)[0] == "power 1"
+    assert views.render(1, 'military_power', (0, 1), renderer)[0] == "power 2"
+    assert views.render(2, 'military_power', (0, 1), renderer)[0] == "power 3"
+    assert views.stats()['hits'] == 1
+
+
+def test_unchanged_edit_is_skipped():
+    """No Telegram call when the message already shows the screen"""
+    views = ViewCache()
+
+    async def scenario():
+        same = FakeQuery("power 1", markup())
+        assert not await views.edit(same, "power 1\n", markup())
+        changed = FakeQuery("power 1", markup())
+        assert await views.edit(changed, "power 2", markup())
+        assert changed.edits == ["power 2"]
+        # Telegram's own rejection is treated the same way
+        assert not await views.edit(FakeQuery("other", not_modified=True), "power 2", markup())
+
+    asyncio.run(scenario())
+    assert views.stats()['skipped_edits'] == 2
+
+
+def test_show_view_renders_off_the_event_loop():
+    """The bot's version lookup and renders run on the database executor, and hits skip the render"""
+    import main
+    from memory_database import MemoryDatabase
+
+    with mock.patch.object(main, 'Database', MemoryDatabase):
+        bot = main.DragonRPBot()
+    user_id, = bot.db.seed_players(1)
+    render_threads = []
+
+    def renderer(user_id):
+        render_threads.append(threading.current_thread())
+        return f"power {len(render_threads)}", markup()
+
+    async def scenario():
+        for _ in range(2):
+            query = FakeQuery(user_id=user_id)
+            await bot.show_view(query, 'military_power', renderer)
+            assert query.edits == ["power 1"]
+
+    try:
+        asyncio.run(scenario())
+        assert len(render_threads) == 1 and render_threads[0] is not threading.main_thread()
+    finally:
+        bot.db_executor.shutdown()
+        bot.db.close()
+
+
+if __name__ == "__main__":
+    test_render_follows_version()
+    test_unchanged_edit_is_skipped()
+    test_show_view_renders_off_the_event_loop()
+    print("✅ All view cache tests passed")
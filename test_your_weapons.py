@@ -1,12 +1,13 @@
 #!/usr/bin/env python3
 """Test your specific user weapons"""
 
-from database import Database
+from memory_database import MemoryDatabase
 
 def test_your_weapons():
     user_id = 7716228404  # Your ID
     
-    db = Database()
+    db = MemoryDatabase()
+    db.seed_players(1, start_id=user_id)
     
     print(f"=== CHECKING YOUR WEAPONS (User {user_id}) ===")
     
@@ -38,6 +39,8 @@ def test_your_weapons():
         print("The problem is likely in the UI refresh or bot message display")
     else:
         print("❌ Manual add failed!")
+    assert weapons_after.get('rifle', 0) == weapons.get('rifle', 0) + 1
+    db.close()
 
 if __name__ == "__main__":
     test_your_weapons()
\ No newline at end of file
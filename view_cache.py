@@ -0,0 +1,95 @@
+"""
+DragonRP View Cache
+Rendered menu screens per (user, view) and edits that skip unchanged messages
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from telegram.error import BadRequest
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCache:
+    """Caches (text, markup) per (user, view) under the player's state version
+
+    The version is taken before the render reads any state, so a write that
+    lands while rendering leaves the stored render under the old version and
+    the next press renders again. The TTL bounds staleness from writes that
+    bypass invalidation, as the player state cache does.
+    """
+
+    def __init__(self, max_entries=2000, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.skipped_edits = 0
+
+        # (user_id, view) -> (expires_at, version, (text, markup))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, view, version):
+        """Cached (text, markup) rendered at this version, or None"""
+        key = (user_id, view)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] != version or entry[0] < time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, user_id, view, version, rendered):
+        """Store a render made at version"""
+        with self._lock:
+            key = (user_id, view)
+            self._entries[key] = (time.monotonic() + self.ttl, version, rendered)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def render(self, user_id, view, version, renderer):
+        """Cached render of view, calling renderer(user_id) on a miss"""
+        rendered = self.get(user_id, view, version)
+        if rendered is None:
+            rendered = renderer(user_id)
+            self.put(user_id, view, version, rendered)
+        return rendered
+
+    async def edit(self, query, text, reply_markup=None):
+        """edit_message_text, skipped when the message already shows this text and keyboard
+
+        Returns False when no edit was needed.
+        """
+        message = query.message
+        if (message is not None and message.text == text.strip()
+                and message.reply_markup == reply_markup):
+            self.skipped_edits += 1
+            return False
+
+        try:
+            await query.edit_message_text(text, reply_markup=reply_markup)
+        except BadRequest as e:
+            # Entities or whitespace can hide an identical message from the check above
+            if 'not modified' not in str(e).lower():
+                raise
+            self.skipped_edits += 1
+            return False
+        return True
+
+    def stats(self):
+        """Hit/miss counters for the admin panel"""
+        total = self.hits + self.misses
+        return {
+            'views': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits / total) if total else 0.0,
+            'skipped_edits': self.skipped_edits
+        }